@@ -1,8 +1,10 @@
-from flask import Flask, render_template, request, jsonify, send_file, url_for
+from flask import Flask, render_template, request, jsonify, send_file, url_for, Response, stream_with_context
 import os
 import json
 import logging
 import shutil
+import atexit
+import time
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from models.evaluator_bleu import SacreBLEUEvaluator
@@ -17,6 +19,10 @@ from models.translator import NeuralTranslator
 from utils.audio_processor import AudioProcessor
 from utils.subtitle_generator import SubtitleGenerator
 from utils.file_handler import FileHandler
+from utils.transcript_cache import TranscriptCache
+from utils.job_queue import JobStore, QueueFullError, TERMINAL_EVENTS, JOB_KINDS
+from models.job_workers import JobWorkerPool
+from models.streaming import transcribe_and_translate_stream
 
 # 配置日志格式
 logging.basicConfig(
@@ -33,46 +39,215 @@ Config.init_app(app)
 # ===========================================================
 # 全局组件初始化 (Loading Models)
 # ===========================================================
-try:
-    logger.info("正在初始化 AI 核心组件...")
+# 组件在 create_app() 中初始化，只由入口（python app.py、run_app_production.py、WSGI 的 "app:create_app()"）调用。
+# spawn 启动的子进程（任务 worker、长音频 ASR / 抽帧进程池）会重新导入本模块或入口模块，
+# 导入本身不加载模型、不启动任务队列，子进程只加载自己需要的模型
+transcriber = None
+translator = None
+audio_processor = None
+subtitle_generator = None
+file_handler = None
+bleu_evaluator = None
+job_store = None
+job_pool = None
+_initialized = False
+
+
+def create_app() -> Flask:
+    """初始化 AI 组件与后台任务队列（只执行一次），返回 Flask 应用"""
+    global transcriber, translator, audio_processor, subtitle_generator, file_handler, bleu_evaluator, \
+        job_store, job_pool, _initialized
+    if _initialized:
+        return app
 
-    # 1. 初始化 Whisper Transcriber (ASR + VLM 协调器)
-    transcriber = WhisperTranscriber(
-        model_name=Config.WHISPER_MODEL,
-        device=Config.WHISPER_DEVICE
-    )
-    logger.info(f"Whisper Transcriber (ASR/VLM Coordinator) 初始化完成。")
+    try:
+        logger.info("正在初始化 AI 核心组件...")
+
+        # 启用后台任务队列时模型只由 worker 进程持有，Web 进程不加载，避免同一设备上有两份模型；
+        # 同步接口改为提交任务并等待结果
+        if not getattr(Config, 'JOB_QUEUE_ENABLED', False):
+            # 1. 初始化 Whisper Transcriber (ASR + VLM 协调器)
+            transcriber = WhisperTranscriber(
+                model_name=Config.WHISPER_MODEL,
+                device=Config.WHISPER_DEVICE
+            )
+            logger.info(f"Whisper Transcriber (ASR/VLM Coordinator) 初始化完成。")
 
 
-    # 2. 初始化 NeuralTranslator (NMT + LLM 模型 + LoRA)
-    translator = NeuralTranslator(
-        nmt_model_id=getattr(Config, 'NMT_MODEL_ID', "facebook/nllb-200-distilled-600M"),
-        reflection_model_id=getattr(Config, 'REFLECTION_MODEL_ID', "Qwen/Qwen2.5-0.5B-Instruct"),
-        # --- 传递 LoRA 配置 ---
-        lora_model_id=Config.LORA_MODEL_PATH if getattr(Config, 'USE_LORA', False) else None,
-        # -------------------
-        device=Config.WHISPER_DEVICE
-    )
-    logger.info("神经翻译引擎加载完成 (NLLB + LoRA + Reflection Agent)")
+            # 2. 初始化 NeuralTranslator (NMT + LLM 模型 + LoRA)
+            translator = NeuralTranslator(
+                nmt_model_id=getattr(Config, 'NMT_MODEL_ID', "facebook/nllb-200-distilled-600M"),
+                reflection_model_id=getattr(Config, 'REFLECTION_MODEL_ID', "Qwen/Qwen2.5-0.5B-Instruct"),
+                # --- 传递 LoRA 配置 ---
+                lora_model_id=Config.LORA_MODEL_PATH if getattr(Config, 'USE_LORA', False) else None,
+                # -------------------
+                device=Config.WHISPER_DEVICE
+            )
+            logger.info("神经翻译引擎加载完成 (NLLB + LoRA + Reflection Agent)")
+
+        # 3. 初始化工具类
+        audio_processor = AudioProcessor()
+        subtitle_generator = SubtitleGenerator()
+        file_handler = FileHandler()
+        bleu_evaluator = SacreBLEUEvaluator()
+        logger.info("BLEU 评估器加载完成")
+
+        # 4. 后台任务队列：持久化队列 + 每种模型固定数量的 worker 进程
+        if getattr(Config, 'JOB_QUEUE_ENABLED', False):
+            job_store = JobStore(
+                db_path=getattr(Config, 'JOB_DB_PATH', 'cache/jobs.sqlite3'),
+                max_pending=getattr(Config, 'JOB_QUEUE_MAX_PENDING', 16),
+                events_retention_seconds=getattr(Config, 'JOB_EVENTS_RETENTION_SECONDS', 3600),
+                job_retention_days=getattr(Config, 'JOB_RETENTION_DAYS', 7)
+            )
+            job_pool = JobWorkerPool(
+                db_path=job_store.db_path,
+                worker_counts=getattr(Config, 'JOB_WORKERS', {'asr': 1, 'nmt': 1}),
+                poll_interval=getattr(Config, 'JOB_POLL_INTERVAL', 0.5)
+            )
+            job_pool.start(job_store)
+            atexit.register(job_pool.stop)
+            logger.info(f"后台任务队列已启动: {job_store.db_path}（模型由 worker 进程加载）")
 
-    # 3. 初始化工具类
-    audio_processor = AudioProcessor()
-    subtitle_generator = SubtitleGenerator()
-    file_handler = FileHandler()
-    bleu_evaluator = SacreBLEUEvaluator()
-    logger.info("BLEU 评估器加载完成")
+        logger.info("✅ 所有系统组件初始化成功")
 
-    logger.info("✅ 所有系统组件初始化成功")
+    except Exception as e:
+        logger.critical(f"组件初始化失败: {e}")
+        raise e
 
-except Exception as e:
-    logger.critical(f"组件初始化失败: {e}")
-    raise e
+    _initialized = True
+    return app
 
 
 # ===========================================================
 # Web 路由定义
 # ===========================================================
 
+def _reap_dead_workers() -> dict:
+    """
+    worker 全部退出（如模型加载失败）的阶段不会再认领任务：把停在这些阶段的任务标记为失败，
+    避免同步接口和 SSE 一直等待。返回 {阶段: 原因}。
+    """
+    dead = job_pool.dead_stages()
+    for stage, reason in dead.items():
+        job_store.fail_stage(stage, reason)
+    return dead
+
+
+def _missing_workers(kind: str) -> list:
+    """该类任务中没有可用 worker 的阶段：未在 JOB_WORKERS 中配置，或 worker 已全部退出（这样的任务永远不会被认领）"""
+    dead = _reap_dead_workers()
+    return [stage for stage in JOB_KINDS.get(kind, []) if stage not in job_pool.worker_counts or stage in dead]
+
+
+def _missing_workers_error(kind: str, missing: list) -> str:
+    dead = job_pool.dead_stages()
+    reasons = [dead.get(stage, f"JOB_WORKERS 中没有配置 '{stage}'") for stage in missing]
+    return f"没有可处理 '{kind}' 任务的 worker: {'；'.join(reasons)}"
+
+
+def _queue_full_response(e: QueueFullError):
+    retry_after = getattr(Config, 'JOB_RETRY_AFTER_SECONDS', 30)
+    return jsonify({'error': str(e), 'retry_after': retry_after}), 429, {'Retry-After': str(retry_after)}
+
+
+def _run_job(kind: str, payload: dict):
+    """
+    队列模式下同步接口的实现：提交任务并等待 worker 完成。
+    返回 (result, None)；超过 JOB_SYNC_TIMEOUT_SECONDS 仍未完成时返回 (None, job)，由调用方回复 202。
+    任务失败 / 被取消时抛出 RuntimeError，队列已满时抛出 QueueFullError。
+    """
+    missing = _missing_workers(kind)
+    if missing:
+        raise RuntimeError(_missing_workers_error(kind, missing))
+
+    job = job_store.submit(kind, payload)
+    deadline = time.time() + getattr(Config, 'JOB_SYNC_TIMEOUT_SECONDS', 600)
+    poll_interval = getattr(Config, 'JOB_EVENT_POLL_INTERVAL', 0.5)
+    while time.time() < deadline:
+        _reap_dead_workers()
+        job = job_store.get(job['id'])
+        if job['status'] == 'done':
+            return job['result'], None
+        if job['status'] in ('failed', 'cancelled'):
+            raise RuntimeError(job.get('error') or '任务已取消')
+        time.sleep(poll_interval)
+    return None, job
+
+
+def _job_accepted_response(job: dict):
+    """同步等待超时：返回 202，客户端改为查询 /api/jobs/<id> 或订阅其 events"""
+    return jsonify({'success': True, 'pending': True, 'job_id': job['id'], 'status': job['status'],
+                    'stage': job['stage']}), 202
+
+
+def _configured_adapters() -> list:
+    """队列模式下 Web 进程不加载翻译模型，按配置推算可选的 LoRA 适配器（与 NeuralTranslator 的注册逻辑一致）"""
+    adapters = dict(getattr(Config, 'LORA_ADAPTERS', None) or {})
+    if not adapters:
+        return []
+    if getattr(Config, 'USE_LORA', False):
+        adapters.setdefault('default', Config.LORA_MODEL_PATH)
+    return list(adapters) + [NeuralTranslator.BASE_ADAPTER]
+
+
+def _as_stream_events(event: dict) -> list:
+    """
+    把任务事件映射为 /api/transcribe/stream 的事件格式（与不启用队列时一致）：
+    start / segment / translation 原样推送，transcribed -> done（转录结果），
+    任务 done -> translated（有译文时），failed / cancelled -> error；其余任务生命周期事件不推送。
+    """
+    kind = event['event']
+    if kind in ('start', 'segment', 'translation'):
+        return [event]
+    if kind == 'transcribed':
+        return [dict(event, event='done')]
+    if kind == 'done':
+        result = event['result']
+        if result.get('segments') is None:
+            return []
+        return [{'event': 'translated', 'segments': result['segments'], 'stats': result.get('stats'),
+                 'timings': result.get('timings')}]
+    if kind in ('failed', 'cancelled'):
+        return [{'event': 'error', 'error': event.get('error') or '任务已取消'}]
+    return []
+
+
+def _job_event_stream(job_id: str, last_seq: int = 0, transform=None):
+    """
+    逐条产出任务事件的 SSE 文本：done 事件附带完整 result，终止事件后结束；空闲时发送 keep-alive 注释。
+    transform 把一条任务事件映射为要推送的事件列表（可为空），默认原样推送。
+    """
+    poll_interval = getattr(Config, 'JOB_EVENT_POLL_INTERVAL', 0.5)
+    heartbeat = getattr(Config, 'JOB_SSE_HEARTBEAT_SECONDS', 15)
+    last_sent = time.time()
+    while True:
+        events = job_store.events_since(job_id, last_seq)
+        if not events:
+            job = job_store.get(job_id)
+            if job is None:
+                return
+            if job['status'] in TERMINAL_EVENTS and not job_store.events_since(job_id, last_seq):
+                # 已结束任务的事件日志已按 JOB_EVENTS_RETENTION_SECONDS 清理：由任务记录补发终止事件
+                events = [{'event': job['status'], 'error': job.get('error'), 'seq': last_seq + 1}]
+        for event in events:
+            last_seq = event['seq']
+            if event['event'] == 'done':
+                event = dict(event, result=job_store.get(job_id)['result'])
+            for out in (transform(event) if transform else [event]):
+                yield f"id: {last_seq}\ndata: {json.dumps(out, ensure_ascii=False)}\n\n"
+            if event['event'] in TERMINAL_EVENTS:
+                return
+        if events:
+            last_sent = time.time()
+        else:
+            _reap_dead_workers()
+            if time.time() - last_sent >= heartbeat:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+        time.sleep(poll_interval)
+
+
 @app.route('/')
 def index():
     """渲染 Dashboard 界面"""
@@ -119,41 +294,250 @@ def transcribe_audio():
 
         logger.info(f"开始处理: {file_path} (Lang: {language})")
 
-        temp_dir = file_handler.create_temp_directory()
-
-        try:
-            # 1. 预处理音频
-            processed_audio_path = audio_processor.process_audio_for_transcription(
-                file_path, temp_dir
-            )
-
-            # 2. 调用 Whisper Transcriber 协调器
+        if job_store is not None:
+            # 队列模式：由 asr worker 转录，本线程只等待结果
+            job_result, pending = _run_job('transcribe', {'file_path': file_path, 'language': language})
+            if pending is not None:
+                return _job_accepted_response(pending)
+            result = job_result['transcript']
+        else:
+            # 调用 Whisper Transcriber 协调器：内部只解码一次，ASR / 时长 / VLM 时间轴共享同一份 PCM；
+            # 相同音频 + 相同设置命中转录缓存时直接返回
             logger.info("调用 Whisper Transcriber 进行 ASR 和 VLM 协调分析...")
             result = transcriber.transcribe(
-                media_path=processed_audio_path,
+                media_path=file_path,
                 language=language,
-                video_source_path=file_path 
+                video_source_path=file_path
             )
 
-            segments = result.get('segments', [])
-            logger.info(f"协调分析完成，返回 {len(segments)} 个片段。")
-
-            return jsonify({
-                'success': True,
-                'text': result['text'],
-                'segments': segments,
-                'language': result['language'],
-                'duration': result['duration']
-            })
+        segments = result.get('segments', [])
+        logger.info(f"协调分析完成，返回 {len(segments)} 个片段。")
 
-        finally:
-            file_handler.cleanup_temp_files(temp_dir)
+        return jsonify({
+            'success': True,
+            'text': result['text'],
+            'segments': segments,
+            'language': result['language'],
+            'duration': result['duration']
+        })
 
+    except QueueFullError as e:
+        return _queue_full_response(e)
     except Exception as e:
         logger.error(f"媒体处理失败: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/transcribe/stream', methods=['GET', 'POST'])
+def transcribe_audio_stream():
+    """
+    流式转录 API (Server-Sent Events)：逐段推送已解码的字幕片段，最后推送含 VLM 上下文的完整结果。
+    指定 target_language 时边转录边翻译：额外推送 translation（已完成的微批初译）和 translated（最终译文）事件。
+    队列模式下提交任务（有 stream worker 时为 'stream'，否则为 'transcribe' / 'process'），worker 逐段转录并上报，
+    这里转发为与非队列模式相同的事件；出错时推送 error。
+    """
+    data = request.get_json(silent=True) or request.args
+    file_path = data.get('file_path')
+    language = data.get('language', 'auto')
+    target_lang = data.get('target_language')
+
+    if not file_path or not os.path.exists(file_path):
+        return jsonify({'error': '文件不存在'}), 400
+
+    if job_store is not None:
+        kind = 'transcribe'
+        if target_lang:
+            kind = 'stream' if not _missing_workers('stream') else 'process'
+        missing = _missing_workers(kind)
+        if missing:
+            return jsonify({'error': _missing_workers_error(kind, missing)}), 503
+        payload = dict({k: v for k, v in data.items() if k != 'kind'}, stream=True)
+        if isinstance(payload.get('use_reflection'), str):
+            payload['use_reflection'] = payload['use_reflection'].lower() in ('1', 'true', 'yes')
+        try:
+            job = job_store.submit(kind, payload)
+        except QueueFullError as e:
+            return _queue_full_response(e)
+        logger.info(f"流式处理已提交为后台任务 {job['id']} ({kind}): {file_path}")
+        return Response(
+            stream_with_context(_job_event_stream(job['id'], transform=_as_stream_events)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    def _sse(payload):
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def generate():
+        try:
+            if target_lang:
+                use_reflection = data.get('use_reflection', False)
+                if isinstance(use_reflection, str):
+                    use_reflection = use_reflection.lower() in ('1', 'true', 'yes')
+                events = transcribe_and_translate_stream(
+                    transcriber, translator, file_path, target_lang, language=language,
+                    source_lang=data.get('source_language'), use_reflection=use_reflection,
+                    reflection_mode=data.get('reflection_mode'), adapter=data.get('adapter'))
+            else:
+                events = transcriber.transcribe_stream(media_path=file_path, language=language,
+                                                       video_source_path=file_path)
+            for event in events:
+                yield _sse(event)
+        except Exception as e:
+            logger.error(f"流式转录失败: {e}", exc_info=True)
+            yield _sse({'event': 'error', 'error': str(e)})
+
+    logger.info(f"开始流式处理: {file_path} (Lang: {language})")
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/transcript-cache/stats')
+def transcript_cache_stats():
+    """转录缓存命中率统计"""
+    if transcriber is None:
+        # 队列模式：缓存由 asr worker 使用，命中计数在 worker 进程内，这里只统计磁盘占用
+        if not getattr(Config, 'TRANSCRIPT_CACHE_ENABLED', False):
+            return jsonify({'enabled': False})
+        cache = TranscriptCache(
+            cache_dir=getattr(Config, 'TRANSCRIPT_CACHE_DIR', 'cache/transcripts'),
+            max_bytes=int(getattr(Config, 'TRANSCRIPT_CACHE_MAX_MB', 512)) * 1024 * 1024,
+        )
+        stats = cache.stats()
+        return jsonify({'enabled': True, 'entries': stats['entries'], 'bytes': stats['bytes'],
+                        'max_bytes': stats['max_bytes']})
+    if transcriber.transcript_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(transcriber.transcript_cache.stats(), enabled=True))
+
+
+@app.route('/api/lora-adapters')
+def lora_adapters():
+    """已注册 / 已加载的 LoRA 适配器"""
+    if translator is None:
+        # 队列模式：适配器在 nmt worker 中加载，这里只返回配置中注册的名称
+        registered = [name for name in _configured_adapters() if name != NeuralTranslator.BASE_ADAPTER]
+        if not registered:
+            return jsonify({'enabled': False})
+        return jsonify({'enabled': True, 'registered': registered,
+                        'default': 'default' if 'default' in registered else None})
+    if translator.adapter_registry is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(translator.adapter_registry.stats(), enabled=True,
+                        default=translator.default_adapter))
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    提交后台任务，立即返回 job_id（202）。
+    kind: 'transcribe' (ASR+VLM) / 'translate' (翻译 segments) / 'process' (转录后翻译) /
+    'pipeline' (单进程多阶段流水线) / 'stream' (边转录边翻译)，后两者需在 JOB_WORKERS 中配置对应 worker，
+    否则返回 503；
+    其余字段与 /api/transcribe、/api/translate 的请求参数相同。队列已满时返回 429。
+    """
+    if job_store is None:
+        return jsonify({'error': '后台任务队列未启用'}), 503
+    try:
+        data = request.get_json() or {}
+        kind = data.get('kind', 'process')
+        payload = {k: v for k, v in data.items() if k != 'kind'}
+
+        if kind in ('transcribe', 'process', 'pipeline', 'stream'):
+            file_path = payload.get('file_path')
+            if not file_path or not os.path.exists(file_path):
+                return jsonify({'error': '文件不存在'}), 400
+        elif not payload.get('segments'):
+            return jsonify({'error': '没有字幕内容'}), 400
+
+        # 没有对应 worker 的任务永远不会被认领，还会占用排队名额，直接拒绝
+        missing = _missing_workers(kind)
+        if missing:
+            return jsonify({'error': _missing_workers_error(kind, missing)}), 503
+
+        job = job_store.submit(kind, payload)
+        return jsonify({'success': True, 'job_id': job['id'], 'status': job['status'],
+                        'stage': job['stage']}), 202
+
+    except QueueFullError as e:
+        return _queue_full_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"任务提交失败: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """最近的任务列表 + 各阶段队列深度"""
+    if job_store is None:
+        return jsonify({'enabled': False})
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'enabled': True, 'jobs': job_store.list_jobs(limit), 'stats': job_store.stats(),
+                    'workers': job_pool.alive(), 'dead_stages': _reap_dead_workers()})
+
+
+@app.route('/api/jobs/stats')
+def job_stats():
+    """队列深度、存活 worker，以及 pipeline worker 最近上报的各阶段利用率 / 队列深度"""
+    if job_store is None:
+        return jsonify({'enabled': False})
+    latest = job_store.latest_result('pipeline') or {}
+    return jsonify({'enabled': True, 'stats': job_store.stats(), 'workers': job_pool.alive(),
+                    'dead_stages': _reap_dead_workers(), 'pipeline_metrics': latest.get('pipeline_metrics')})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态；完成后 result 中包含 transcript / segments / translations"""
+    if job_store is None:
+        return jsonify({'error': '后台任务队列未启用'}), 503
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    任务进度 (Server-Sent Events)：推送阶段切换 (queued / stage / stage_done)、按音频秒数计算的进度
+    (percent) 以及陆续产出的部分片段 / 译文；任务结束时推送 done（附完整 result）/ failed / cancelled 后关闭。
+    断线重连时浏览器会带上 Last-Event-ID，从该事件之后继续推送。
+    """
+    if job_store is None:
+        return jsonify({'error': '后台任务队列未启用'}), 503
+    if job_store.get(job_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+
+    last_seq = request.headers.get('Last-Event-ID') or request.args.get('after', 0)
+    try:
+        last_seq = int(last_seq)
+    except (TypeError, ValueError):
+        last_seq = 0
+    return Response(
+        stream_with_context(_job_event_stream(job_id, last_seq)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消尚未开始处理的任务"""
+    if job_store is None:
+        return jsonify({'error': '后台任务队列未启用'}), 503
+    if job_store.get(job_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if not job_store.cancel(job_id):
+        return jsonify({'error': '任务已开始处理或已结束，无法取消'}), 409
+    return jsonify({'success': True, 'job_id': job_id, 'status': 'cancelled'})
+
+
 @app.route('/api/translate', methods=['POST'])
 def translate_subtitle():
     """
@@ -163,13 +547,55 @@ def translate_subtitle():
         data = request.get_json()
         segments = data.get('segments', [])
         target_lang = data.get('target_language', 'zh-cn')
+        # 可选：一次请求翻译成多种语言（编码器只运行一次）
+        target_langs = data.get('target_languages')
         source_lang = data.get('source_language', 'auto')
 
         use_reflection = data.get('use_reflection', False)
+        reflection_mode = data.get('reflection_mode')  # 'all' / 'selective' / 'window'，默认取 Config.REFLECTION_MODE
+        adapter = data.get('adapter')  # LoRA 适配器名称（Config.LORA_ADAPTERS），默认使用 default 适配器
 
         if not segments:
             return jsonify({'error': '没有字幕内容'}), 400
 
+        available = translator.available_adapters() if translator is not None else _configured_adapters()
+        if adapter and adapter not in available:
+            return jsonify({'error': f'未知的 LoRA 适配器: {adapter}', 'available': available}), 400
+
+        if target_langs and not isinstance(target_langs, list):
+            return jsonify({'error': 'target_languages 必须是语言代码列表'}), 400
+
+        if job_store is not None:
+            # 队列模式：由 nmt worker 翻译，本线程只等待结果
+            job_result, pending = _run_job('translate', {
+                'segments': segments,
+                'target_language': target_lang,
+                'target_languages': target_langs,
+                'source_language': source_lang,
+                'use_reflection': use_reflection,
+                'reflection_mode': reflection_mode,
+                'adapter': adapter
+            })
+            if pending is not None:
+                return _job_accepted_response(pending)
+            return jsonify(dict(job_result, success=True))
+
+        if target_langs:
+            logger.info(f"开始多语言翻译请求: {len(segments)} segments -> {target_langs}")
+            translations = translator.translate_segments_multi(
+                segments=segments,
+                target_langs=target_langs,
+                source_lang=source_lang,
+                use_reflection=use_reflection,
+                reflection_mode=reflection_mode,
+                adapter=adapter
+            )
+            return jsonify({
+                'success': True,
+                'translations': translations,
+                'stats': translator.last_job_stats
+            })
+
         logger.info(f"开始翻译请求: {len(segments)} segments -> {target_lang}")
         if use_reflection:
             logger.info("🚀 启用 Agent 反思模式 (Reflection Mode)")
@@ -179,14 +605,19 @@ def translate_subtitle():
             segments=segments,
             target_lang=target_lang,
             source_lang=source_lang,
-            use_reflection=use_reflection
+            use_reflection=use_reflection,
+            reflection_mode=reflection_mode,
+            adapter=adapter
         )
 
         return jsonify({
             'success': True,
-            'segments': translated_segments
+            'segments': translated_segments,
+            'stats': translator.last_job_stats
         })
 
+    except QueueFullError as e:
+        return _queue_full_response(e)
     except Exception as e:
         logger.error(f"字幕翻译失败: {e}")
         return jsonify({'error': f"翻译引擎错误: {str(e)}"}), 500
@@ -231,6 +662,28 @@ def generate_subtitle():
         logger.error(f"字幕文件生成失败: {e}")
         return jsonify({'error': str(e)}), 500
     
+@app.route('/api/process-complete', methods=['POST'])
+def process_complete():
+    """前端下载完字幕后调用：删除本次上传的源文件（仅限上传目录内）"""
+    try:
+        data = request.get_json() or {}
+        file_path = data.get('file_path')
+        if not file_path:
+            return jsonify({'error': '缺少 file_path'}), 400
+
+        upload_root = os.path.realpath(Config.UPLOAD_FOLDER)
+        real_path = os.path.realpath(file_path)
+        if os.path.commonpath([upload_root, real_path]) != upload_root:
+            return jsonify({'error': '只能清理上传目录中的文件'}), 400
+
+        deleted = file_handler.delete_file(real_path)
+        return jsonify({'success': True, 'deleted': deleted})
+
+    except Exception as e:
+        logger.error(f"清理上传文件失败: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.post("/api/upload-reference")
 def upload_reference():
     try:
@@ -293,7 +746,7 @@ def download_file(filename):
 def get_languages():
     """获取支持语言 - 对接翻译模型"""
     try:
-        languages = translator.get_supported_languages()
+        languages = NeuralTranslator.get_supported_languages()
         return jsonify(languages)
     except Exception as e:
         logger.error(f"获取语言列表失败: {e}")
@@ -301,6 +754,8 @@ def get_languages():
 
 
 if __name__ == '__main__':
+    create_app()
+
     # 检查 FFmpeg
     if not audio_processor.check_ffmpeg():
         print("\n⚠️  警告: 未检测到 FFmpeg!")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+ASR 后端对比基准测试 (CPU)
+并排比较 openai-whisper (fp32) 与 faster-whisper (int8 / int8_float32) 的实时率和峰值内存。
+
+用法:
+    python benchmarks/bench_asr_backends.py path/to/audio.wav --model small --seconds 300
+"""
+
+import os
+import sys
+import time
+import resource
+import argparse
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CASES = [
+    ("openai-whisper", None),
+    ("faster-whisper", "int8"),
+    ("faster-whisper", "int8_float32"),
+]
+
+
+def _run_case(backend: str, compute_type: str, model_name: str, media_path: str, seconds: float, queue):
+    from models.whisper_model_fixed import create_asr_backend
+    from utils.audio_processor import AudioProcessor, SAMPLE_RATE
+
+    audio = AudioProcessor(ingest_mode="memory").decode_audio(media_path)
+    samples = audio.to_float32(0, int(seconds * SAMPLE_RATE))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    load_start = time.perf_counter()
+    asr = create_asr_backend(backend, model_name, device="cpu", compute_type=compute_type)
+    load_time = time.perf_counter() - load_start
+
+    start = time.perf_counter()
+    result = asr.transcribe(samples, language=None, beam_size=3)
+    elapsed = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    duration = len(samples) / SAMPLE_RATE
+    queue.put((backend, compute_type or "fp32", load_time, elapsed / duration, peak_rss - rss_before,
+               len(result["segments"])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASR 后端 RTF / 内存对比 (CPU)")
+    parser.add_argument("media", help="音频或视频文件路径")
+    parser.add_argument("--model", default="small", help="Whisper 模型大小")
+    parser.add_argument("--seconds", type=float, default=300, help="测试音频长度（秒）")
+    args = parser.parse_args()
+
+    # 每个后端在独立子进程中运行，保证内存统计互不影响
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    rows = []
+    for backend, compute_type in CASES:
+        proc = ctx.Process(target=_run_case,
+                           args=(backend, compute_type, args.model, args.media, args.seconds, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode == 0:
+            rows.append(queue.get())
+        else:
+            print(f"⚠️ {backend} ({compute_type}) 运行失败，跳过")
+
+    print("\n" + "=" * 84)
+    print(f"{'Backend':<16} | {'Compute':<13} | {'Load (s)':>8} | {'RTF':>7} | {'Model RSS (MB)':>14} | {'Segments':>8}")
+    print("-" * 84)
+    for backend, compute, load_time, rtf, rss, n_segments in rows:
+        print(f"{backend:<16} | {compute:<13} | {load_time:>8.1f} | {rtf:>7.3f} | {rss:>14.1f} | {n_segments:>8}")
+    print("=" * 84)
+
+
+if __name__ == "__main__":
+    main()
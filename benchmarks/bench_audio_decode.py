@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+音频解码基准测试
+统计每个转录请求的解码次数与峰值 RSS：
+  - legacy: 旧流程 (ffmpeg 提取 → pydub 转换 → whisper.load_audio ×2 + 两个临时张量)
+  - single: 新流程 (AudioProcessor.decode_audio 一次，ffmpeg 管道直接写入 NumPy，DecodedAudio 贯穿全流程)
+  - mmap:   同 single，但 PCM 写入 memmap 临时文件（超长输入模式）
+
+用法:
+    python benchmarks/bench_audio_decode.py path/to/video.mp4 [--with-asr tiny]
+"""
+
+import os
+import sys
+import time
+import resource
+import argparse
+import tempfile
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _peak_rss_mb() -> float:
+    """当前进程峰值 RSS（MB，Linux 下 ru_maxrss 单位为 KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _run_legacy(media_path: str, asr_model: str, queue):
+    import torch
+    import whisper
+    from utils.audio_processor import AudioProcessor
+
+    processor = AudioProcessor()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # 旧流程: ffmpeg 写 extracted_audio.wav → pydub 读回并写 processed_audio.wav
+        extracted_path = processor.extract_audio_from_video(media_path, os.path.join(temp_dir, 'extracted_audio.wav'))
+        processed_path = processor.convert_audio_format(extracted_path, os.path.join(temp_dir, 'processed_audio.wav'))
+
+        audio = whisper.load_audio(processed_path)
+        audio_tensor = torch.from_numpy(audio).float()
+        audio_tensor_processed = torch.from_numpy(audio).float().unsqueeze(0)
+        audio_for_transcribe = whisper.load_audio(processed_path)
+        decode_passes = processor.decode_passes + 2
+
+        if asr_model:
+            model = whisper.load_model(asr_model, device="cpu")
+            model.transcribe(audio_for_transcribe, fp16=False, beam_size=3)
+        del audio_tensor, audio_tensor_processed
+
+    queue.put(("legacy", decode_passes, time.perf_counter() - start, _peak_rss_mb()))
+
+
+def _run_single(media_path: str, asr_model: str, queue, ingest_mode: str = "memory"):
+    from utils.audio_processor import AudioProcessor
+
+    processor = AudioProcessor(ingest_mode=ingest_mode)
+    start = time.perf_counter()
+    audio = processor.decode_audio(media_path)
+
+    if asr_model:
+        import whisper
+        model = whisper.load_model(asr_model, device="cpu")
+        model.transcribe(audio.to_float32(), fp16=False, beam_size=3)
+    audio.close()
+
+    mode = "single" if ingest_mode == "memory" else ingest_mode
+    queue.put((mode, processor.decode_passes, time.perf_counter() - start, _peak_rss_mb()))
+
+
+def _run_mmap(media_path: str, asr_model: str, queue):
+    _run_single(media_path, asr_model, queue, ingest_mode="mmap")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音频解码次数 / 峰值 RSS 基准")
+    parser.add_argument("media", help="音频或视频文件路径")
+    parser.add_argument("--with-asr", default="", help="同时运行指定的 Whisper 模型 (如 tiny)，测量完整请求")
+    args = parser.parse_args()
+
+    # 每种模式在独立子进程中运行，保证峰值 RSS 互不影响
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    results = []
+    for target in (_run_legacy, _run_single, _run_mmap):
+        proc = ctx.Process(target=target, args=(args.media, args.with_asr, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    print("\n" + "=" * 64)
+    print(f"{'Mode':<10} | {'Decode passes':>13} | {'Wall (s)':>9} | {'Peak RSS (MB)':>13}")
+    print("-" * 64)
+    for mode, passes, wall, rss in results:
+        print(f"{mode:<10} | {passes:>13} | {wall:>9.2f} | {rss:>13.1f}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
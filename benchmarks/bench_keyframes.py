@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+VLM 关键帧选择策略对比：片段中点 (segments) vs 镜头切换 (scene)
+segments：每个 ASR 片段中点一帧，1 秒最小间隔去重后按时长均匀采样，帧数随语音密度增长；
+scene：低分辨率缩略帧上做镜头边界检测，每个镜头一帧，帧数随镜头切换次数增长。
+输出两种策略的帧数、镜头检测耗时、抽帧 + 场景描述耗时。
+
+用法:
+    python benchmarks/bench_keyframes.py path/to/video.mp4 --whisper-model small --device cuda
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VLM 关键帧选择策略对比")
+    parser.add_argument("video", help="测试用的视频文件（对话类 / 多镜头类各测一个更直观）")
+    parser.add_argument("--whisper-model", default="small", help="Whisper 模型大小")
+    parser.add_argument("--device", default="cpu", help="cpu 或 cuda")
+    parser.add_argument("--threshold", type=float, default=None, help="镜头切换阈值 (默认取 Config)")
+    args = parser.parse_args()
+
+    from config import Config
+    Config.TRANSCRIPT_CACHE_ENABLED = False
+    if args.threshold is not None:
+        Config.SCENE_CUT_THRESHOLD = args.threshold
+
+    from models.whisper_model_fixed import WhisperTranscriber
+
+    transcriber = WhisperTranscriber(model_name=args.whisper_model, device=args.device)
+    vlm = transcriber.vlm_analyzer
+    if vlm is None or vlm.vit_gpt2_model is None:
+        print("VLM 模型不可用，无法对比")
+        return
+
+    # 两种策略共用同一份 ASR 片段
+    audio = transcriber.audio_processor.decode_audio(args.video)
+    try:
+        result = transcriber._run_asr(audio, transcriber._asr_options("auto", "transcribe"))
+        duration = audio.duration
+    finally:
+        audio.close()
+    segments = result["segments"]
+
+    rows = []
+    for strategy in ("segments", "scene"):
+        transcriber.keyframe_strategy = strategy
+        start = time.perf_counter()
+        timestamps, shots = transcriber._plan_keyframes(segments, duration, args.video)
+        plan_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        frame_ctx_cache = vlm.analyze_frames(args.video, timestamps) if timestamps else {}
+        vlm_seconds = time.perf_counter() - start
+
+        final_segments, _ = transcriber._assemble_segments(segments, frame_ctx_cache, True, shots)
+        matched = sum(1 for seg in final_segments if seg["av_context"].get("description") != "No scene information")
+        rows.append((strategy, len(timestamps), len(shots) if shots else "-", plan_seconds, vlm_seconds, matched))
+
+    print("\n" + "=" * 78)
+    print(f"Video: {duration:.0f}s, Segments: {len(segments)}")
+    print("-" * 78)
+    print(f"{'Strategy':<10} | {'Frames':>6} | {'Shots':>5} | {'Plan (s)':>8} | {'VLM (s)':>7} | "
+          f"{'Total (s)':>9} | {'Matched segs':>12}")
+    print("-" * 78)
+    for strategy, frames, shots, plan_seconds, vlm_seconds, matched in rows:
+        print(f"{strategy:<10} | {frames:>6} | {shots:>5} | {plan_seconds:>8.2f} | {vlm_seconds:>7.1f} | "
+              f"{plan_seconds + vlm_seconds:>9.1f} | {matched:>12}")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+长音频分块转录基准测试
+测量不同音频长度、不同工作进程数下的实时率 (RTF = 处理耗时 / 音频时长)，
+用于验证吞吐量随 CPU 核数近似线性增长。
+
+用法:
+    python benchmarks/bench_long_form.py path/to/long_video.mp4 --model tiny --lengths 300 900 1800 --workers 1 2 4
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.whisper_model_fixed import WhisperTranscriber
+from utils.audio_processor import AudioProcessor, DecodedAudio, SAMPLE_RATE
+
+
+def run_case(transcriber: WhisperTranscriber, audio: DecodedAudio, workers: int) -> float:
+    """返回给定进程数下的 RTF（不含进程池启动和模型加载时间）"""
+    transcriber.shutdown_workers()
+    transcriber.asr_workers = workers
+    transcriber.asr_threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    # 预热：让每个工作进程完成模型加载
+    warmup = DecodedAudio(audio.pcm[:SAMPLE_RATE * 5], SAMPLE_RATE)
+    pool = transcriber._get_asr_pool()
+    list(pool.map(_noop, range(workers)))
+    transcriber._transcribe_long_form(warmup, {"language": "en", "beam_size": 3})
+
+    start = time.perf_counter()
+    transcriber._transcribe_long_form(audio, {"language": None, "beam_size": 3, "task": "transcribe"})
+    return (time.perf_counter() - start) / audio.duration
+
+
+def _noop(_):
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长音频分块转录 RTF 基准")
+    parser.add_argument("media", help="音频或视频文件路径（应不短于最大测试长度）")
+    parser.add_argument("--model", default="tiny", help="Whisper 模型大小")
+    parser.add_argument("--lengths", nargs="+", type=float, default=[300, 900, 1800], help="测试的音频长度（秒）")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4], help="测试的工作进程数")
+    args = parser.parse_args()
+
+    full_audio = AudioProcessor(ingest_mode="memory").decode_audio(args.media)
+    transcriber = WhisperTranscriber(model_name=args.model, device="cpu", enable_vlm=False)
+
+    rows = []
+    for length in args.lengths:
+        if length > full_audio.duration:
+            print(f"跳过 {length:.0f}s：输入仅 {full_audio.duration:.0f}s")
+            continue
+        audio = DecodedAudio(full_audio.pcm[:int(length * SAMPLE_RATE)], SAMPLE_RATE)
+        baseline = None
+        for workers in args.workers:
+            rtf = run_case(transcriber, audio, workers)
+            baseline = baseline or rtf
+            rows.append((length, workers, rtf, baseline / rtf))
+
+    transcriber.shutdown_workers()
+
+    print("\n" + "=" * 60)
+    print(f"{'Audio (s)':>10} | {'Workers':>7} | {'RTF':>8} | {'Speedup vs first':>17}")
+    print("-" * 60)
+    for length, workers, rtf, speedup in rows:
+        print(f"{length:>10.0f} | {workers:>7} | {rtf:>8.3f} | {speedup:>16.2f}x")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+LoRA 合并 vs 未合并 的 beam search 延迟对比
+同一批句子分别用「PeftModel 挂载适配器」与「merge_and_unload 合并权重」翻译，
+比较平均每批延迟与吞吐，并检查两者输出是否一致。
+
+用法:
+    python benchmarks/bench_lora_merge.py --lora models/lora_nllb_terminology --segments 64 --device cpu
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "finetune", "eval", "data.json")
+
+
+def _run_case(merge: bool, model_id: str, lora_path: str, device: str, texts, repeats: int, queue):
+    from config import Config
+    from models.translator import NeuralTranslator
+
+    Config.LORA_MERGE_ON_LOAD = merge
+    Config.LORA_MERGED_SAVE_PATH = None
+    translator = NeuralTranslator(nmt_model_id=model_id, lora_model_id=lora_path, device=device,
+                                  use_translation_memory=False)
+    translator.glossary = None  # 只测 beam search 本身
+
+    translator._translate_batch(texts[:4], "en", "zh")  # 预热
+    timings = []
+    outputs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = translator._translate_batch(texts, "en", "zh")
+        timings.append(time.perf_counter() - start)
+    queue.put(("merged" if merge else "adapter", translator.lora_merged, min(timings), outputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LoRA 合并前后 beam search 延迟对比")
+    parser.add_argument("--model", default="facebook/nllb-200-distilled-600M", help="NLLB 基础模型 ID")
+    parser.add_argument("--lora", default="models/lora_nllb_terminology", help="LoRA 适配器目录")
+    parser.add_argument("--device", default="cpu", help="cpu 或 cuda")
+    parser.add_argument("--segments", type=int, default=64, help="测试句子数")
+    parser.add_argument("--repeats", type=int, default=3, help="重复次数（取最快一次）")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="源句子数据 (JSON 列表，含 src 字段)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.lora):
+        print(f"❌ LoRA 目录不存在: {args.lora}")
+        return
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        texts = [r["src"] for r in json.load(f)[:args.segments]]
+
+    # 每种模式在独立子进程中加载模型，互不影响
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    rows = []
+    for merge in (False, True):
+        proc = ctx.Process(target=_run_case,
+                           args=(merge, args.model, args.lora, args.device, texts, args.repeats, queue))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        rows.append(result)
+
+    print("\n" + "=" * 66)
+    print(f"{'Mode':<8} | {'Merged':<6} | {'Batch (s)':>9} | {'Seg/s':>8} | {'ms/segment':>10}")
+    print("-" * 66)
+    for mode, merged, elapsed, _ in rows:
+        print(f"{mode:<8} | {str(merged):<6} | {elapsed:>9.2f} | {len(texts) / elapsed:>8.2f} | "
+              f"{elapsed / len(texts) * 1000:>10.1f}")
+    print("=" * 66)
+    if len(rows) == 2:
+        identical = sum(a == b for a, b in zip(rows[0][3], rows[1][3]))
+        print(f"输出一致: {identical}/{len(texts)}  加速比: {rows[0][2] / rows[1][2]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+NLLB 批量翻译调度基准测试
+对比旧实现（整个文件一次性 padding 成一个批）与按长度分桶的微批调度，
+在不同文件规模下的吞吐 (segments/s) 与峰值内存。
+
+用法:
+    python benchmarks/bench_nmt_batching.py --sizes 50 200 500 --device cpu
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "finetune", "eval", "data.json")
+
+
+def _load_sentences(path: str, size: int):
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    sources = [r["src"] for r in records]
+    # 数据不足时循环补齐，模拟更长的字幕文件
+    return [sources[i % len(sources)] for i in range(size)]
+
+
+def _run_case(mode: str, size: int, model_id: str, device: str, data_path: str, queue):
+    import torch
+    from models.translator import NeuralTranslator
+
+    texts = _load_sentences(data_path, size)
+    translator = NeuralTranslator(nmt_model_id=model_id, device=device, use_translation_memory=False)
+    if mode == "legacy":
+        # 旧行为：所有片段 padding 到同一长度，一次 generate
+        translator.nmt_batch_token_budget = 1 << 62
+        translator.nmt_max_batch_size = len(texts)
+
+    if translator.device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    start = time.perf_counter()
+    try:
+        translator._translate_batch(texts, "en", "zh")
+        status = "ok"
+    except RuntimeError as e:
+        status = "OOM" if "out of memory" in str(e).lower() else "error"
+    elapsed = time.perf_counter() - start
+
+    if translator.device.type == "cuda":
+        peak_mb = torch.cuda.max_memory_allocated() / (1024.0 ** 2)
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 - rss_before
+    queue.put((mode, size, status, size / elapsed if status == "ok" else 0.0, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NLLB 分桶微批 vs 单批 吞吐/内存对比")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 500], help="测试的片段数量")
+    parser.add_argument("--model", default="facebook/nllb-200-distilled-600M", help="NLLB 模型 ID")
+    parser.add_argument("--device", default="cpu", help="cpu 或 cuda")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="源句子数据 (JSON 列表，含 src 字段)")
+    args = parser.parse_args()
+
+    # 每个用例在独立子进程中运行，保证峰值内存统计互不影响
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    rows = []
+    for size in args.sizes:
+        for mode in ("legacy", "bucketed"):
+            proc = ctx.Process(target=_run_case,
+                               args=(mode, size, args.model, args.device, args.data, queue))
+            proc.start()
+            proc.join()
+            if proc.exitcode == 0:
+                rows.append(queue.get())
+            else:
+                print(f"⚠️ {mode} ({size} segments) 运行失败，跳过")
+
+    mem_label = "Peak VRAM (MB)" if args.device == "cuda" else "Peak RSS (MB)"
+    print("\n" + "=" * 70)
+    print(f"{'Mode':<10} | {'Segments':>8} | {'Status':<6} | {'Seg/s':>8} | {mem_label:>16}")
+    print("-" * 70)
+    for mode, size, status, throughput, peak_mb in rows:
+        print(f"{mode:<10} | {size:>8} | {status:<6} | {throughput:>8.2f} | {peak_mb:>16.1f}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+NMT 推理引擎吞吐对比：transformers vs CTranslate2
+同一批句子 (en -> zh) 分别通过两种引擎的 _translate_batch 翻译，报告加载时间、吞吐和峰值内存。
+CTranslate2 首次运行会触发模型转换，转换耗时计入加载时间，之后复用 CT2_MODEL_DIR 中的缓存。
+
+用法:
+    python benchmarks/bench_nmt_engines.py --model facebook/nllb-200-distilled-600M --segments 200 --device cpu
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "finetune", "eval", "data.json")
+ENGINES = ["transformers", "ctranslate2"]
+
+
+def _run_case(engine: str, model_id: str, lora_path: str, device: str, texts, queue):
+    from config import Config
+    from models.translator import NeuralTranslator
+
+    Config.NMT_ENGINE = engine
+    load_start = time.perf_counter()
+    translator = NeuralTranslator(nmt_model_id=model_id, lora_model_id=lora_path, device=device,
+                                  use_translation_memory=False)
+    load_time = time.perf_counter() - load_start
+    translator.glossary = None  # 只比较 beam search 本身
+
+    translator._translate_batch(texts[:4], "en", "zh")  # 预热
+    start = time.perf_counter()
+    outputs = translator._translate_batch(texts, "en", "zh")
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    queue.put((engine, load_time, elapsed, peak_rss, outputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="transformers vs CTranslate2 NMT 吞吐对比")
+    parser.add_argument("--model", default="facebook/nllb-200-distilled-600M", help="NLLB 模型 ID")
+    parser.add_argument("--lora", default=None, help="LoRA 适配器目录（会先合并）")
+    parser.add_argument("--device", default="cpu", help="cpu 或 cuda")
+    parser.add_argument("--segments", type=int, default=200, help="测试句子数")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="源句子数据 (JSON 列表，含 src 字段)")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        texts = [r["src"] for r in json.load(f)[:args.segments]]
+
+    # 每个引擎在独立子进程中运行，保证内存统计互不影响
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    rows = []
+    for engine in ENGINES:
+        proc = ctx.Process(target=_run_case, args=(engine, args.model, args.lora, args.device, texts, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode == 0:
+            rows.append(queue.get())
+        else:
+            print(f"⚠️ {engine} 运行失败，跳过")
+
+    print("\n" + "=" * 70)
+    print(f"{'Engine':<12} | {'Load (s)':>8} | {'Translate (s)':>13} | {'Seg/s':>8} | {'Peak RSS (MB)':>13}")
+    print("-" * 70)
+    for engine, load_time, elapsed, peak_rss, _ in rows:
+        print(f"{engine:<12} | {load_time:>8.1f} | {elapsed:>13.1f} | {len(texts) / elapsed:>8.2f} | {peak_rss:>13.1f}")
+    print("=" * 70)
+    if len(rows) == 2:
+        identical = sum(a == b for a, b in zip(rows[0][4], rows[1][4]))
+        print(f"输出完全一致的句子: {identical}/{len(texts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+NLLB CPU 量化质量/速度报告
+在 data/finetune/eval 上分别以 float32 与动态 int8 运行 NeuralTranslator (en -> zh)，
+用 SacreBLEUEvaluator 计算 BLEU，并报告加载时间、翻译耗时与峰值内存，便于按部署选择配置。
+
+用法:
+    python benchmarks/bench_nmt_quantization.py --model facebook/nllb-200-distilled-600M --limit 200
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "finetune", "eval", "data.json")
+MODES = [None, "dynamic-int8"]
+
+
+def _run_case(quantization, model_id: str, lora_path: str, records, queue):
+    from config import Config
+    from models.translator import NeuralTranslator
+    from models.evaluator_bleu import SacreBLEUEvaluator
+
+    Config.NMT_QUANTIZATION = quantization
+    Config.LORA_MERGED_SAVE_PATH = None
+
+    load_start = time.perf_counter()
+    translator = NeuralTranslator(nmt_model_id=model_id, lora_model_id=lora_path, device="cpu",
+                                  use_translation_memory=False)
+    load_time = time.perf_counter() - load_start
+
+    sources = [r["src"] for r in records]
+    references = [r["tgt"] for r in records]
+    start = time.perf_counter()
+    hypotheses = translator._translate_batch(sources, "en", "zh")
+    elapsed = time.perf_counter() - start
+
+    bleu = SacreBLEUEvaluator().evaluate_lines(references, hypotheses, tokenize="zh")
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    queue.put({
+        "mode": quantization or "float32",
+        "quantized": translator.nmt_quantized,
+        "load_seconds": round(load_time, 1),
+        "translate_seconds": round(elapsed, 1),
+        "segments_per_second": round(len(sources) / elapsed, 2),
+        "bleu": round(bleu["score"], 2),
+        "peak_rss_mb": round(peak_rss, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NLLB float32 vs 动态 int8 (CPU) BLEU / 速度报告")
+    parser.add_argument("--model", default="facebook/nllb-200-distilled-600M", help="NLLB 模型 ID")
+    parser.add_argument("--lora", default=None, help="LoRA 适配器目录（会先合并再量化）")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="评估集 (JSON 列表，含 src/tgt 字段)")
+    parser.add_argument("--limit", type=int, default=200, help="评估句子数上限")
+    parser.add_argument("--output", default=None, help="可选：把报告写入 JSON 文件")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        records = json.load(f)[:args.limit]
+
+    # 每种模式在独立子进程中运行，保证峰值内存统计互不影响
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    rows = []
+    for quantization in MODES:
+        proc = ctx.Process(target=_run_case, args=(quantization, args.model, args.lora, records, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode == 0:
+            rows.append(queue.get())
+        else:
+            print(f"⚠️ {quantization or 'float32'} 运行失败，跳过")
+
+    print("\n" + "=" * 82)
+    print(f"{'Mode':<14} | {'Load (s)':>8} | {'Translate (s)':>13} | {'Seg/s':>7} | {'BLEU':>6} | {'Peak RSS (MB)':>13}")
+    print("-" * 82)
+    for row in rows:
+        print(f"{row['mode']:<14} | {row['load_seconds']:>8.1f} | {row['translate_seconds']:>13.1f} | "
+              f"{row['segments_per_second']:>7.2f} | {row['bleu']:>6.2f} | {row['peak_rss_mb']:>13.1f}")
+    print("=" * 82)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "segments": len(records), "results": rows}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"报告已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+QE 打分基准测试（10k 片段级别）
+对比旧实现（N×N cos_sim 矩阵取对角线）与逐行点积 + 源文本向量缓存（冷/热缓存）的耗时和峰值内存。
+
+用法:
+    python benchmarks/bench_qe_scoring.py --segments 10000 --device cpu
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing as mp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "finetune", "eval", "data.json")
+MODES = ["legacy", "rowwise_cold", "rowwise_warm"]
+
+
+def _load_pairs(path: str, size: int):
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    # 加上序号保证文本互不相同，模拟长视频的字幕文件
+    return ([f"{records[i % len(records)]['src']} ({i})" for i in range(size)],
+            [f"{records[i % len(records)]['tgt']} ({i})" for i in range(size)])
+
+
+def _run_case(mode: str, model_id: str, device: str, sources, translations, queue):
+    from sentence_transformers import SentenceTransformer, util
+    from utils.embedding_cache import EmbeddingCache, encode_normalized, rowwise_cosine
+
+    model = SentenceTransformer(model_id, device=device)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    cache = EmbeddingCache(len(sources))
+    if mode == "rowwise_warm":
+        encode_normalized(model, sources, cache)  # 模拟同一文件翻译成另一种语言时的热缓存
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        src = model.encode(sources, convert_to_tensor=True, show_progress_bar=False)
+        trans = model.encode(translations, convert_to_tensor=True, show_progress_bar=False)
+        scores = util.cos_sim(src, trans).diag().cpu().numpy()
+    else:
+        src = encode_normalized(model, sources, cache)
+        trans = encode_normalized(model, translations)
+        scores = rowwise_cosine(src, trans)
+    elapsed = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    queue.put((mode, elapsed, peak_rss - rss_before, float(scores.mean())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QE 打分：N×N 矩阵 vs 逐行点积 + 向量缓存")
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                        help="QE 句向量模型 ID")
+    parser.add_argument("--device", default="cpu", help="cpu 或 cuda")
+    parser.add_argument("--segments", type=int, default=10000, help="片段数量")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="平行语料 (JSON 列表，含 src/tgt 字段)")
+    args = parser.parse_args()
+
+    sources, translations = _load_pairs(args.data, args.segments)
+
+    # 每种模式在独立子进程中运行，保证峰值内存统计互不影响
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    rows = []
+    for mode in MODES:
+        proc = ctx.Process(target=_run_case, args=(mode, args.model, args.device, sources, translations, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode == 0:
+            rows.append(queue.get())
+        else:
+            print(f"⚠️ {mode} 运行失败，跳过")
+
+    print("\n" + "=" * 64)
+    print(f"{'Mode':<14} | {'Time (s)':>9} | {'Seg/s':>9} | {'Extra RSS (MB)':>14} | {'Mean':>6}")
+    print("-" * 64)
+    for mode, elapsed, rss, mean in rows:
+        print(f"{mode:<14} | {elapsed:>9.2f} | {args.segments / elapsed:>9.0f} | {rss:>14.1f} | {mean:>6.3f}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+反思模型批量生成基准测试 (CPU)
+比较 _reflect_batch 在不同 REFLECTION_BATCH_SIZE 下的吞吐 (segments/s)。
+
+用法:
+    python benchmarks/bench_reflection_batching.py --reflection-model Qwen/Qwen2.5-0.5B-Instruct --segments 32
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "finetune", "eval", "data.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="反思模型批量生成吞吐对比 (CPU)")
+    parser.add_argument("--reflection-model", default="Qwen/Qwen2.5-0.5B-Instruct", help="反思模型 ID")
+    parser.add_argument("--nmt-model", default="facebook/nllb-200-distilled-600M", help="NLLB 模型 ID")
+    parser.add_argument("--segments", type=int, default=32, help="测试片段数")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16], help="批大小")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="平行语料 (JSON 列表，含 src/tgt 字段)")
+    args = parser.parse_args()
+
+    from models.translator import NeuralTranslator
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        records = json.load(f)[:args.segments]
+    # 以参考译文充当 NMT 初译，只测反思阶段
+    items = [(r["src"], r["tgt"], {}, idx + 1) for idx, r in enumerate(records)]
+
+    translator = NeuralTranslator(nmt_model_id=args.nmt_model, reflection_model_id=args.reflection_model,
+                                  device="cpu", use_translation_memory=False)
+
+    # 预热，避免首批的初始化开销影响结果
+    translator.reflection_batch_size = 1
+    translator._reflect_batch(items[:1], "zh")
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        translator.reflection_batch_size = batch_size
+        start = time.perf_counter()
+        outputs = translator._reflect_batch(items, "zh")
+        elapsed = time.perf_counter() - start
+        fallbacks = sum(1 for (_, initial, _, _), out in zip(items, outputs) if out == initial)
+        rows.append((batch_size, elapsed, len(items) / elapsed, fallbacks))
+
+    print("\n" + "=" * 60)
+    print(f"{'Batch':>6} | {'Time (s)':>9} | {'Seg/s':>8} | {'Speedup':>8} | {'Fallback':>8}")
+    print("-" * 60)
+    baseline = rows[0][2] if rows else 1.0
+    for batch_size, elapsed, throughput, fallbacks in rows:
+        print(f"{batch_size:>6} | {elapsed:>9.1f} | {throughput:>8.2f} | {throughput / baseline:>7.2f}x | {fallbacks:>8}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+边转录边翻译 vs 先转录后翻译 的端到端延迟对比
+顺序模式：transcribe 返回全部片段后再 translate_segments，总耗时约为 ASR + NMT；
+流式模式：ASR 片段陆续交给翻译微批器，总耗时应接近 max(ASR, NMT)。
+
+用法:
+    python benchmarks/bench_streaming.py path/to/long_video.mp4 --whisper-model small --batch-size 16
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="边转录边翻译端到端延迟对比")
+    parser.add_argument("media", help="音频或视频文件（建议 10 分钟以上）")
+    parser.add_argument("--whisper-model", default="small", help="Whisper 模型大小")
+    parser.add_argument("--nmt-model", default="facebook/nllb-200-distilled-600M", help="NLLB 模型 ID")
+    parser.add_argument("--device", default="cpu", help="cpu 或 cuda")
+    parser.add_argument("--target", default="zh-cn", help="目标语言")
+    parser.add_argument("--batch-size", type=int, default=16, help="翻译微批大小")
+    parser.add_argument("--max-wait", type=float, default=2.0, help="微批最长等待时间 (秒)")
+    args = parser.parse_args()
+
+    from config import Config
+    Config.TRANSCRIPT_CACHE_ENABLED = False
+    Config.STREAM_TRANSLATION_BATCH_SIZE = args.batch_size
+    Config.STREAM_TRANSLATION_MAX_WAIT = args.max_wait
+
+    from models.whisper_model_fixed import WhisperTranscriber
+    from models.translator import NeuralTranslator
+    from models.streaming import transcribe_and_translate_stream
+
+    transcriber = WhisperTranscriber(model_name=args.whisper_model, device=args.device)
+    translator = NeuralTranslator(nmt_model_id=args.nmt_model, device=args.device, use_translation_memory=False)
+
+    # 1. 先转录后翻译（与 transcribe_stream 相同的增量解码路径，只是翻译放在最后）
+    start = time.perf_counter()
+    transcript = None
+    for event in transcriber.transcribe_stream(media_path=args.media, language="auto",
+                                               video_source_path=args.media):
+        if event["event"] == "done":
+            transcript = event
+    asr_seconds = time.perf_counter() - start
+    nmt_start = time.perf_counter()
+    translator.translate_segments(transcript["segments"], args.target, source_lang=transcript["language"])
+    nmt_seconds = time.perf_counter() - nmt_start
+    sequential = time.perf_counter() - start
+
+    # 2. 边转录边翻译
+    timings = None
+    first_translation = None
+    start = time.perf_counter()
+    for event in transcribe_and_translate_stream(transcriber, translator, args.media, args.target):
+        if event["event"] == "translation" and first_translation is None:
+            first_translation = time.perf_counter() - start
+        elif event["event"] == "translated":
+            timings = event["timings"]
+    streaming = time.perf_counter() - start
+
+    print("\n" + "=" * 62)
+    print(f"Audio: {transcript['duration']:.0f}s, Segments: {len(transcript['segments'])}")
+    print(f"ASR (+VLM): {asr_seconds:.1f}s   NMT: {nmt_seconds:.1f}s   max(ASR, NMT): {max(asr_seconds, nmt_seconds):.1f}s")
+    print("-" * 62)
+    print(f"{'Mode':<12} | {'Total (s)':>9} | {'NMT tail (s)':>12} | {'First MT (s)':>12}")
+    print("-" * 62)
+    print(f"{'sequential':<12} | {sequential:>9.1f} | {nmt_seconds:>12.1f} | {sequential:>12.1f}")
+    print(f"{'streaming':<12} | {streaming:>9.1f} | {timings['nmt_tail_seconds']:>12.1f} | "
+          f"{(first_translation or streaming):>12.1f}")
+    print("=" * 62)
+    print(f"加速比: {sequential / streaming:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
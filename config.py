@@ -15,10 +15,53 @@ class Config:
     # 1. Whisper ASR Model
     WHISPER_MODEL = 'small'
     WHISPER_DEVICE = 'cuda'  # 若有N卡改为 'cuda'
+    ASR_BACKEND = 'openai-whisper'  # 'openai-whisper' 或 'faster-whisper' (CTranslate2)
+    ASR_COMPUTE_TYPE = None  # faster-whisper 计算精度: CPU 默认 'int8'，可选 'int8_float32'；GPU 默认 'float16'
+    # 音频摄取：ffmpeg 直接输出 PCM 到内存 ('memory')、磁盘 memmap ('mmap')，或按时长自动选择 ('auto')
+    AUDIO_INGEST_MODE = 'auto'
+    AUDIO_MMAP_THRESHOLD_SECONDS = 1800  # auto 模式下超过该时长 (秒) 使用 memmap
+    # 长音频分块转录：超过阈值时按静音切块，CPU 上多进程并行
+    LONG_FORM_THRESHOLD_SECONDS = 600
+    LONG_FORM_CHUNK_SECONDS = 120  # 单块上限
+    LONG_FORM_MIN_CHUNK_SECONDS = 30  # 单块下限
+    ASR_WORKERS = 0  # 转录进程数，0 表示按 CPU 核数 / ASR_THREADS_PER_WORKER 自动计算
+    ASR_THREADS_PER_WORKER = 2
+    STREAM_CHUNK_SECONDS = 30  # 流式转录时 (openai-whisper 后端) 每次增量转录的音频块上限
+    # 边转录边翻译：ASR 片段攒够 BATCH_SIZE 个或最早片段等待超过 MAX_WAIT 秒即送入 NLLB
+    STREAM_TRANSLATION_BATCH_SIZE = 16
+    STREAM_TRANSLATION_MAX_WAIT = 2.0
+    # VLM 关键帧选择：'scene' 在低分辨率缩略帧上检测镜头切换（直方图 + SSIM 差异），每个镜头取一帧代表帧；
+    # 'segments' 为旧逻辑（片段中点 + 最小间隔去重 + 按时长均匀采样）
+    VLM_KEYFRAME_STRATEGY = 'scene'
+    SCENE_DETECT_FPS = 2.0  # 镜头检测的采样帧率
+    SCENE_DETECT_WIDTH = 64  # 检测用缩略帧的宽度 (像素，高度按 16:9)
+    SCENE_CUT_THRESHOLD = 0.35  # 相邻采样帧差异超过该值判为镜头切换 (0~1)
+    SCENE_MIN_SHOT_SECONDS = 1.0  # 最短镜头时长，过滤闪光 / 快速抖动造成的误检
+    # 转录结果缓存（按音频指纹 + 模型设置寻址，LRU 淘汰）
+    TRANSCRIPT_CACHE_ENABLED = True
+    TRANSCRIPT_CACHE_DIR = 'cache/transcripts'
+    TRANSCRIPT_CACHE_MAX_MB = 512
 
     # 2. NMT Model（新增 TRANSLATOR_DEVICE 配置）
     NMT_MODEL_ID = "facebook/nllb-200-3.3B"  # 原有的NMT模型ID
     TRANSLATOR_DEVICE = 'cuda'  # 翻译模型的设备（与Whisper保持一致，无GPU则改为 'cpu'）
+    # NLLB 长度分桶微批：每桶 token 预算 (0 = 自动：GPU 按空闲显存估算，CPU 使用 NMT_MAX_BATCH_TOKENS)、
+    # 最大批大小、GPU 上可占用的空闲显存比例
+    NMT_BATCH_TOKEN_BUDGET = 0
+    NMT_MAX_BATCH_SIZE = 64
+    NMT_MAX_BATCH_TOKENS = 16384
+    NMT_MEMORY_FRACTION = 0.3
+    # CPU 推理量化：None 保持 float32；'dynamic-int8' 对线性层做动态 int8 量化（需 LoRA 已合并）
+    NMT_QUANTIZATION = None
+    # NMT 推理引擎：'transformers' 或 'ctranslate2'（首次启动时把合并 LoRA 后的 NLLB 转换并缓存到 CT2_MODEL_DIR）
+    NMT_ENGINE = 'transformers'
+    CT2_MODEL_DIR = 'cache/ct2'
+    CT2_COMPUTE_TYPE = None  # 默认 CPU 'int8'，GPU 'int8_float16'
+    CT2_INTER_THREADS = 1
+    CT2_INTRA_THREADS = 0  # 0 表示由 CTranslate2 自动决定
+    # 翻译记忆：按 (归一化源文本, 源语言, 目标语言, 模型+LoRA) 复用历史译文
+    ENABLE_TRANSLATION_MEMORY = True
+    TRANSLATION_MEMORY_PATH = 'cache/translation_memory.sqlite3'
 
     # 3. Reflection LLM Model
     REFLECTION_MODEL_ID = "Qwen/Qwen3-VL-8B"
@@ -31,10 +74,46 @@ class Config:
     # 5. Quality Estimation (QE) Model
     QE_MODEL_ID = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     QE_THRESHOLD = 0.7
+    QE_EMBEDDING_CACHE_SIZE = 50000  # 源文本 QE 向量缓存条数（按文本哈希 LRU）
+    QE_BACKEND = 'torch'  # 'torch'、'torch-int8'（CPU 动态量化）或 'onnx'（需 optimum）
     ENABLE_QE = True
 
     # 功能开关
     ENABLE_REFLECTION = True
+    # 'all': 全部片段（默认，与原行为一致）；'selective': 只对 QE 低于 QE_THRESHOLD 或术语未按术语表翻译的片段做反思；
+    # 'window': 同一场景内最多 REFLECTION_WINDOW_SIZE 个相邻片段合并成一个带行号的 prompt
+    REFLECTION_MODE = 'all'
+    REFLECTION_WINDOW_SIZE = 6
+    TERMINOLOGY_PATH = 'data/terminology.json'
+    # 'constrained': 漏译术语的片段做约束解码；'off': 关闭（默认）。
+    # 术语匹配不区分大小写，而术语表里有 Patch、Cache、Client 等常用词，普通句子也会被强制套用术语译法，按领域按需开启
+    GLOSSARY_ENFORCEMENT = 'off'
+    REFLECTION_BATCH_SIZE = 8  # 反思模型每次 generate 处理的片段数
+    REFLECTION_PREFIX_CACHE = True  # 复用反思 prompt 静态前缀的 KV cache
+
+    # 后台任务队列：模型由 worker 进程持有，Web 进程不加载模型，请求线程只提交任务 / 查询状态
+    # （/api/transcribe、/api/translate 提交任务后等待结果）。关闭时 Web 进程自行加载全部模型并在请求线程内推理
+    JOB_QUEUE_ENABLED = True
+    JOB_DB_PATH = 'cache/jobs.sqlite3'
+    JOB_QUEUE_MAX_PENDING = 16  # 排队 + 运行中的任务上限，超出时 /api/jobs 返回 429
+    # 每种模型的 worker 进程数（每个进程各加载一份模型）；'pipeline' worker 在一个进程内跑完整流水线，
+    # 处理 kind='pipeline' 的任务。
+    # 默认不启用 pipeline：asr / nmt 是两个独立进程，不同任务的 ASR 与 NMT 已经可以重叠；pipeline worker
+    # 在自己的进程里再加载一份 Whisper + VLM + NLLB + QE，和 asr / nmt worker 同时启用会让显存占用翻倍，
+    # 而 /api/transcribe、/api/translate 只能由 asr / nmt worker 处理。显存足够、以批量 kind='pipeline'
+    # 任务为主时再加入 'pipeline'，各阶段利用率见任务 result 的 pipeline_metrics 或 /api/jobs/stats
+    JOB_WORKERS = {'asr': 1, 'nmt': 1}
+    JOB_PIPELINE_CAPACITY = 4  # 单个 pipeline worker 同时在流水线中的任务数
+    JOB_POLL_INTERVAL = 0.5  # 空闲 worker 轮询队列的间隔 (秒)
+    JOB_RETRY_AFTER_SECONDS = 30
+    JOB_SYNC_TIMEOUT_SECONDS = 600  # 同步接口等待任务完成的上限，超时返回 202 + job_id
+    JOB_EVENT_POLL_INTERVAL = 0.5  # SSE 端点轮询任务事件的间隔 (秒)
+    JOB_SSE_HEARTBEAT_SECONDS = 15  # 无新事件时发送 keep-alive 注释的间隔，防止代理断开连接
+    JOB_EVENTS_RETENTION_SECONDS = 3600  # 已结束任务的事件日志保留时长，之后只保留任务记录与 result
+    JOB_RETENTION_DAYS = 7  # 已结束任务的保留天数，超过后连同事件一起删除
+    # 多阶段流水线 (ASR / 抽帧 / 场景描述 / 翻译 / QE / 写字幕)：每个阶段的输入队列容量与线程数
+    PIPELINE_QUEUE_SIZE = 2
+    PIPELINE_STAGE_WORKERS = {'asr': 1, 'frames': 1, 'caption': 1, 'translate': 1, 'qe': 1, 'subtitle': 1}
 
     # 其他配置
     SUPPORTED_FORMATS = ['.mp3', '.wav', '.m4a', '.flac', '.mp4', '.mkv']
@@ -44,6 +123,12 @@ class Config:
     # LoRA 微调模型配置（新增）
     USE_LORA = True  # 设为 False 可回退到基础模型
     LORA_MODEL_PATH = "models/lora_nllb_terminology"
+    LORA_MERGE_ON_LOAD = True  # 推理时 merge_and_unload，去掉每层额外的 adapter 计算
+    LORA_MERGED_SAVE_PATH = None  # 合并后权重的保存目录，如 "models/nllb_lora_merged"（None 表示不保存）
+    # 多领域 LoRA 适配器 {名称: 目录}，如 {"medical": "models/lora_nllb_medical"}；非空时 LORA_MODEL_PATH 注册为 "default"，
+    # 请求通过 adapter 参数切换（"base" 表示不用适配器），此模式下不合并权重
+    LORA_ADAPTERS = {}
+    LORA_MAX_LOADED_ADAPTERS = 3  # 同时驻留的适配器数，超出按 LRU 卸载
 
     @staticmethod
     def init_app(app):
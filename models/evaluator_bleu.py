@@ -40,10 +40,18 @@ class SacreBLEUEvaluator:
         ref_lines = self.load_srt(reference_path)
         cand_lines = self.load_srt(candidate_path)
 
+        return self.evaluate_lines(ref_lines, cand_lines)
+
+    def evaluate_lines(self, ref_lines, cand_lines, tokenize=None):
+        """
+        直接对句子列表计算 BLEU（中文译文传入 tokenize="zh"）
+        """
+        metric = BLEU(tokenize=tokenize) if tokenize else self.metric
+
         # sacrebleu 的格式要求：
         # hypotheses: List[str]
         # references: List[List[str]]
-        score_obj = self.metric.corpus_score(cand_lines, [ref_lines])
+        score_obj = metric.corpus_score(cand_lines, [ref_lines])
 
         return {
             "score": score_obj.score,
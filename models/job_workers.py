@@ -0,0 +1,332 @@
+import time
+import queue
+import logging
+import multiprocessing as mp
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from utils.job_queue import JobStore
+from models.media_pipeline import PIPELINE_STAGES
+
+logger = logging.getLogger(__name__)
+
+
+def _load_stage_model(stage: str):
+    """在 worker 进程内加载该阶段的模型（与 app.py 的参数保持一致）"""
+    if stage == "asr":
+        from models.whisper_model_fixed import WhisperTranscriber
+        return WhisperTranscriber(model_name=Config.WHISPER_MODEL, device=Config.WHISPER_DEVICE)
+    if stage == "nmt":
+        from models.translator import NeuralTranslator
+        return NeuralTranslator(
+            nmt_model_id=getattr(Config, 'NMT_MODEL_ID', "facebook/nllb-200-distilled-600M"),
+            reflection_model_id=getattr(Config, 'REFLECTION_MODEL_ID', "Qwen/Qwen2.5-0.5B-Instruct"),
+            lora_model_id=Config.LORA_MODEL_PATH if getattr(Config, 'USE_LORA', False) else None,
+            device=Config.WHISPER_DEVICE
+        )
+    if stage == "pipeline":
+        from models.media_pipeline import MediaPipeline
+        from utils.subtitle_generator import SubtitleGenerator
+        return MediaPipeline(_load_stage_model("asr"), _load_stage_model("nmt"), SubtitleGenerator())
+    if stage == "stream":
+        return _load_stage_model("asr"), _load_stage_model("nmt")
+    raise ValueError(f"Unknown job stage: {stage}")
+
+
+def _make_reporter(store: JobStore, job: Dict[str, Any]) -> Callable[[Dict[str, Any]], None]:
+    """
+    返回上报函数：事件中的 progress 为当前阶段的完成比例，换算成整个任务的进度后
+    与事件一起写入 JobStore（SSE 端点据此推送）。
+    """
+    stages = len(job["stages"])
+    base = job["stage_index"]
+
+    def report(event: Dict[str, Any]):
+        progress = None
+        if event.get("progress") is not None:
+            progress = (base + float(event["progress"])) / stages
+            event = dict(event, percent=round(progress * 100, 1))
+        store.add_event(job["id"], dict(event, stage=job["stage"]), progress)
+
+    return report
+
+
+def _report_stream(events, report: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+    """
+    逐条上报流式转录事件，返回转录结果。转录结束的 done 事件改名为 transcribed 上报（附完整转录结果），
+    因为任务级的 done 表示整个任务结束。
+    """
+    transcript = None
+    for event in events:
+        if event["event"] == "done":
+            transcript = {k: v for k, v in event.items() if k != "event"}
+            report(dict(transcript, event="transcribed"))
+        else:
+            report(event)
+    return transcript
+
+
+def _run_asr(transcriber, job: Dict[str, Any], report: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """payload 带 stream 时逐段转录并逐段上报 segment 事件（/api/transcribe/stream），否则整体转录"""
+    payload = job["payload"]
+    file_path = payload["file_path"]
+    if payload.get("stream"):
+        return {"transcript": _report_stream(
+            transcriber.transcribe_stream(media_path=file_path, language=payload.get("language", "auto"),
+                                          video_source_path=file_path), report)}
+    transcript = transcriber.transcribe(
+        media_path=file_path,
+        language=payload.get("language", "auto"),
+        video_source_path=file_path,
+        progress_callback=report
+    )
+    return {"transcript": transcript}
+
+
+def _run_nmt(translator, job: Dict[str, Any], report: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """翻译 payload 中的 segments；process 任务则翻译上一阶段 (ASR) 的转录结果"""
+    payload = job["payload"]
+    transcript = job["result"].get("transcript") or {}
+    segments = payload.get("segments") or transcript.get("segments", [])
+    source_lang = payload.get("source_language") or transcript.get("language") or "auto"
+    options = {
+        "source_lang": source_lang,
+        "use_reflection": payload.get("use_reflection", False),
+        "reflection_mode": payload.get("reflection_mode"),
+        "adapter": payload.get("adapter"),
+    }
+    if not segments:
+        return {"segments": [], "stats": None}
+
+    report({"event": "translating", "segments": len(segments)})
+    target_langs = payload.get("target_languages")
+    if target_langs:
+        translations = translator.translate_segments_multi(segments=segments, target_langs=target_langs, **options)
+        for done, (tgt, translated) in enumerate(translations.items(), 1):
+            report({"event": "translation", "target_language": tgt, "progress": done / len(translations),
+                    "segments": _translation_items(translated)})
+        return {"translations": translations, "stats": translator.last_job_stats}
+
+    translated = translator.translate_segments(
+        segments=segments, target_lang=payload.get("target_language", "zh-cn"), **options
+    )
+    report({"event": "translation", "progress": 1.0, "segments": _translation_items(translated)})
+    return {"segments": translated, "stats": translator.last_job_stats}
+
+
+def _translation_items(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{"index": idx, "source": seg.get("original_text"), "translation": seg["text"]}
+            for idx, seg in enumerate(segments)]
+
+
+def _run_stream(models, job: Dict[str, Any], report: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """边转录边翻译：NLLB 在 ASR 进行的同时翻译已完成的片段"""
+    from models.streaming import transcribe_and_translate_stream
+
+    transcriber, translator = models
+    payload = job["payload"]
+    result = {}
+
+    def _events():
+        # translated（最终译文）作为任务结果返回；start / segment / translation 原样上报，作为部分结果推送给前端
+        for event in transcribe_and_translate_stream(
+                transcriber, translator, payload["file_path"], payload.get("target_language", "zh-cn"),
+                language=payload.get("language", "auto"), source_lang=payload.get("source_language"),
+                use_reflection=payload.get("use_reflection", False), reflection_mode=payload.get("reflection_mode"),
+                adapter=payload.get("adapter")):
+            if event["event"] == "translated":
+                result.update(event)
+            else:
+                yield event
+
+    transcript = _report_stream(_events(), report)
+    return {"transcript": transcript, "segments": result["segments"], "stats": result["stats"],
+            "timings": result["timings"]}
+
+
+STAGE_HANDLERS: Dict[str, Callable[[Any, Dict[str, Any], Callable], Dict[str, Any]]] = {
+    "asr": _run_asr,
+    "nmt": _run_nmt,
+    "stream": _run_stream,
+}
+
+# 由流水线执行、可同时处理多个任务的阶段
+PIPELINE_WORKER_STAGES = ("pipeline",)
+
+
+def _pipeline_loop(media_pipeline, store: JobStore, worker_id: str, stop_event, poll_interval: float):
+    """
+    流水线 worker：同时认领最多 JOB_PIPELINE_CAPACITY 个任务送入 MediaPipeline，
+    各阶段在不同任务之间重叠执行；任务离开流水线时写回结果。
+    """
+    capacity = getattr(Config, 'JOB_PIPELINE_CAPACITY', 4)
+    payload_keys = ("language", "target_language", "source_language", "use_reflection", "reflection_mode",
+                    "adapter", "format")
+
+    def _on_complete(item):
+        if item.error is not None:
+            store.fail(item.id, f"{item.failed_stage}: {item.error}", worker_id)
+            return
+        data = item.data
+        # 各阶段利用率 / 队列深度（从本 worker 启动起累计），随任务结果返回，/api/jobs/stats 读取最近一次
+        metrics = media_pipeline.metrics()
+        store.complete_stage(item.id, {
+            "transcript": data.get("transcript"),
+            "segments": data.get("segments"),
+            "stats": data.get("stats"),
+            "subtitle_path": data.get("subtitle_path"),
+            "stage_seconds": item.stage_seconds,
+            "pipeline_seconds": round(item.latency, 3),
+            "pipeline_metrics": metrics,
+        }, worker_id)
+        logger.info(f"[{worker_id}] 任务 {item.id} 完成，耗时 {item.latency:.1f}s，各阶段 {item.stage_seconds}")
+        logger.info(f"[{worker_id}] 流水线各阶段利用率: "
+                    f"{ {name: stage['utilization'] for name, stage in metrics['stages'].items()} }")
+
+    def _on_stage_start(item, stage_name: str):
+        stage_index = PIPELINE_STAGES.index(stage_name)
+        store.add_event(item.id, {"event": "pipeline_stage", "stage": "pipeline", "pipeline_stage": stage_name,
+                                  "percent": round(stage_index / len(PIPELINE_STAGES) * 100, 1)},
+                        stage_index / len(PIPELINE_STAGES))
+
+    media_pipeline.pipeline.on_complete = _on_complete
+    media_pipeline.pipeline.on_stage_start = _on_stage_start
+    media_pipeline.start()
+    while not stop_event.is_set():
+        job = store.claim("pipeline", worker_id) if media_pipeline.pipeline.in_flight < capacity else None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        payload = job["payload"]
+        try:
+            media_pipeline.submit(payload["file_path"], item_id=job["id"],
+                                  **{k: payload[k] for k in payload_keys if k in payload})
+        except Exception as e:
+            logger.error(f"[{worker_id}] 任务 {job['id']} 提交流水线失败: {e}")
+            store.fail(job["id"], str(e), worker_id)
+    media_pipeline.stop()
+
+
+def _worker_main(stage: str, db_path: str, worker_id: str, stop_event, poll_interval: float, error_queue=None):
+    """
+    worker 进程入口：加载一次本阶段的模型，然后循环认领并处理该阶段的任务。
+    模型只属于这个进程，请求线程不再直接调用模型。
+    模型加载失败时把错误放入 error_queue 后退出，由 JobWorkerPool 汇报给 Web 进程。
+    """
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    store = JobStore(db_path)
+    try:
+        model = _load_stage_model(stage)
+    except Exception as e:
+        logger.critical(f"[{worker_id}] 模型加载失败，worker 退出: {e}")
+        if error_queue is not None:
+            error_queue.put((stage, f"{worker_id} 模型加载失败: {e}"))
+        store.close()
+        return
+
+    logger.info(f"[{worker_id}] 就绪，等待 {stage} 任务")
+    if stage in PIPELINE_WORKER_STAGES:
+        _pipeline_loop(model, store, worker_id, stop_event, poll_interval)
+        store.close()
+        return
+
+    handler = STAGE_HANDLERS[stage]
+    while not stop_event.is_set():
+        job = store.claim(stage, worker_id)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        start = time.perf_counter()
+        logger.info(f"[{worker_id}] 开始处理任务 {job['id']} ({job['kind']})")
+        try:
+            result_update = handler(model, job, _make_reporter(store, job))
+            result_update = dict(result_update, **{f"{stage}_seconds": round(time.perf_counter() - start, 3)})
+            store.complete_stage(job["id"], result_update, worker_id)
+            logger.info(f"[{worker_id}] 任务 {job['id']} 的 {stage} 阶段完成，"
+                        f"耗时 {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"[{worker_id}] 任务 {job['id']} 失败: {e}", exc_info=True)
+            store.fail(job["id"], str(e), worker_id)
+    store.close()
+
+
+class JobWorkerPool:
+    """
+    按模型类型启动固定数量的 worker 进程（如 {"asr": 1, "nmt": 1}），
+    每个进程持有一份自己的模型，通过 JobStore 认领任务，因此 GPU/CPU 上同时运行的模型实例数有上限。
+    """
+
+    def __init__(self, db_path: str, worker_counts: Dict[str, int], poll_interval: float = 0.5):
+        self.db_path = db_path
+        self.worker_counts = {stage: int(n) for stage, n in worker_counts.items() if int(n) > 0}
+        self.poll_interval = poll_interval
+        self._ctx = mp.get_context("spawn")
+        self._stop_event = self._ctx.Event()
+        self._error_queue = self._ctx.Queue()
+        self._processes: List[mp.Process] = []
+        # 阶段 -> 最近一次 worker 模型加载失败的原因
+        self.load_errors: Dict[str, str] = {}
+
+    def start(self, store: Optional[JobStore] = None):
+        """把上次中断的任务重新排队，然后启动 worker 进程"""
+        if self._processes:
+            return
+        for stage in self.worker_counts:
+            if stage not in STAGE_HANDLERS and stage not in PIPELINE_WORKER_STAGES:
+                raise ValueError(f"Unknown job stage: {stage} "
+                                 f"(expected one of {list(STAGE_HANDLERS) + list(PIPELINE_WORKER_STAGES)})")
+
+        (store or JobStore(self.db_path)).recover()
+        for stage, count in self.worker_counts.items():
+            for i in range(count):
+                worker_id = f"{stage}-{i}"
+                # 非 daemon：长音频转录在 worker 内还会启动自己的 ASR 进程池
+                proc = self._ctx.Process(
+                    target=_worker_main,
+                    args=(stage, self.db_path, worker_id, self._stop_event, self.poll_interval,
+                          self._error_queue),
+                    name=f"job-worker-{worker_id}",
+                    daemon=False,
+                )
+                proc.start()
+                self._processes.append(proc)
+        logger.info(f"Job worker pool started: {self.worker_counts}")
+
+    def alive(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for proc in self._processes:
+            if proc.is_alive():
+                stage = proc.name[len("job-worker-"):].rsplit("-", 1)[0]
+                counts[stage] = counts.get(stage, 0) + 1
+        return counts
+
+    def dead_stages(self) -> Dict[str, str]:
+        """
+        已配置、但所有 worker 进程都已退出的阶段 -> 原因（模型加载失败的错误，或进程意外退出）。
+        这些阶段的任务不会再被认领。
+        """
+        while True:
+            try:
+                stage, error = self._error_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.load_errors[stage] = error
+        if not self._processes:
+            return {}
+        alive = self.alive()
+        return {stage: self.load_errors.get(stage, f"'{stage}' worker 进程已退出")
+                for stage in self.worker_counts if not alive.get(stage)}
+
+    def stop(self, timeout: float = 30.0):
+        """通知 worker 处理完当前任务后退出；超时仍未退出的进程强制结束（其任务下次启动时重新排队）"""
+        self._stop_event.set()
+        deadline = time.time() + timeout
+        for proc in self._processes:
+            proc.join(max(0.0, deadline - time.time()))
+            if proc.is_alive():
+                logger.warning(f"Terminating job worker {proc.name}")
+                proc.terminate()
+                proc.join()
+        self._processes = []
@@ -0,0 +1,88 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from peft import PeftModel
+
+logger = logging.getLogger(__name__)
+
+
+class LoRAAdapterRegistry:
+    """
+    多 LoRA 适配器注册表：所有适配器挂在同一个 NLLB 基础模型上，按名称切换，
+    不重新加载基础模型。已加载的适配器数超过上限时，按 LRU 卸载最久未使用的适配器。
+    """
+
+    def __init__(self, base_model, adapters: Dict[str, str], max_loaded: int = 3, device=None):
+        """
+        Args:
+            base_model: 已加载的 NLLB 基础模型
+            adapters: {适配器名称: PEFT 适配器目录}
+            max_loaded: 同时驻留在模型上的适配器数量上限
+            device: 适配器权重所在设备
+        """
+        self.base_model = base_model
+        self.adapters = dict(adapters)
+        self.max_loaded = max(1, max_loaded)
+        self.device = device
+        self.model: Optional[PeftModel] = None
+        self.active: Optional[str] = None
+        self._loaded: "OrderedDict[str, None]" = OrderedDict()  # LRU 顺序：最久未使用在前
+        self._lock = threading.RLock()
+
+    def names(self) -> List[str]:
+        return list(self.adapters)
+
+    def loaded(self) -> List[str]:
+        return list(self._loaded)
+
+    def path(self, name: Optional[str]) -> Optional[str]:
+        return self.adapters.get(name) if name else None
+
+    def activate(self, name: str):
+        """确保适配器已加载并设为当前适配器，返回 PeftModel"""
+        if name not in self.adapters:
+            raise ValueError(f"Unknown LoRA adapter: {name} (available: {self.names()})")
+
+        with self._lock:
+            if name not in self._loaded:
+                self._load(name)
+            self._loaded.move_to_end(name)
+            if self.active != name:
+                self.model.set_adapter(name)
+                self.active = name
+            self._evict()
+            return self.model
+
+    def _load(self, name: str):
+        path = self.adapters[name]
+        logger.info(f"Loading LoRA adapter '{name}' from: {path}")
+        if self.model is None:
+            self.model = PeftModel.from_pretrained(self.base_model, path, adapter_name=name)
+            if self.device is not None:
+                self.model = self.model.to(self.device)
+            self.model.eval()
+        else:
+            self.model.load_adapter(path, adapter_name=name)
+            if self.device is not None:
+                self.model.to(self.device)
+        self._loaded[name] = None
+
+    def _evict(self):
+        while len(self._loaded) > self.max_loaded:
+            victim = next(iter(self._loaded))
+            if victim == self.active:
+                self._loaded.move_to_end(victim)
+                continue
+            logger.info(f"Evicting idle LoRA adapter '{victim}'")
+            self.model.delete_adapter(victim)
+            del self._loaded[victim]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "registered": self.names(),
+            "loaded": self.loaded(),
+            "active": self.active,
+            "max_loaded": self.max_loaded,
+        }
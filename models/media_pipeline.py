@@ -0,0 +1,170 @@
+import os
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from utils.stage_pipeline import PipelineItem, Stage, StagePipeline
+
+logger = logging.getLogger(__name__)
+
+# 阶段顺序：ASR -> 抽帧 -> 场景描述 -> NMT 初译 -> QE / 反思 -> 写字幕
+PIPELINE_STAGES = ("asr", "frames", "caption", "translate", "qe", "subtitle")
+
+
+class MediaPipeline:
+    """
+    把一次「转录 + 场景分析 + 翻译 + 字幕」拆成 PIPELINE_STAGES 六个阶段，
+    每个阶段只占用自己的模型（Whisper / 解码器 / ViT-GPT2 / NLLB / QE+反思模型 / 磁盘），
+    多个文件同时在流水线中推进：文件 N 翻译时文件 N+1 已开始 ASR。
+    """
+
+    def __init__(self, transcriber, translator, subtitle_generator=None, output_dir: Optional[str] = None,
+                 stage_workers: Optional[Dict[str, int]] = None, queue_size: Optional[int] = None,
+                 on_complete: Optional[Callable[[PipelineItem], None]] = None):
+        """
+        Args:
+            transcriber: WhisperTranscriber（ASR + VLM 协调器）
+            translator: NeuralTranslator
+            subtitle_generator: SubtitleGenerator，为 None 时跳过写字幕
+            output_dir: 字幕输出目录，默认 Config.OUTPUT_FOLDER
+            stage_workers: 各阶段线程数，默认 Config.PIPELINE_STAGE_WORKERS（未列出的阶段为 1）
+            queue_size: 每个阶段输入队列的容量，默认 Config.PIPELINE_QUEUE_SIZE
+            on_complete: 任务结束（成功或失败）时的回调
+        """
+        self.transcriber = transcriber
+        self.translator = translator
+        self.subtitle_generator = subtitle_generator
+        self.output_dir = output_dir or Config.OUTPUT_FOLDER
+        stage_workers = stage_workers or getattr(Config, 'PIPELINE_STAGE_WORKERS', {})
+        queue_size = queue_size or getattr(Config, 'PIPELINE_QUEUE_SIZE', 2)
+
+        handlers = {
+            "asr": self._stage_asr,
+            "frames": self._stage_frames,
+            "caption": self._stage_caption,
+            "translate": self._stage_translate,
+            "qe": self._stage_qe,
+            "subtitle": self._stage_subtitle,
+        }
+        self.pipeline = StagePipeline(
+            [Stage(name, handlers[name], workers=stage_workers.get(name, 1), queue_size=queue_size)
+             for name in PIPELINE_STAGES],
+            on_complete=on_complete,
+        )
+
+    def start(self):
+        self.pipeline.start()
+
+    def stop(self, wait: bool = True):
+        self.pipeline.stop(wait)
+
+    def metrics(self) -> Dict[str, Any]:
+        return self.pipeline.metrics()
+
+    def submit(self, file_path: str, item_id: Optional[str] = None, **options) -> PipelineItem:
+        """
+        提交一个媒体文件。options 与 /api/transcribe + /api/translate 的参数一致：
+        language, target_language, source_language, use_reflection, reflection_mode, adapter,
+        以及 format ('srt' / 'vtt'，None 表示不写字幕文件)。
+        """
+        if not file_path or not os.path.exists(file_path):
+            raise FileNotFoundError(f"Media file not found: {file_path}")
+        data = dict(options, file_path=file_path)
+        data.setdefault("format", "srt")
+        return self.pipeline.submit(data, item_id=item_id)
+
+    def process_files(self, file_paths: List[str], **options) -> List[PipelineItem]:
+        """批量处理多个文件，全部完成后返回（失败的任务 error 不为 None）"""
+        items = [self.submit(path, **options) for path in file_paths]
+        for item in items:
+            item.wait()
+        return items
+
+    # --- 各阶段实现：只读写 data 字典，模型由对应阶段独占 ---
+
+    def _stage_asr(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        transcriber = self.transcriber
+        file_path = data["file_path"]
+        language = data.get("language", "auto")
+
+        if transcriber.transcript_cache is not None:
+            data["cache_key"] = transcriber._transcript_cache_key(file_path, None, language, "transcribe", file_path)
+            cached = transcriber.transcript_cache.get(data["cache_key"])
+            if cached is not None:
+                # 命中转录缓存：抽帧 / 场景描述阶段直接透传
+                logger.info(f"Transcript cache hit, skipping ASR and VLM: {file_path}")
+                data["transcript"] = cached
+                return data
+
+        audio = transcriber.audio_processor.decode_audio(file_path)
+        try:
+            options = transcriber._asr_options(language, "transcribe")
+            result = transcriber._run_asr(audio, options)
+            data["asr"] = {"text": result["text"].strip(), "segments": result["segments"],
+                           "language": result["language"]}
+            data["duration"] = audio.duration
+            data["video_path"] = transcriber._resolve_video_path(audio, file_path)
+        finally:
+            audio.close()
+        return data
+
+    def _stage_frames(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        vlm = self.transcriber.vlm_analyzer
+        if "transcript" in data or not data.get("video_path") or vlm is None or vlm.vit_gpt2_model is None:
+            return data
+        timestamps, shots = self.transcriber._plan_keyframes(data["asr"]["segments"], data["duration"],
+                                                             data["video_path"])
+        if timestamps:
+            data["frames"] = vlm.extract_frames(data["video_path"], timestamps)
+            data["shots"] = shots
+        return data
+
+    def _stage_caption(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if "transcript" in data:
+            return data
+        frames = data.pop("frames", None)
+        frame_ctx_cache = self.transcriber.vlm_analyzer.caption_frames(frames) if frames else {}
+        segments, global_av_ctx = self.transcriber._assemble_segments(data["asr"]["segments"], frame_ctx_cache,
+                                                                       frames is not None, data.pop("shots", None))
+        asr = data.pop("asr")
+        data["transcript"] = {
+            "text": asr["text"],
+            "segments": segments,
+            "language": asr["language"],
+            "duration": data["duration"],
+            "global_av_context": global_av_ctx,
+        }
+        if data.get("cache_key") and self.transcriber.transcript_cache is not None:
+            self.transcriber.transcript_cache.put(data["cache_key"], data["transcript"])
+        return data
+
+    def _stage_translate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        transcript = data["transcript"]
+        segments = [dict(seg) for seg in transcript["segments"]]
+        source_texts, drafts, stats = self.translator.translate_drafts(
+            segments,
+            target_lang=data.get("target_language", "zh-cn"),
+            source_lang=data.get("source_language") or transcript.get("language") or "auto",
+            adapter=data.get("adapter"),
+        )
+        data["drafts"] = {"segments": segments, "source_texts": source_texts, "translated": drafts}
+        data["stats"] = stats
+        return data
+
+    def _stage_qe(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        drafts = data.pop("drafts")
+        data["segments"] = self.translator.finalize_segments(
+            drafts["segments"], drafts["source_texts"], drafts["translated"],
+            data.get("target_language", "zh-cn"), data.get("use_reflection", False), None,
+            data.get("reflection_mode"), data["stats"],
+        )
+        return data
+
+    def _stage_subtitle(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        format_type = data.get("format")
+        if self.subtitle_generator is None or not format_type:
+            return data
+        base = os.path.splitext(os.path.basename(data["file_path"]))[0]
+        output_path = os.path.join(self.output_dir, f"{base}_translated.{format_type}")
+        data["subtitle_path"] = self.subtitle_generator.create_subtitle(data["segments"], output_path, format_type)
+        return data
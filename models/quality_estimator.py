@@ -1,33 +1,62 @@
 import logging
 import os
+import threading
+from typing import Dict, List, Optional, Tuple
 
 # 设置 Hugging Face 镜像，解决国内连接问题 (必须在导入 sentence_transformers 之前设置)
 os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
 
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
+
 import torch
 
+from config import Config
+from utils.embedding_cache import EmbeddingCache, encode_normalized_many, rowwise_cosine
+
 logger = logging.getLogger(__name__)
 
 class QualityEstimator:
-    def __init__(self, model_id="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", device='cpu'):
+    def __init__(self, model_id="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", device='cpu',
+                 cache_size=50000, backend='torch'):
         """
         初始化质量评估模型
         Args:
             model_id: Hugging Face 模型 ID
             device: 运行设备 ('cpu' or 'cuda')
+            cache_size: 源文本向量缓存条数（按文本哈希，跨任务复用）
+            backend: 'torch'、'torch-int8'（CPU 动态 int8 量化）或 'onnx'（需 sentence-transformers>=3.2 与 optimum）
         """
         self.device = device
         self.model_id = model_id
+        self.backend = backend
+        self.embedding_cache = EmbeddingCache(cache_size)
         
-        logger.info(f"正在加载 QE 模型 (Bi-Encoder): {model_id} (Device: {device})")
+        logger.info(f"正在加载 QE 模型 (Bi-Encoder): {model_id} (Device: {device}, Backend: {backend})")
         try:
-            self.model = SentenceTransformer(model_id, device=device)
+            self.model = self._load_encoder(model_id, device, backend)
             logger.info("QE 模型加载成功")
         except Exception as e:
             logger.error(f"QE 模型加载失败: {e}")
             raise e
 
+    def _load_encoder(self, model_id: str, device: str, backend: str):
+        if backend == 'onnx':
+            try:
+                return SentenceTransformer(model_id, device=device, backend='onnx')
+            except Exception as e:
+                logger.warning(f"ONNX QE 编码器加载失败，回退到 torch: {e}")
+                self.backend = 'torch'
+                return SentenceTransformer(model_id, device=device)
+
+        model = SentenceTransformer(model_id, device=device)
+        if backend == 'torch-int8':
+            if device != 'cpu':
+                logger.warning("torch-int8 仅支持 CPU，QE 模型保持浮点精度")
+                self.backend = 'torch'
+            else:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
     def estimate(self, source_text: str, translated_text: str) -> float:
         """
         评估翻译质量
@@ -37,14 +66,8 @@ class QualityEstimator:
         Returns:
             score: 0-1 之间的质量分数 (越高越好)
         """
-        try:
-            # Bi-Encoder: 分别编码，计算余弦相似度
-            embeddings = self.model.encode([source_text, translated_text], convert_to_tensor=True)
-            score = util.cos_sim(embeddings[0], embeddings[1])
-            return float(score.item())
-        except Exception as e:
-            logger.error(f"QE 评估失败: {e}")
-            return 0.0
+        # Bi-Encoder: 分别编码，计算余弦相似度（失败时 estimate_batch 返回 0.0）
+        return self.estimate_batch([[source_text, translated_text]])[0]
 
     def estimate_batch(self, pairs: list) -> list:
         """
@@ -54,33 +77,52 @@ class QualityEstimator:
         Returns:
             scores: list of floats
         """
+        # 拆分源文本和翻译文本
+        sources = [p[0] for p in pairs]
+        translations = [p[1] for p in pairs]
+        return self.score_many(sources, [translations])[0]
+
+    def score_many(self, sources: List[str], translation_sets: List[List[str]]) -> List[List[float]]:
+        """
+        一个任务的所有 QE 打分合并为一次编码：未缓存的源文本与各组译文（如多个目标语言）
+        一起送入 encode，再对每组译文与源文本逐行计算余弦相似度。
+        """
         try:
-            # 拆分源文本和翻译文本
-            sources = [p[0] for p in pairs]
-            translations = [p[1] for p in pairs]
-            
-            # 批量编码
-            src_embeddings = self.model.encode(sources, convert_to_tensor=True)
-            trans_embeddings = self.model.encode(translations, convert_to_tensor=True)
-            
-            # 计算成对余弦相似度
-            scores = util.cos_sim(src_embeddings, trans_embeddings)
-            
-            # 提取对角线元素 (即对应的相似度)
-            # 注意：util.cos_sim 返回的是矩阵，我们需要一一对应的分数
-            # 实际上 util.pairwise_cos_sim 更合适，或者手动提取
-            # 这里简单起见，使用对角线
-            
-            # 修正：SentenceTransformers 没有 pairwise_cos_sim，需要手动计算
-            # 或者简单循环 (对于小批量没问题)
-            
-            batch_scores = []
-            for i in range(len(pairs)):
-                # 提取对应向量的点积 (归一化后即余弦相似度)
-                s = util.cos_sim(src_embeddings[i], trans_embeddings[i])
-                batch_scores.append(float(s.item()))
-                
-            return batch_scores
+            # 批量编码（L2 归一化），源文本向量走缓存
+            groups = [(sources, self.embedding_cache)] + [(translations, None) for translations in translation_sets]
+            embeddings = encode_normalized_many(self.model, groups)
+
+            # 归一化后逐行点积即为一一对应的余弦相似度，无需构造 N×N 矩阵
+            return [[float(s) for s in rowwise_cosine(embeddings[0], trans_embeddings)]
+                    for trans_embeddings in embeddings[1:]]
         except Exception as e:
             logger.error(f"批量 QE 评估失败: {e}")
-            return [0.0] * len(pairs)
+            return [[0.0] * len(sources) for _ in translation_sets]
+
+
+_shared_estimators: Dict[Tuple[str, str, str], Optional[QualityEstimator]] = {}
+_shared_lock = threading.Lock()
+
+
+def get_quality_estimator(model_id: Optional[str] = None, device: str = 'cpu') -> Optional[QualityEstimator]:
+    """
+    进程内共享的 QE 服务：按 (模型, 设备, 后端) 懒加载一次，NeuralTranslator 与其他调用方共用。
+    Config.ENABLE_QE 为 False 或模型加载失败时返回 None。
+    """
+    if not getattr(Config, 'ENABLE_QE', True):
+        return None
+
+    model_id = model_id or getattr(Config, 'QE_MODEL_ID', "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+    backend = getattr(Config, 'QE_BACKEND', 'torch')
+    key = (model_id, device, backend)
+    with _shared_lock:
+        if key not in _shared_estimators:
+            try:
+                _shared_estimators[key] = QualityEstimator(
+                    model_id, device=device, backend=backend,
+                    cache_size=getattr(Config, 'QE_EMBEDDING_CACHE_SIZE', 50000)
+                )
+            except Exception:
+                # 记录失败结果，避免每个请求重复尝试加载
+                _shared_estimators[key] = None
+        return _shared_estimators[key]
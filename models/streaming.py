@@ -0,0 +1,203 @@
+import time
+import queue
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_CLOSE = object()
+
+# 逐批累加的翻译统计字段（tm_hit_rate 在汇总时重新计算）
+_SUMMED_STATS = ("segments", "tm_exact", "tm_normalized", "in_file_duplicates", "model_translated",
+                 "nmt_seconds", "estimated_seconds_saved")
+
+
+class TranslationMicroBatcher:
+    """
+    翻译微批器：后台线程收集 ASR 陆续产出的片段，攒够 batch_size 个、或最早的片段已等待 max_wait 秒时，
+    就把这一批送入 NLLB 初译。这样 NMT 与剩余的 ASR 并行运行，而不是等全部转录结束。
+    只做初译（含翻译记忆），QE / 反思需要 VLM 场景上下文，由调用方在转录结束后统一完成。
+    """
+
+    def __init__(self, translator, target_lang: str, source_lang: str = 'auto', adapter: Optional[str] = None,
+                 batch_size: Optional[int] = None, max_wait: Optional[float] = None):
+        self.translator = translator
+        self.target_lang = target_lang
+        self.source_lang = source_lang
+        self.adapter = adapter
+        self.batch_size = max(1, batch_size or getattr(Config, 'STREAM_TRANSLATION_BATCH_SIZE', 16))
+        self.max_wait = max_wait if max_wait is not None else getattr(Config, 'STREAM_TRANSLATION_MAX_WAIT', 2.0)
+
+        self.source_texts: Dict[int, str] = {}
+        self.drafts: Dict[int, str] = {}
+        self.stats: Dict[str, Any] = {key: 0 for key in _SUMMED_STATS}
+        self.batches = 0
+        self.translated_until = 0.0  # 已翻译片段覆盖到的音频时间（秒）
+        self.error: Optional[BaseException] = None
+
+        self._inbox: "queue.Queue" = queue.Queue()
+        self._outbox: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stream-translation", daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, index: int, segment: Dict[str, Any]):
+        """提交一个已完成转录的片段（index 为其在最终片段列表中的位置）"""
+        self._inbox.put((index, segment))
+
+    def close(self) -> Dict[int, str]:
+        """转录结束：翻译剩余片段并等待线程退出，返回 {片段下标: 初译}"""
+        self._inbox.put(_CLOSE)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.drafts
+
+    def poll(self) -> List[List[Dict[str, Any]]]:
+        """取出自上次调用以来完成的批次，每批为 [{"index", "source", "translation"}]"""
+        batches = []
+        while True:
+            try:
+                batches.append(self._outbox.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def _run(self):
+        pending: List[tuple] = []
+        deadline = None
+        closed = False
+        while not closed:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _CLOSE:
+                closed = True
+            elif item is not None:
+                if not pending:
+                    deadline = time.monotonic() + self.max_wait
+                pending.append(item)
+
+            if pending and (closed or len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                if self.error is None:
+                    try:
+                        self._translate(pending)
+                    except Exception as e:
+                        logger.error(f"Streaming translation batch failed: {e}", exc_info=True)
+                        self.error = e
+                pending = []
+                deadline = None
+
+    def _translate(self, pending: List[tuple]):
+        indices = [index for index, _ in pending]
+        segments = [{"start": seg["start"], "end": seg["end"], "text": seg["text"]} for _, seg in pending]
+        source_texts, drafts, stats = self.translator.translate_drafts(
+            segments, self.target_lang, self.source_lang, adapter=self.adapter)
+
+        for key in _SUMMED_STATS:
+            self.stats[key] += stats.get(key, 0)
+        self.stats["adapter"] = stats.get("adapter")
+        self.batches += 1
+
+        batch = []
+        for index, source, draft in zip(indices, source_texts, drafts):
+            self.source_texts[index] = source
+            self.drafts[index] = draft
+            batch.append({"index": index, "source": source, "translation": draft})
+        self.translated_until = max(self.translated_until, max(seg["end"] for seg in segments))
+        self._outbox.put(batch)
+        logger.info(f"Streaming translation batch {self.batches}: {len(batch)} segments "
+                    f"({len(self.drafts)} translated so far)")
+
+    def summary_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["nmt_seconds"] = round(stats["nmt_seconds"], 3)
+        stats["estimated_seconds_saved"] = round(stats["estimated_seconds_saved"], 3)
+        stats["tm_hit_rate"] = round((stats["tm_exact"] + stats["tm_normalized"]) / stats["segments"], 4) \
+            if stats["segments"] else 0.0
+        stats["micro_batches"] = self.batches
+        return stats
+
+
+def transcribe_and_translate_stream(transcriber, translator, media_path: str, target_lang: str,
+                                    language: str = "auto", source_lang: Optional[str] = None,
+                                    use_reflection: bool = False, reflection_mode: Optional[str] = None,
+                                    adapter: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    边转录边翻译：transcribe_stream 每产出一个片段就交给 TranslationMicroBatcher，
+    NLLB 在 ASR 进行的同时翻译已完成的片段；转录（含 VLM）结束后只需翻译最后一个微批，
+    再用场景上下文完成 QE / 反思。端到端耗时接近 max(ASR, NMT) 而不是 ASR + NMT。
+
+    事件（在 transcribe_stream 的 start / segment / done 基础上增加）:
+        {"event": "translation", "segments": [{"index", "source", "translation"}], "translated", "progress"}
+        {"event": "translated", "segments"(最终译文), "stats", "timings"}
+    """
+    start = time.perf_counter()
+    batcher: Optional[TranslationMicroBatcher] = None
+    duration = 0.0
+    transcript = None
+    asr_done_at = None
+    try:
+        for event in transcriber.transcribe_stream(media_path=media_path, language=language,
+                                                   video_source_path=media_path):
+            kind = event["event"]
+            if kind == "start":
+                duration = event["duration"]
+                batcher = TranslationMicroBatcher(translator, target_lang,
+                                                  source_lang or event.get("language") or "auto",
+                                                  adapter=adapter).start()
+            elif kind == "segment":
+                batcher.put(event["index"], event["segment"])
+            elif kind == "done":
+                transcript = event
+                asr_done_at = time.perf_counter()
+            yield event
+            yield from _translation_events(batcher, duration)
+
+        drafts = batcher.close()
+        yield from _translation_events(batcher, duration)
+        nmt_done_at = time.perf_counter()
+
+        # 转录结束后片段已带 av_context（与流式片段一一对应），统一做 QE / 反思
+        segments = [dict(seg) for seg in transcript["segments"]]
+        source_texts = [batcher.source_texts.get(idx, seg["text"].strip()) for idx, seg in enumerate(segments)]
+        translated = [drafts.get(idx, "") for idx in range(len(segments))]
+        stats = batcher.summary_stats()
+        final_segments = translator.finalize_segments(
+            segments, source_texts, translated, target_lang, use_reflection, transcript.get("global_av_context"),
+            reflection_mode, stats)
+
+        yield {
+            "event": "translated",
+            "segments": final_segments,
+            "stats": stats,
+            "timings": {
+                "asr_seconds": round(asr_done_at - start, 3),
+                # ASR 结束后还需等待的翻译时间（理想情况下只剩最后一个微批）
+                "nmt_tail_seconds": round(nmt_done_at - asr_done_at, 3),
+                "total_seconds": round(time.perf_counter() - start, 3),
+            },
+        }
+    finally:
+        if batcher is not None and batcher._thread is not None and batcher._thread.is_alive():
+            batcher._inbox.put(_CLOSE)
+
+
+def _translation_events(batcher: Optional[TranslationMicroBatcher], duration: float) -> Iterator[Dict[str, Any]]:
+    if batcher is None:
+        return
+    for batch in batcher.poll():
+        yield {
+            "event": "translation",
+            "segments": batch,
+            "translated": len(batcher.drafts),
+            "progress": round(min(1.0, batcher.translated_until / duration), 4) if duration else 1.0,
+        }
@@ -1,12 +1,26 @@
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
+from transformers.modeling_outputs import BaseModelOutput
 from peft import PeftModel  # <--- 新增引入
 import logging
 import gc
-from typing import Optional, Dict, Any, List
-from sentence_transformers import SentenceTransformer, util
+from typing import Optional, Dict, Any, List, Tuple
 import re
 import os
+import json
+import copy
+import time
+import threading
+import contextlib
+import hashlib
+import shutil
+import tempfile
+
+from config import Config
+from utils.translation_memory import TranslationMemory
+from utils.glossary import GlossaryMatcher
+from models.lora_registry import LoRAAdapterRegistry
+from models.quality_estimator import get_quality_estimator
 
 # 确保 offload 文件夹存在
 os.makedirs("offload_nllb", exist_ok=True)
@@ -14,10 +28,38 @@ logger = logging.getLogger(__name__)
 
 
 class NeuralTranslator:
+    # 前端语言代码 -> NLLB 语言代码
+    LANG_MAP = {
+        'auto': 'eng_Latn', 'en': 'eng_Latn', 'zh': 'zho_Hans', 'zh-cn': 'zho_Hans',
+        'ja': 'jpn_Jpan', 'ko': 'kor_Hang', 'fr': 'fra_Latn', 'de': 'deu_Latn',
+        'es': 'spa_Latn', 'ru': 'rus_Cyrl', 'ar': 'ara_Arab', 'hi': 'hin_Deva',
+        'pt': 'por_Latn', 'it': 'ita_Latn', 'nl': 'nld_Latn', 'pl': 'pol_Latn'
+    }
+
+    # 请求中指定该名称表示不使用任何 LoRA 适配器
+    BASE_ADAPTER = "base"
+
+    # NMT 分桶 token 预算的 OOM 缩放下限，以及每个成功桶的恢复倍数
+    TOKEN_BUDGET_MIN_SCALE = 0.0625
+    TOKEN_BUDGET_RECOVERY = 1.25
+
+    # 反思 prompt 的静态前缀（角色 + 翻译守则），其 KV cache 只计算一次并在片段、任务之间复用
+    REFLECTION_PREFIX = """你是一位专业的、场景感知的字幕翻译助手。你的任务是根据提供的**所有**场景信息和视觉描述，优化给定的翻译结果，以确保翻译的词汇、风格和情感与场景高度匹配。
+
+=== 翻译守则 ===
+1. 【准确性】翻译必须严格忠于原文含义，不得增删语义。
+2. 【场景适配】请根据**场景信息**，选择最符合场景（例如：游戏、直播、医疗、法律、日常生活等）的专业术语和口语化风格。
+3. 【情感匹配】翻译结果应能反映人物的情感状态（例如：兴奋、平静、严肃）。
+4. 【简洁性】字幕需简短精炼，易于观众快速阅读。
+5. 【目标语言】按下方指定的目标语言输出。
+
+"""
+
     def __init__(self, nmt_model_id="facebook/nllb-200-distilled-600M", 
                  reflection_model_id=None, 
                  lora_model_id=None,  # <--- 新增参数：LoRA 模型路径
-                 device='cpu'):
+                 device='cpu',
+                 use_translation_memory: Optional[bool] = None):
         
         # 自动检测并设置 GPU 设备
         self.device = torch.device("cuda" if torch.cuda.is_available() and device == 'cuda' else 'cpu')
@@ -25,13 +67,63 @@ class NeuralTranslator:
         self.nmt_model = None
         self.reflector = None
         self.qe_model = None
-        self.qe_threshold = 0.7
+        self.qe_threshold = getattr(Config, 'QE_THRESHOLD', 0.7)
+        # 反思模式：'all' 全部片段反思；'selective' 只反思 QE 低于阈值或术语未译对的片段；
+        # 'window' 把同一场景内的相邻片段合并为一个带行号的 prompt
+        self.reflection_mode = getattr(Config, 'REFLECTION_MODE', 'all')
+        self.reflection_batch_size = getattr(Config, 'REFLECTION_BATCH_SIZE', 8)
+        self.reflection_prefix_cache = getattr(Config, 'REFLECTION_PREFIX_CACHE', True)
+        self.reflection_window_size = getattr(Config, 'REFLECTION_WINDOW_SIZE', 6)  # 'window' 模式每个 prompt 的行数上限
+        self._reflection_prefix_cache = None  # (reflector 模型, 前缀 token ids, 前缀 KV cache)
+        self.glossary = self._load_glossary(getattr(Config, 'TERMINOLOGY_PATH', 'data/terminology.json'))
+        # 'constrained': 漏译术语的片段用约束解码重新生成；'off'（默认）: 仅用于反思选择
+        self.glossary_enforcement = getattr(Config, 'GLOSSARY_ENFORCEMENT', 'off')
         
         # 保存 LoRA 路径
         self.lora_model_id = lora_model_id
+        self.nmt_model_id = nmt_model_id
+        # 推理时把 LoRA 合并进基础权重；可选保存合并后的权重以便下次直接加载
+        self.lora_merge_on_load = getattr(Config, 'LORA_MERGE_ON_LOAD', True)
+        self.lora_merged_save_path = getattr(Config, 'LORA_MERGED_SAVE_PATH', None)
+        self.lora_merged = False
+        # 多适配器注册表：Config.LORA_ADAPTERS 非空时，多个 LoRA 共享同一基础模型、按请求切换（不合并）
+        self.lora_adapters = dict(getattr(Config, 'LORA_ADAPTERS', None) or {})
+        self.max_loaded_adapters = getattr(Config, 'LORA_MAX_LOADED_ADAPTERS', 3)
+        self.adapter_registry: Optional[LoRAAdapterRegistry] = None
+        self.default_adapter: Optional[str] = None
+        self.active_adapter: Optional[str] = None
+        self._adapter_lock = threading.RLock()
+        # CPU 推理量化：None（float32）或 'dynamic-int8'
+        self.nmt_quantization = getattr(Config, 'NMT_QUANTIZATION', None)
+        self.nmt_quantized = False
+        # NMT 推理引擎：'transformers'（默认）或 'ctranslate2'（转换后缓存到 CT2_MODEL_DIR）
+        self.nmt_engine = getattr(Config, 'NMT_ENGINE', 'transformers')
+        self.ct2_model_root = getattr(Config, 'CT2_MODEL_DIR', 'cache/ct2')
+        self.ct2_compute_type = getattr(Config, 'CT2_COMPUTE_TYPE', None)
+        self.ct2_inter_threads = getattr(Config, 'CT2_INTER_THREADS', 1)
+        self.ct2_intra_threads = getattr(Config, 'CT2_INTRA_THREADS', 0)
+        self.ct2_translator = None
 
         self.nmt_max_length = 150
         self.nmt_max_input_length = 128
+        self.nmt_num_beams = 4
+
+        # 长度分桶微批调度：0 表示按可用内存自动估算 token 预算
+        self.nmt_batch_token_budget = getattr(Config, 'NMT_BATCH_TOKEN_BUDGET', 0)
+        self.nmt_max_batch_size = getattr(Config, 'NMT_MAX_BATCH_SIZE', 64)
+        self.nmt_max_batch_tokens = getattr(Config, 'NMT_MAX_BATCH_TOKENS', 16384)
+        self.nmt_memory_fraction = getattr(Config, 'NMT_MEMORY_FRACTION', 0.3)
+        # 发生 OOM 后减半（不低于 TOKEN_BUDGET_MIN_SCALE），之后每个未 OOM 的桶按 TOKEN_BUDGET_RECOVERY 逐步恢复
+        self._token_budget_scale = 1.0
+
+        # 翻译记忆：只有未命中的片段才送入 NLLB
+        if use_translation_memory is None:
+            use_translation_memory = getattr(Config, 'ENABLE_TRANSLATION_MEMORY', False)
+        self.translation_memory = TranslationMemory(
+            getattr(Config, 'TRANSLATION_MEMORY_PATH', 'cache/translation_memory.sqlite3')
+        ) if use_translation_memory else None
+        # 最近一次 translate_segments 的统计（翻译记忆命中率、节省时间等）
+        self.last_job_stats: Dict[str, Any] = {}
 
         self._load_models(nmt_model_id, reflection_model_id)
 
@@ -42,34 +134,21 @@ class NeuralTranslator:
         
             # 基础模型和分词器
             self.nmt_tokenizer = AutoTokenizer.from_pretrained(nmt_model_id)
-            self.nmt_model = AutoModelForSeq2SeqLM.from_pretrained(
-                nmt_model_id,
-                torch_dtype=torch.float16 if self.device.type == 'cuda' else torch.float32,
-                load_in_8bit=False  # 保持 False
-            ).to(self.device)
+            use_lora = bool(self.lora_model_id and os.path.exists(self.lora_model_id))
 
-            # 🚀 新增 LoRA 挂载逻辑 🚀
-            if self.lora_model_id and os.path.exists(self.lora_model_id):
-                logger.info(f"Loading LoRA Adapter from: {self.lora_model_id}")
-            
-                # 加载 LoRA 权重
-                lora_model = PeftModel.from_pretrained(
-                    self.nmt_model, 
-                    self.lora_model_id, 
-                    adapter_name="nllb_lora" # 可以自定义一个名称
-                ).to(self.device)
-            
-                # 切换到 LoRA 适配器（可选，但通常需要）
-                lora_model.set_adapter("nllb_lora") 
-            
-                # 将 PEFT 模型设置为新的 NMT 模型
-                self.nmt_model = lora_model 
-            
-                logger.info("✅ LoRA Adapter loaded and merged successfully. Model is ready for inference.")
-        
+            if self.nmt_engine == 'ctranslate2' and not self.lora_adapters:
+                self._load_ct2_engine(nmt_model_id, use_lora)
             else:
-                logger.info("✅ NMT Base Model loaded successfully (No LoRA adapter found or used).")
-                
+                if self.nmt_engine == 'ctranslate2':
+                    logger.warning("CTranslate2 engine does not support per-request LoRA switching, "
+                                   "falling back to transformers.")
+                # 多适配器模式下基础模型必须保持未合并
+                self._load_transformers_nmt(nmt_model_id, use_lora,
+                                            merge=self.lora_merge_on_load and not self.lora_adapters)
+
+                # CPU 动态 int8 量化（只对不含 PEFT 适配器层的普通模型）
+                if self.nmt_quantization:
+                    self._quantize_nmt_model()
 
             # 2. 加载反思模型（可选）
             if reflection_model_id:
@@ -104,50 +183,451 @@ class NeuralTranslator:
             self._cleanup_vram()
             raise Exception(f"Translator init error: {str(e)}")
 
+    def _load_transformers_nmt(self, nmt_model_id: str, use_lora: bool, merge: bool):
+        """加载 transformers 版 NLLB，按配置挂载 / 合并 LoRA 或建立多适配器注册表"""
+        # 已保存过合并后的权重时直接加载，跳过 LoRA 挂载与合并
+        merged_path = self._merged_checkpoint_path(nmt_model_id) if use_lora and merge else None
+        if merged_path:
+            logger.info(f"Loading merged NMT+LoRA checkpoint from: {merged_path}")
+            self.nmt_model = AutoModelForSeq2SeqLM.from_pretrained(
+                merged_path,
+                torch_dtype=torch.float16 if self.device.type == 'cuda' else torch.float32
+            ).to(self.device)
+            self.lora_merged = True
+            logger.info("✅ Merged NMT model loaded successfully. Model is ready for inference.")
+            use_lora = False
+        else:
+            self.nmt_model = AutoModelForSeq2SeqLM.from_pretrained(
+                nmt_model_id,
+                torch_dtype=torch.float16 if self.device.type == 'cuda' else torch.float32,
+                load_in_8bit=False  # 保持 False
+            ).to(self.device)
+
+        if self.lora_adapters:
+            adapters = dict(self.lora_adapters)
+            if use_lora:
+                adapters.setdefault("default", self.lora_model_id)
+            self.adapter_registry = LoRAAdapterRegistry(self.nmt_model, adapters,
+                                                        max_loaded=self.max_loaded_adapters, device=self.device)
+            self.default_adapter = "default" if "default" in adapters else None
+            if self.default_adapter:
+                self.nmt_model = self.adapter_registry.activate(self.default_adapter)
+                self.active_adapter = self.default_adapter
+            logger.info(f"✅ LoRA adapter registry ready: {self.adapter_registry.names()} "
+                        f"(default: {self.default_adapter or 'base'})")
+            use_lora = False
+
+        # 🚀 新增 LoRA 挂载逻辑 🚀
+        if use_lora:
+            logger.info(f"Loading LoRA Adapter from: {self.lora_model_id}")
+        
+            # 加载 LoRA 权重
+            lora_model = PeftModel.from_pretrained(
+                self.nmt_model, 
+                self.lora_model_id, 
+                adapter_name="nllb_lora" # 可以自定义一个名称
+            ).to(self.device)
+        
+            # 切换到 LoRA 适配器（可选，但通常需要）
+            lora_model.set_adapter("nllb_lora") 
+        
+            if merge:
+                # 推理模式：把 LoRA 增量合并进基础权重并卸载适配器，解码时不再有额外的 adapter 矩阵乘
+                self.nmt_model = lora_model.merge_and_unload()
+                self.nmt_model.eval()
+                self.lora_merged = True
+                logger.info("✅ LoRA Adapter loaded and merged into base weights. Model is ready for inference.")
+                self._save_merged_checkpoint(nmt_model_id)
+            else:
+                # 将 PEFT 模型设置为新的 NMT 模型（未合并，适配器在每次前向时单独计算）
+                self.nmt_model = lora_model
+                logger.info("✅ LoRA Adapter loaded (unmerged). Model is ready for inference.")
+    
+        elif not self.lora_merged and self.adapter_registry is None:
+            logger.info("✅ NMT Base Model loaded successfully (No LoRA adapter found or used).")
+
+    def _load_ct2_engine(self, nmt_model_id: str, use_lora: bool):
+        """
+        CTranslate2 引擎：首次使用时把（合并 LoRA 后的）NLLB 转换为 CTranslate2 格式并缓存到磁盘，
+        之后直接加载转换结果，不再加载 transformers 模型。
+        """
+        import ctranslate2
+
+        compute_type = self.ct2_compute_type or ('int8_float16' if self.device.type == 'cuda' else 'int8')
+        ct2_dir = self._ct2_model_dir(nmt_model_id, use_lora, compute_type)
+
+        if not os.path.exists(os.path.join(ct2_dir, "model.bin")):
+            logger.info(f"No cached CTranslate2 model, converting {nmt_model_id} -> {ct2_dir}")
+            self._load_transformers_nmt(nmt_model_id, use_lora, merge=True)
+            self._convert_to_ct2(ct2_dir, compute_type)
+            self._cleanup_vram(nmt_only=True)
+
+        self.ct2_translator = ctranslate2.Translator(
+            ct2_dir,
+            device=self.device.type,
+            compute_type=compute_type,
+            inter_threads=self.ct2_inter_threads,
+            intra_threads=self.ct2_intra_threads
+        )
+        if use_lora:
+            self.lora_merged = True
+        logger.info(f"✅ CTranslate2 NMT engine loaded from {ct2_dir} (compute_type={compute_type}).")
+
+    def _ct2_model_dir(self, nmt_model_id: str, use_lora: bool, compute_type: str) -> str:
+        """转换缓存目录：由基础模型、LoRA（含适配器修改时间）和量化方式共同决定"""
+        key = json.dumps({
+            "model": nmt_model_id,
+            "lora": self._merge_info(nmt_model_id) if use_lora else None,
+            "quantization": compute_type,
+        }, sort_keys=True)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+        return os.path.join(self.ct2_model_root, f"{os.path.basename(nmt_model_id.rstrip('/'))}-{digest}")
+
+    def _convert_to_ct2(self, ct2_dir: str, compute_type: str):
+        from ctranslate2.converters import TransformersConverter
+
+        export_dir = tempfile.mkdtemp(prefix="nllb_export_")
+        tmp_dir = ct2_dir + ".tmp"
+        try:
+            # 转换器需要完整的 HF 目录（权重 + 分词器），先导出当前（已合并）模型
+            self.nmt_model.save_pretrained(export_dir)
+            self.nmt_tokenizer.save_pretrained(export_dir)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            TransformersConverter(export_dir).convert(tmp_dir, quantization=compute_type, force=True)
+            shutil.rmtree(ct2_dir, ignore_errors=True)
+            os.replace(tmp_dir, ct2_dir)
+        finally:
+            shutil.rmtree(export_dir, ignore_errors=True)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        logger.info(f"CTranslate2 conversion finished: {ct2_dir}")
+
+    def _quantize_nmt_model(self):
+        """
+        NMT_QUANTIZATION='dynamic-int8'：把 NLLB 的 nn.Linear 换成动态 int8 量化版本（权重 int8，激活按批动态量化），
+        仅在 CPU 上生效。未合并的 LoRA / 多适配器模式下跳过，避免破坏 PEFT 包装层。
+        """
+        if self.nmt_quantization != 'dynamic-int8':
+            logger.warning(f"Unknown NMT_QUANTIZATION '{self.nmt_quantization}', skipping quantization.")
+            return
+        if self.device.type != 'cpu':
+            logger.warning("Dynamic int8 quantization is CPU-only, skipping on CUDA.")
+            return
+        if isinstance(self.nmt_model, PeftModel):
+            logger.warning("Dynamic int8 quantization needs a plain model (enable LORA_MERGE_ON_LOAD), skipping.")
+            return
+
+        self.nmt_model = torch.quantization.quantize_dynamic(self.nmt_model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.nmt_model.eval()
+        self.nmt_quantized = True
+        gc.collect()
+        logger.info("✅ NMT model quantized to dynamic int8 (CPU).")
+
+    def _merge_info(self, nmt_model_id: str) -> Dict[str, Any]:
+        """合并权重的来源标识：基础模型 + LoRA 目录及其适配器文件的修改时间"""
+        adapter_files = [os.path.join(self.lora_model_id, name) for name in os.listdir(self.lora_model_id)
+                         if name.startswith("adapter_")]
+        return {
+            "base_model": nmt_model_id,
+            "lora_model": os.path.abspath(self.lora_model_id),
+            "adapter_mtime": max((os.path.getmtime(path) for path in adapter_files), default=0.0),
+        }
+
+    def _merged_checkpoint_path(self, nmt_model_id: str) -> Optional[str]:
+        """LORA_MERGED_SAVE_PATH 中的合并权重与当前基础模型/LoRA 一致时返回该路径"""
+        if not self.lora_merged_save_path:
+            return None
+        info_path = os.path.join(self.lora_merged_save_path, "merge_info.json")
+        if not os.path.exists(info_path):
+            return None
+        try:
+            with open(info_path, 'r', encoding='utf-8') as f:
+                saved_info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved_info != self._merge_info(nmt_model_id):
+            logger.info("Merged checkpoint is stale (base model or LoRA adapter changed), re-merging.")
+            return None
+        return self.lora_merged_save_path
+
+    def _save_merged_checkpoint(self, nmt_model_id: str):
+        if not self.lora_merged_save_path:
+            return
+        try:
+            self.nmt_model.save_pretrained(self.lora_merged_save_path)
+            with open(os.path.join(self.lora_merged_save_path, "merge_info.json"), 'w', encoding='utf-8') as f:
+                json.dump(self._merge_info(nmt_model_id), f, ensure_ascii=False, indent=2)
+            logger.info(f"Merged NMT checkpoint saved to: {self.lora_merged_save_path}")
+        except Exception as e:
+            logger.warning(f"Saving merged checkpoint failed: {e}")
+
     def _load_qe_model(self):
-        """加载翻译质量评估（QE）模型"""
+        """获取共享的翻译质量评估（QE）服务（Config.QE_MODEL_ID，多语言；Config.ENABLE_QE 关闭时为 None）"""
+        self.qe_model = get_quality_estimator(device=self.device.type)
+        if self.qe_model is not None:
+            logger.info(f"✅ QE model ({self.qe_model.model_id}) ready.")
+        else:
+            logger.warning("QE disabled or unavailable, QE scores will be 0.")
+
+    def _load_glossary(self, path: str) -> Optional[GlossaryMatcher]:
+        """加载术语表（英文术语 -> 中文译法）并编译为 Aho-Corasick 匹配器"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            glossary = GlossaryMatcher.from_json(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Terminology load failed: {e}")
+            return None
+        return glossary if len(glossary) else None
+
+    @property
+    def _glossary_enforced(self) -> bool:
+        """transformers 引擎下启用了术语约束解码（CTranslate2 路径不做约束解码）"""
+        return self.glossary is not None and self.glossary_enforcement == 'constrained' \
+            and self.nmt_model is not None and self.ct2_translator is None
+
+    def _terminology_misses(self, source_text: str, translation: str, tgt_lang: str) -> List[str]:
+        """源文本中出现、但译文没有使用术语表译法的术语（术语表仅覆盖中文目标语言）"""
+        if self.glossary is None or not tgt_lang.lower().startswith('zh'):
+            return []
+        return [term for term, _ in self.glossary.misses(source_text, translation)]
+
+    def _glossary_force_words(self, target: str) -> List[List[int]]:
+        """术语译法的 token 序列（带/不带 SentencePiece 词首标记两种切分，作为析取约束）"""
+        variants = []
+        for text in (target, "▁" + target):
+            pieces = self.nmt_tokenizer.tokenize(text)
+            if pieces and pieces[0] == "▁":
+                pieces = pieces[1:]
+            ids = self.nmt_tokenizer.convert_tokens_to_ids(pieces)
+            if ids and self.nmt_tokenizer.unk_token_id not in ids and ids not in variants:
+                variants.append(ids)
+        return variants
+
+    def _enforce_glossary(self, texts: List[str], encoded: List[List[int]], translations: List[str],
+                          tgt_lang_code: str, forced_bos_token_id: int) -> List[str]:
+        """
+        术语约束解码：译文漏掉术语表译法的片段，用 force_words_ids 做约束 beam search 重新解码；
+        只有约束解码后漏译的术语变少时才替换原译文。
+        force_words_ids 对整个 batch 生效，因此按漏译术语组合分组，同组片段一起解码。
+        """
+        if not self._glossary_enforced or not tgt_lang_code.lower().startswith('zh'):
+            return translations
+
+        translations = list(translations)
+        groups: Dict[tuple, List[int]] = {}
+        group_constraints: Dict[tuple, List[List[List[int]]]] = {}
+        miss_counts: Dict[int, int] = {}
+        for idx, (text, translation) in enumerate(zip(texts, translations)):
+            misses = self.glossary.misses(text, translation)
+            if not misses:
+                continue
+            force_words_ids = [variants for variants in (self._glossary_force_words(target) for _, target in misses)
+                               if variants]
+            if not force_words_ids:
+                continue
+            key = tuple(target for _, target in misses)
+            groups.setdefault(key, []).append(idx)
+            group_constraints[key] = force_words_ids
+            miss_counts[idx] = len(misses)
+
+        enforced = 0
+        for key, indices in groups.items():
+            for start in range(0, len(indices), self.nmt_max_batch_size):
+                chunk = indices[start:start + self.nmt_max_batch_size]
+                candidates = self._constrained_decode(chunk, encoded, group_constraints[key], forced_bos_token_id)
+                for idx, candidate in zip(chunk, candidates):
+                    if candidate and len(self.glossary.misses(texts[idx], candidate)) < miss_counts[idx]:
+                        translations[idx] = candidate
+                        enforced += 1
+
+        if enforced:
+            logger.info(f"Glossary enforcement: {enforced} segments re-decoded with terminology constraints "
+                        f"({len(groups)} constraint groups).")
+        return translations
+
+    def _constrained_decode(self, indices: List[int], encoded: List[List[int]],
+                            force_words_ids: List[List[List[int]]], forced_bos_token_id: int) -> List[str]:
+        """
+        对一组片段做批量约束解码；整批失败时逐条重试，只有出错的片段保留原译文（返回空串）。
+        """
         try:
-            self.qe_model = SentenceTransformer("all-MiniLM-L6-v2", device=self.device.type)
-            logger.info("✅ QE model (sentence-transformers) loaded successfully.")
+            inputs = self.nmt_tokenizer.pad({"input_ids": [encoded[i] for i in indices]},
+                                            return_tensors="pt").to(self.device)
+            with torch.no_grad():
+                generated = self.nmt_model.generate(
+                    **inputs,
+                    forced_bos_token_id=forced_bos_token_id,
+                    force_words_ids=force_words_ids,
+                    max_length=self.nmt_max_length,
+                    num_beams=max(self.nmt_num_beams, 2),
+                    do_sample=False,
+                    early_stopping=True,
+                    no_repeat_ngram_size=2
+                )
+            return [c.strip() for c in self.nmt_tokenizer.batch_decode(generated, skip_special_tokens=True)]
         except Exception as e:
-            logger.warning(f"QE model load failed: {e}", exc_info=True)
-            self.qe_model = None
+            if len(indices) == 1:
+                logger.warning(f"Glossary-constrained decoding failed for segment {indices[0]}, "
+                               f"keeping unconstrained output: {e}")
+                return [""]
+            logger.warning(f"Glossary-constrained decoding failed for a batch of {len(indices)} segments, "
+                           f"retrying one by one: {e}")
+            return [self._constrained_decode([idx], encoded, force_words_ids, forced_bos_token_id)[0]
+                    for idx in indices]
 
     def translate_segments(self, segments: List[Dict[str, Any]], target_lang: str, source_lang: str = 'auto',
-                           use_reflection: bool = False, av_context: Optional[Dict[str, Any]] = None) -> List[
-        Dict[str, Any]]:
+                           use_reflection: bool = False, av_context: Optional[Dict[str, Any]] = None,
+                           reflection_mode: Optional[str] = None, adapter: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         翻译字幕片段（支持片段级 AV 上下文优化）
         """
+        logger.info(
+            f"Starting translation: {len(segments)} segments -> Target lang: {target_lang} (Reflection: {use_reflection})")
+
+        # 第一步：批量翻译（先查翻译记忆，仅未命中的片段送入模型，结果包含 LoRA 影响）
+        source_texts, translated_texts, stats = self.translate_drafts(segments, target_lang, source_lang,
+                                                                      av_context, adapter)
+
+        return self.finalize_segments(segments, source_texts, translated_texts, target_lang, use_reflection,
+                                      av_context, reflection_mode, stats)
+
+    def translate_drafts(self, segments: List[Dict[str, Any]], target_lang: str, source_lang: str = 'auto',
+                         av_context: Optional[Dict[str, Any]] = None,
+                         adapter: Optional[str] = None) -> Tuple[List[str], List[str], Dict[str, Any]]:
+        """
+        只做 NMT 初译（含翻译记忆），不做反思 / QE，供流水线把翻译与 QE 拆成两个阶段。
+        返回 (源文本, 初译, 本次统计)；之后可用 finalize_segments 完成反思与打分。
+        """
+        source_texts = self._prepare_segments(segments, av_context)
+        with self._use_adapter(adapter):
+            translated_texts = self._translate_with_memory(source_texts, source_lang, target_lang)
+            self.last_job_stats["adapter"] = self.active_adapter
+            stats = self.last_job_stats
+        logger.info(f"Batch translation completed.")
+        return source_texts, translated_texts, stats
+
+    def translate_segments_multi(self, segments: List[Dict[str, Any]], target_langs: List[str],
+                                 source_lang: str = 'auto', use_reflection: bool = False,
+                                 av_context: Optional[Dict[str, Any]] = None,
+                                 reflection_mode: Optional[str] = None,
+                                 adapter: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        一次请求翻译成多种目标语言：每个批次只运行一次 NLLB 编码器，
+        再针对每个目标语言的 forced_bos_token_id 复用编码结果解码。
+        返回 {目标语言: 翻译后的片段列表}。
+        """
+        target_langs = list(dict.fromkeys(target_langs))
+        if not target_langs:
+            raise ValueError("target_langs must contain at least one language.")
+
+        source_texts = self._prepare_segments(segments, av_context)
+        logger.info(
+            f"Starting multi-target translation: {len(source_texts)} segments -> {target_langs} (Reflection: {use_reflection})")
+
+        with self._use_adapter(adapter):
+            translated = self._translate_with_memory_multi(source_texts, source_lang, target_langs)
+            self.last_job_stats["adapter"] = self.active_adapter
+        logger.info(f"Batch translation completed.")
+
+        # 不做反思时，所有目标语言的 QE 合并为一次编码
+        qe_scores: Dict[str, Optional[List[float]]] = {tgt: None for tgt in target_langs}
+        if self.qe_model and not (use_reflection and self.reflector) and source_texts:
+            all_scores = self.qe_model.score_many(source_texts, [translated[tgt] for tgt in target_langs])
+            qe_scores = {tgt: [float(max(0, score)) for score in scores]
+                         for tgt, scores in zip(target_langs, all_scores)}
+
+        return {
+            tgt: self.finalize_segments(segments, source_texts, translated[tgt], tgt, use_reflection, av_context,
+                                        reflection_mode, self.last_job_stats["targets"][tgt], qe_scores[tgt])
+            for tgt in target_langs
+        }
+
+    def _prepare_segments(self, segments: List[Dict[str, Any]], av_context: Optional[Dict[str, Any]]) -> List[str]:
+        """校验片段字段、补全 av_context，返回待翻译的源文本"""
         for idx, seg in enumerate(segments):
             if not all(key in seg for key in ["start", "end", "text"]):
                 raise ValueError(f"Segment {idx + 1} missing required fields (start/end/text).")
             if "av_context" not in seg:
                 seg["av_context"] = av_context or {}
+        return [seg["text"].strip() for seg in segments]
 
-        source_texts = [seg["text"].strip() for seg in segments]
-        logger.info(
-            f"Starting translation: {len(source_texts)} segments -> Target lang: {target_lang} (Reflection: {use_reflection})")
-
-        # 第一步：批量翻译（基础翻译结果，包含 LoRA 影响）
-        translated_texts = self._translate_batch(source_texts, source_lang, target_lang)
-        logger.info(f"Batch translation completed.")
+    def finalize_segments(self, segments: List[Dict[str, Any]], source_texts: List[str], translated_texts: List[str],
+                          target_lang: str, use_reflection: bool, av_context: Optional[Dict[str, Any]],
+                          reflection_mode: Optional[str], stats: Dict[str, Any],
+                          qe_scores: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        反思优化、QE 打分并组装最终结果；反思统计写入 stats["reflection"]。qe_scores 可由调用方预先算好。
+        与 translate_drafts 配合使用：流水线与边转录边翻译先分批初译，再统一调用本方法。
+        """
+        reflection_mode = reflection_mode or self.reflection_mode
+        reflected: set = set()
 
         # 第二步：反思优化
         if use_reflection and self.reflector:
-            logger.info("Starting reflection optimization with segment-level AV context...")
-            optimized_texts = []
+            candidates = list(range(len(source_texts)))
+            below_threshold = term_hits = 0
 
-            for idx, (seg, src_text, trans_text) in enumerate(zip(segments, source_texts, translated_texts)):
-                segment_av_ctx = seg["av_context"] or av_context or {}
-                optimized = self._reflect_and_improve(src_text, trans_text, target_lang, segment_av_ctx, idx + 1)
-                optimized_texts.append(optimized)
-            translated_texts = optimized_texts
-            logger.info("Reflection optimization completed.")
+            # 选择性反思：先算 QE，只有低分或术语未译对的片段进入 LLM
+            if reflection_mode == 'selective' and self.qe_model:
+                qe_scores = self._calculate_batch_qe_scores(source_texts, translated_texts)
+                candidates = []
+                for idx, (src_text, trans_text, score) in enumerate(zip(source_texts, translated_texts, qe_scores)):
+                    low_qe = score < self.qe_threshold
+                    missed_terms = self._terminology_misses(src_text, trans_text, target_lang)
+                    below_threshold += low_qe
+                    term_hits += bool(missed_terms)
+                    if low_qe or missed_terms:
+                        candidates.append(idx)
+            elif reflection_mode == 'selective':
+                logger.warning("QE model unavailable, falling back to reflecting every segment.")
 
-        # 第三步：计算 QE 分数
-        qe_scores = self._calculate_batch_qe_scores(source_texts, translated_texts) if self.qe_model else [0.0] * len(
-            source_texts)
+            logger.info(f"Starting reflection optimization with segment-level AV context "
+                        f"({len(candidates)}/{len(source_texts)} segments, mode={reflection_mode})...")
+            translated_texts = list(translated_texts)
+            start = time.perf_counter()
+            items = [(source_texts[idx], translated_texts[idx], segments[idx]["av_context"] or av_context or {},
+                      idx + 1) for idx in candidates]
+            if reflection_mode == 'window':
+                # 相邻片段按场景分组，一个 prompt 反思一组
+                windows = self._group_reflection_windows(segments, candidates)
+                position = {idx: pos for pos, idx in enumerate(candidates)}
+                outputs = self._reflect_windows([[items[position[idx]] for idx in window] for window in windows],
+                                                target_lang)
+                llm_prompts = len(windows)
+            else:
+                outputs = self._reflect_batch(items, target_lang)
+                llm_prompts = len(candidates)
+            for idx, optimized in zip(candidates, outputs):
+                translated_texts[idx] = optimized
+            reflection_seconds = time.perf_counter() - start
+            reflected = set(candidates)
+
+            # 按本次实际的单句反思耗时估算跳过片段节省的时间
+            skipped = len(source_texts) - len(candidates)
+            per_segment = reflection_seconds / len(candidates) if candidates else 0.0
+            stats["reflection"] = {
+                "mode": reflection_mode,
+                "reflected": len(candidates),
+                "llm_prompts": llm_prompts,
+                "skipped": skipped,
+                "qe_below_threshold": below_threshold,
+                "terminology_hits": term_hits,
+                "reflection_seconds": round(reflection_seconds, 3),
+                "estimated_seconds_saved": round(per_segment * skipped, 3),
+            }
+            logger.info(f"Reflection optimization completed: {stats['reflection']}")
+
+        # 第三步：计算 QE 分数（选择性反思时只需重算被改写的片段）
+        if not self.qe_model:
+            qe_scores = [0.0] * len(source_texts)
+        elif qe_scores is None:
+            qe_scores = self._calculate_batch_qe_scores(source_texts, translated_texts)
+        elif reflected:
+            order = sorted(reflected)
+            rescored = self._calculate_batch_qe_scores([source_texts[i] for i in order],
+                                                       [translated_texts[i] for i in order])
+            for idx, score in zip(order, rescored):
+                qe_scores[idx] = score
 
         # 第四步：组装最终结果
         result = []
@@ -159,79 +639,371 @@ class NeuralTranslator:
                 "original_text": seg["text"],
                 "qe_score": round(qe_score, 2),
                 "av_context": seg["av_context"],
-                "is_optimized": use_reflection and self.reflector is not None
+                "is_optimized": idx in reflected
             })
 
         logger.info(f"Translation process finished: {len(result)} segments processed.")
 
         return result
 
+    def _resolve_lang_codes(self, src_lang_code: str, tgt_lang_code: str):
+        """前端语言代码 -> (NLLB 源语言代码, NLLB 目标语言代码)"""
+        src_code = self.LANG_MAP.get(src_lang_code.lower(), 'eng_Latn')
+        tgt_code = self.LANG_MAP.get(tgt_lang_code.lower(), 'zho_Hans')
+        return src_code, tgt_code
+
+    @property
+    def model_signature(self) -> str:
+        """翻译记忆使用的模型标识（基础模型 + 当前 LoRA 适配器）"""
+        if self.adapter_registry is not None:
+            lora = self.adapter_registry.path(self.active_adapter)
+        else:
+            lora = self.lora_model_id
+        signature = f"{self.nmt_model_id}|lora={lora or 'none'}"
+        # 约束解码的结果取决于术语表内容：术语表修改后旧译文不再命中
+        if self._glossary_enforced:
+            signature += f"|glossary={self.glossary.fingerprint}"
+        # 量化模型 / CTranslate2 引擎的译文与 float32 transformers 不完全一致，分开缓存
+        if self.ct2_translator is not None:
+            return signature + "|ct2"
+        return signature + "|int8" if self.nmt_quantized else signature
+
+    def available_adapters(self) -> List[str]:
+        """可按请求选择的 LoRA 适配器名称（'base' 表示不使用适配器）"""
+        if self.adapter_registry is None:
+            return []
+        return self.adapter_registry.names() + [self.BASE_ADAPTER]
+
+    @contextlib.contextmanager
+    def _use_adapter(self, adapter: Optional[str]):
+        """
+        在 with 块内把 NMT 模型切换到指定适配器（None 为默认适配器，'base' 为基础模型）。
+        切换与翻译在同一把锁内完成，避免并发请求互相切走适配器。
+        """
+        with self._adapter_lock:
+            if self.adapter_registry is None:
+                if adapter:
+                    raise ValueError(f"Unknown LoRA adapter: {adapter} (adapter registry is not configured)")
+                yield
+                return
+
+            name = adapter or self.default_adapter
+            if name and name != self.BASE_ADAPTER:
+                self.nmt_model = self.adapter_registry.activate(name)
+                self.active_adapter = name
+                yield
+            else:
+                self.active_adapter = None
+                if self.adapter_registry.model is not None:
+                    with self.adapter_registry.model.disable_adapter():
+                        yield
+                else:
+                    yield
+
+    def _translate_with_memory(self, texts: List[str], src_lang_code: str, tgt_lang_code: str) -> List[str]:
+        """
+        先查询翻译记忆，再对文件内重复的句子去重，只把剩余的唯一句子送入 _translate_batch。
+        统计结果写入 self.last_job_stats。
+        """
+        results = self._translate_with_memory_multi(texts, src_lang_code, [tgt_lang_code])
+        self.last_job_stats = self.last_job_stats["targets"][tgt_lang_code]
+        return results[tgt_lang_code]
+
+    def _translate_with_memory_multi(self, texts: List[str], src_lang_code: str,
+                                     tgt_lang_codes: List[str]) -> Dict[str, List[str]]:
+        """
+        多目标语言版本：每个目标语言分别查询翻译记忆，任一目标语言未命中的唯一句子
+        统一送入 _translate_batch_multi（编码器只运行一次）。
+        self.last_job_stats = {"targets": {目标语言: 统计}, "nmt_seconds": ..., "model_translated": ...}
+        """
+        src_code = self._resolve_lang_codes(src_lang_code, tgt_lang_codes[0])[0]
+        tgt_codes = {tgt: self._resolve_lang_codes(src_lang_code, tgt)[1] for tgt in tgt_lang_codes}
+        results: Dict[str, List[Optional[str]]] = {tgt: [None] * len(texts) for tgt in tgt_lang_codes}
+        stats = {tgt: {"segments": len(texts), "tm_exact": 0, "tm_normalized": 0, "in_file_duplicates": 0,
+                       "model_translated": 0, "nmt_seconds": 0.0, "estimated_seconds_saved": 0.0}
+                 for tgt in tgt_lang_codes}
+
+        if self.translation_memory is not None:
+            for tgt in tgt_lang_codes:
+                hits = self.translation_memory.lookup(texts, src_code, tgt_codes[tgt], self.model_signature)
+                for idx, (translation, match_type) in hits.items():
+                    results[tgt][idx] = translation
+                    stats[tgt][f"tm_{match_type}"] += 1
+
+        # 文件内相同句子只翻译一次；记录每个目标语言实际缺失的句子
+        pending: Dict[str, List[int]] = {}
+        missing: Dict[str, List[str]] = {tgt: [] for tgt in tgt_lang_codes}
+        for idx, text in enumerate(texts):
+            absent = [tgt for tgt in tgt_lang_codes if results[tgt][idx] is None]
+            if not absent:
+                continue
+            if text not in pending:
+                for tgt in absent:
+                    missing[tgt].append(text)
+            pending.setdefault(text, []).append(idx)
+        unique_texts = list(pending)
+        needed_targets = [tgt for tgt in tgt_lang_codes if missing[tgt]]
+
+        nmt_seconds = 0.0
+        if unique_texts:
+            start = time.perf_counter()
+            outputs = self._translate_batch_multi(unique_texts, src_lang_code, needed_targets)
+            nmt_seconds = round(time.perf_counter() - start, 3)
+            for tgt in needed_targets:
+                missing_set = set(missing[tgt])
+                stats[tgt]["model_translated"] = len(missing_set)
+                stats[tgt]["in_file_duplicates"] = sum(
+                    1 for idx in range(len(texts)) if results[tgt][idx] is None) - len(missing_set)
+                stats[tgt]["nmt_seconds"] = round(nmt_seconds / len(needed_targets), 3)
+                new_pairs = []
+                for text, output in zip(unique_texts, outputs[tgt]):
+                    if text not in missing_set:
+                        continue
+                    new_pairs.append((text, output))
+                    for idx in pending[text]:
+                        if results[tgt][idx] is None:
+                            results[tgt][idx] = output
+                if self.translation_memory is not None:
+                    self.translation_memory.store(new_pairs, src_code, tgt_codes[tgt], self.model_signature)
+
+        for tgt in tgt_lang_codes:
+            tgt_stats = stats[tgt]
+            # 按本次实际的单句平均耗时估算节省的时间
+            skipped = len(texts) - tgt_stats["model_translated"]
+            if tgt_stats["model_translated"] and skipped:
+                tgt_stats["estimated_seconds_saved"] = round(
+                    tgt_stats["nmt_seconds"] / tgt_stats["model_translated"] * skipped, 3)
+            tgt_stats["tm_hit_rate"] = round(
+                (tgt_stats["tm_exact"] + tgt_stats["tm_normalized"]) / len(texts), 4) if texts else 0.0
+
+        self.last_job_stats = {"targets": stats, "nmt_seconds": nmt_seconds, "model_translated": len(unique_texts)}
+        logger.info(f"Translation memory stats: {stats}")
+        return results
+
     def _translate_batch(self, texts: List[str], src_lang_code: str, tgt_lang_code: str) -> List[str]:
         """
         批量翻译文本（NLLB 模型核心翻译逻辑）
+        按 token 长度排序分桶，每个桶在 token 预算内单独 generate，结果按原顺序返回。
         """
-        lang_map = {
-            'auto': 'eng_Latn', 'en': 'eng_Latn', 'zh': 'zho_Hans', 'zh-cn': 'zho_Hans',
-            'ja': 'jpn_Jpan', 'ko': 'kor_Hang', 'fr': 'fra_Latn', 'de': 'deu_Latn',
-            'es': 'spa_Latn', 'ru': 'rus_Cyrl', 'ar': 'ara_Arab', 'hi': 'hin_Deva',
-            'pt': 'por_Latn', 'it': 'ita_Latn', 'nl': 'nld_Latn', 'pl': 'pol_Latn'
-        }
+        return self._translate_batch_multi(texts, src_lang_code, [tgt_lang_code])[tgt_lang_code]
 
-        src_code = lang_map.get(src_lang_code.lower(), 'eng_Latn')
-        tgt_code = lang_map.get(tgt_lang_code.lower(), 'zho_Hans')
-        
-        inputs = self.nmt_tokenizer(
+    def _translate_batch_multi(self, texts: List[str], src_lang_code: str,
+                               tgt_lang_codes: List[str]) -> Dict[str, List[str]]:
+        """同一批源文本翻译成多个目标语言：每个桶只编码一次，按目标语言分别解码。"""
+        if not texts:
+            return {tgt: [] for tgt in tgt_lang_codes}
+
+        if self.ct2_translator is not None:
+            return self._translate_batch_ct2(texts, src_lang_code, tgt_lang_codes)
+
+        src_code = self._resolve_lang_codes(src_lang_code, tgt_lang_codes[0])[0]
+        self.nmt_tokenizer.src_lang = src_code
+
+        encoded = self.nmt_tokenizer(
             texts,
-            return_tensors="pt",
-            padding=True,
             truncation=True,
             max_length=self.nmt_max_input_length
-        ).to(self.device)
+        )["input_ids"]
 
-        forced_bos_token_id = self.nmt_tokenizer.convert_tokens_to_ids(tgt_code)
+        forced_bos_token_ids = {
+            tgt: self.nmt_tokenizer.convert_tokens_to_ids(self._resolve_lang_codes(src_lang_code, tgt)[1])
+            for tgt in tgt_lang_codes
+        }
 
-        with torch.no_grad():
-            generated_tokens = self.nmt_model.generate(
-                **inputs,
-                forced_bos_token_id=forced_bos_token_id,
-                max_length=self.nmt_max_length,
-                num_beams=4,
-                do_sample=False,
-                early_stopping=True,
-                no_repeat_ngram_size=2
-            )
+        buckets = self._plan_buckets([len(ids) for ids in encoded])
+        logger.info(f"NMT micro-batching: {len(texts)} segments -> {len(buckets)} length buckets "
+                    f"x {len(tgt_lang_codes)} target(s)")
 
-        translations = self.nmt_tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
-        translations = [trans.strip() for trans in translations]
+        translations = {tgt: [""] * len(texts) for tgt in tgt_lang_codes}
+        for bucket in buckets:
+            scale = self._token_budget_scale
+            outputs = self._generate_bucket([encoded[i] for i in bucket], forced_bos_token_ids)
+            if self._token_budget_scale == scale < 1.0:
+                # 本桶没有 OOM：逐步恢复预算，一次超大任务不会永久压低后续任务的批大小
+                self._token_budget_scale = min(1.0, scale * self.TOKEN_BUDGET_RECOVERY)
+            for tgt, bucket_outputs in outputs.items():
+                for idx, output in zip(bucket, bucket_outputs):
+                    translations[tgt][idx] = output
+
+        # 术语表仅覆盖英文源语言
+        if self.glossary is not None and src_code == 'eng_Latn':
+            for tgt in tgt_lang_codes:
+                translations[tgt] = self._enforce_glossary(texts, encoded, translations[tgt], tgt,
+                                                           forced_bos_token_ids[tgt])
 
         return translations
 
+    def _translate_batch_ct2(self, texts: List[str], src_lang_code: str,
+                             tgt_lang_codes: List[str]) -> Dict[str, List[str]]:
+        """CTranslate2 批量 beam search（内部按长度排序分批），输出格式与 transformers 路径一致"""
+        src_code = self._resolve_lang_codes(src_lang_code, tgt_lang_codes[0])[0]
+        self.nmt_tokenizer.src_lang = src_code
+
+        encoded = self.nmt_tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.nmt_max_input_length
+        )["input_ids"]
+        source_tokens = [self.nmt_tokenizer.convert_ids_to_tokens(ids) for ids in encoded]
+
+        translations = {}
+        for tgt in tgt_lang_codes:
+            tgt_code = self._resolve_lang_codes(src_lang_code, tgt)[1]
+            results = self.ct2_translator.translate_batch(
+                source_tokens,
+                target_prefix=[[tgt_code]] * len(source_tokens),
+                beam_size=self.nmt_num_beams,
+                max_decoding_length=self.nmt_max_length,
+                no_repeat_ngram_size=2,
+                max_batch_size=self.nmt_max_batch_size
+            )
+            outputs = []
+            for result in results:
+                tokens = result.hypotheses[0][1:]  # 去掉目标语言标记
+                output = self.nmt_tokenizer.decode(self.nmt_tokenizer.convert_tokens_to_ids(tokens),
+                                                   skip_special_tokens=True)
+                outputs.append(output.strip())
+            translations[tgt] = outputs
+
+        return translations
+
+    def _plan_buckets(self, lengths: List[int]) -> List[List[int]]:
+        """
+        按源长度排序后贪心分桶：桶代价 = (桶内最大源长度 + 最大生成长度) × beam 数 × 桶大小，
+        不超过 token 预算与最大批大小。返回每个桶内的原始下标。
+        """
+        token_budget = self._resolve_token_budget()
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+
+        buckets: List[List[int]] = []
+        current: List[int] = []
+        current_max = 0
+        for idx in order:
+            new_max = max(current_max, lengths[idx])
+            cost = (new_max + self.nmt_max_length) * self.nmt_num_beams * (len(current) + 1)
+            if current and (cost > token_budget or len(current) >= self.nmt_max_batch_size):
+                buckets.append(current)
+                current, new_max = [], lengths[idx]
+            current.append(idx)
+            current_max = new_max
+        if current:
+            buckets.append(current)
+        return buckets
+
+    def _resolve_token_budget(self) -> int:
+        """
+        单个桶的 token 预算：配置了固定值则直接使用；CPU 上内存不是瓶颈，使用固定的 NMT_MAX_BATCH_TOKENS；
+        GPU 上按当前空闲显存估算。实际 OOM 时由 _generate_bucket 拆桶重试并下调预算。
+        """
+        if self.nmt_batch_token_budget:
+            return self.nmt_batch_token_budget
+
+        min_budget = (self.nmt_max_input_length + self.nmt_max_length) * self.nmt_num_beams
+        available = self._available_memory_bytes()
+        if available is None:
+            return max(int(self.nmt_max_batch_tokens * self._token_budget_scale), min_budget)
+
+        # 桶代价按 (源长度 + 生成长度) 个位置计：源位置对应 cross-attention K/V，目标位置对应 self-attention K/V，
+        # 每个位置每层各一对 K/V
+        config = self.nmt_model.config
+        dtype_bytes = next(self.nmt_model.parameters()).element_size()
+        bytes_per_token = 2 * config.d_model * config.decoder_layers * dtype_bytes
+
+        budget = int(available * self.nmt_memory_fraction / bytes_per_token * self._token_budget_scale)
+        return max(budget, min_budget)
+
+    def _available_memory_bytes(self) -> Optional[int]:
+        """GPU 空闲显存；CPU 或无法查询时为 None"""
+        if self.device.type != 'cuda':
+            return None
+        try:
+            return torch.cuda.mem_get_info(self.device)[0]
+        except (ValueError, OSError, AttributeError, RuntimeError):
+            return None
+
+    # CUDA: "CUDA out of memory"；CPU 分配器: "DefaultCPUAllocator: can't allocate memory"
+    _OOM_MESSAGES = ("out of memory", "can't allocate memory")
+
+    @classmethod
+    def _is_oom_error(cls, error: BaseException) -> bool:
+        """GPU 显存或 CPU 内存分配失败"""
+        oom_type = getattr(torch.cuda, "OutOfMemoryError", None)
+        if oom_type is not None and isinstance(error, oom_type):
+            return True
+        message = str(error).lower()
+        return any(m in message for m in cls._OOM_MESSAGES)
+
+    def _generate_bucket(self, input_ids: List[List[int]],
+                         forced_bos_token_ids: Dict[str, int]) -> Dict[str, List[str]]:
+        """
+        对一个长度桶执行 beam search：编码器只运行一次，每个目标语言复用编码结果解码。
+        显存不足时将桶对半拆分重试，并下调后续桶的预算。
+        """
+        inputs = self.nmt_tokenizer.pad({"input_ids": input_ids}, return_tensors="pt").to(self.device)
+
+        try:
+            with torch.no_grad():
+                encoder_hidden = self.nmt_model.get_encoder()(**inputs).last_hidden_state
+                outputs = {}
+                for tgt, forced_bos_token_id in forced_bos_token_ids.items():
+                    generated_tokens = self.nmt_model.generate(
+                        # generate 会按 beam 数就地扩展 encoder_outputs，每个目标语言需要新的包装对象
+                        encoder_outputs=BaseModelOutput(last_hidden_state=encoder_hidden),
+                        attention_mask=inputs["attention_mask"],
+                        forced_bos_token_id=forced_bos_token_id,
+                        max_length=self.nmt_max_length,
+                        num_beams=self.nmt_num_beams,
+                        do_sample=False,
+                        early_stopping=True,
+                        no_repeat_ngram_size=2
+                    )
+                    translations = self.nmt_tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+                    outputs[tgt] = [trans.strip() for trans in translations]
+        except RuntimeError as e:
+            if not self._is_oom_error(e) or len(input_ids) == 1:
+                raise
+            logger.warning(f"NMT bucket of {len(input_ids)} segments ran out of memory, splitting and retrying.")
+            del inputs
+            if self.device.type == 'cuda':
+                torch.cuda.empty_cache()
+            self._token_budget_scale = max(self.TOKEN_BUDGET_MIN_SCALE, self._token_budget_scale * 0.5)
+            mid = len(input_ids) // 2
+            left = self._generate_bucket(input_ids[:mid], forced_bos_token_ids)
+            right = self._generate_bucket(input_ids[mid:], forced_bos_token_ids)
+            return {tgt: left[tgt] + right[tgt] for tgt in forced_bos_token_ids}
+
+        return outputs
+
     def _reflect_and_improve(self, source_text: str, initial_translation: str, tgt_lang: str,
                              segment_av_ctx: Dict[str, Any], segment_idx: int) -> str:
         """
         结合片段级 AV 上下文优化翻译结果（反思机制）
         """
+        return self._reflect_batch([(source_text, initial_translation, segment_av_ctx, segment_idx)], tgt_lang)[0]
+
+    def _build_reflection_prompt(self, source_text: str, initial_translation: str, tgt_lang: str,
+                                 segment_av_ctx: Dict[str, Any]) -> str:
+        """完整反思 prompt = 静态前缀 REFLECTION_PREFIX + 片段相关的后缀"""
+        return self.REFLECTION_PREFIX + self._build_reflection_suffix(source_text, initial_translation, tgt_lang,
+                                                                      segment_av_ctx)
+
+    def _build_reflection_suffix(self, source_text: str, initial_translation: str, tgt_lang: str,
+                                 segment_av_ctx: Dict[str, Any]) -> str:
         scene_type = segment_av_ctx.get("scene_type", "无/未知").strip()
         environment = segment_av_ctx.get("environment", "无/未知").strip()
         emotion = segment_av_ctx.get("emotion", "无/未知").strip()
         activity = segment_av_ctx.get("activity", "无/未知").strip()
         scene_desc = segment_av_ctx.get("description", "无详细描述").strip()
 
-        prompt = f"""你是一位专业的、场景感知的字幕翻译助手。你的任务是根据提供的**所有**场景信息和视觉描述，优化给定的翻译结果，以确保翻译的词汇、风格和情感与场景高度匹配。
-
-=== 当前场景信息 (来自 VLM 的提取结果) ===
+        suffix = f"""=== 当前场景信息 (来自 VLM 的提取结果) ===
 - 场景类型: {scene_type}
 - 具体环境: {environment}
 - 人物情感: {emotion}
 - 活动状态: {activity}
 - 详细视觉描述: {scene_desc}
 
-=== 翻译守则 ===
-1. 【准确性】翻译必须严格忠于原文含义，不得增删语义。
-2. 【场景适配】请根据**以上所有信息**，选择最符合场景（例如：游戏、直播、医疗、法律、日常生活等）的专业术语和口语化风格。
-3. 【情感匹配】翻译结果应能反映人物的情感状态（例如：兴奋、平静、严肃）。
-4. 【简洁性】字幕需简短精炼，易于观众快速阅读。
-5. 【目标语言】请翻译成{self._get_lang_name(tgt_lang)}。
+=== 目标语言 ===
+{self._get_lang_name(tgt_lang)}
 
 === 需要优化的内容 ===
 - 源文本: "{source_text}"
@@ -239,56 +1011,193 @@ class NeuralTranslator:
 
 请根据以上所有信息，输出优化后的最终翻译结果。
 **🔴 核心指令: 你的回答中，必须且只能包含最终优化后的纯净中文字幕文本，不允许包含任何解释、分析、打招呼或额外的文字。请立即开始输出翻译文本。**
-""" 
+"""
+        return suffix.strip()
 
-        try:
-            prompt_text = prompt.strip()
-            pad_id = self.reflector.model.config.pad_token_id
-            eos_id = self.reflector.model.config.eos_token_id
-
-            response = self.reflector(
-                prompt_text,
-                max_new_tokens=150,
-                do_sample=False,
-                num_return_sequences=1,
-                pad_token_id=pad_id,
-                eos_token_id=eos_id,
-            )[0]["generated_text"]
-
-            optimized = initial_translation 
-
-            if response.startswith(prompt_text):
-                optimized = response[len(prompt_text):].strip()
+    def _get_reflection_prefix_cache(self):
+        """
+        返回 (前缀 token ids, 前缀 KV cache)。首次调用时对 REFLECTION_PREFIX 做一次前向计算并缓存；
+        反思模型不支持可复制的 Cache 对象时返回 (None, None)，退回完整 prompt 编码。
+        """
+        model = self.reflector.model
+        if self._reflection_prefix_cache is not None and self._reflection_prefix_cache[0] is model:
+            return self._reflection_prefix_cache[1:]
+
+        prefix_ids = self.reflector.tokenizer(self.REFLECTION_PREFIX, return_tensors="pt")["input_ids"].to(model.device)
+        with torch.no_grad():
+            past_key_values = model(input_ids=prefix_ids, use_cache=True).past_key_values
+        if not hasattr(past_key_values, "batch_repeat_interleave"):
+            logger.warning("Reflection model returned a legacy KV cache, prefix caching disabled.")
+            prefix_ids = past_key_values = None
+
+        self._reflection_prefix_cache = (model, prefix_ids, past_key_values)
+        if prefix_ids is not None:
+            logger.info(f"Cached reflection prefix KV ({prefix_ids.shape[1]} tokens).")
+        return prefix_ids, past_key_values
+
+    def _reflect_batch(self, items: List[tuple], tgt_lang: str) -> List[str]:
+        """
+        批量反思：items 为 (源文本, 初始译文, AV 上下文, 片段序号)。
+        按 REFLECTION_BATCH_SIZE 分批生成，逐条解析；解析失败或整批出错时回退到 NMT 译文。
+        """
+        suffixes = [self._build_reflection_suffix(src, trans, tgt_lang, ctx) for src, trans, ctx, _ in items]
+        responses = self._generate_reflections(suffixes, [[segment_idx] for _, _, _, segment_idx in items],
+                                               max_new_tokens=150)
+        return [trans if response is None else self._parse_reflection(response, trans)
+                for (_, trans, _, _), response in zip(items, responses)]
+
+    def _group_reflection_windows(self, segments: List[Dict[str, Any]], indices: List[int]) -> List[List[int]]:
+        """
+        把待反思的片段按顺序分组：组内片段在原字幕中连续、AV 上下文（场景）相同，
+        且不超过 REFLECTION_WINDOW_SIZE 行。
+        """
+        windows: List[List[int]] = []
+        for idx in indices:
+            current = windows[-1] if windows else None
+            if (current and idx == current[-1] + 1 and len(current) < self.reflection_window_size
+                    and segments[idx]["av_context"] == segments[current[-1]]["av_context"]):
+                current.append(idx)
             else:
-                optimized = response.strip()
+                windows.append([idx])
+        return windows
+
+    def _build_window_suffix(self, window_items: List[tuple], tgt_lang: str) -> str:
+        """多行反思 prompt 的后缀：共享场景信息 + 逐行编号的源文本/基础翻译"""
+        segment_av_ctx = window_items[0][2]
+        scene_type = segment_av_ctx.get("scene_type", "无/未知").strip()
+        environment = segment_av_ctx.get("environment", "无/未知").strip()
+        emotion = segment_av_ctx.get("emotion", "无/未知").strip()
+        activity = segment_av_ctx.get("activity", "无/未知").strip()
+        scene_desc = segment_av_ctx.get("description", "无详细描述").strip()
 
-            optimized = re.sub(r'(Human:|Assistant:|\n\n).*', '', optimized, flags=re.IGNORECASE | re.DOTALL).strip()
-            optimized = optimized.replace("<|endoftext|>", "").strip()
-            optimized = optimized.strip('"').strip("'").strip()
-            optimized = optimized.replace('\n', ' ').strip()
+        lines = "\n".join(
+            f'[{n}] 源文本: "{src}" | 基础翻译: "{trans}"'
+            for n, (src, trans, _, _) in enumerate(window_items, start=1)
+        )
 
-            if not optimized or len(optimized) < 1:
-                return initial_translation
+        suffix = f"""=== 当前场景信息 (来自 VLM 的提取结果) ===
+- 场景类型: {scene_type}
+- 具体环境: {environment}
+- 人物情感: {emotion}
+- 活动状态: {activity}
+- 详细视觉描述: {scene_desc}
 
-            return optimized
+=== 目标语言 ===
+{self._get_lang_name(tgt_lang)}
 
-        except Exception as e:
-            logger.error(f"Segment {segment_idx} reflection failed: {e}", exc_info=True)
+=== 需要优化的内容（连续的 {len(window_items)} 行字幕，可能是同一句话的片段）===
+{lines}
+
+请结合上下文，输出每一行优化后的最终翻译结果。
+**🔴 核心指令: 必须输出恰好 {len(window_items)} 行，每行格式为 "[编号] 译文"，编号与输入一一对应，不得合并、拆分或调换行，不允许包含任何解释或额外的文字。请立即开始输出。**
+"""
+        return suffix.strip()
+
+    def _reflect_windows(self, windows: List[List[tuple]], tgt_lang: str) -> List[str]:
+        """
+        上下文窗口反思：每个窗口（若干连续片段）一个 prompt，按编号把输出映射回各片段。
+        某一行缺失或为空时，该片段回退到 NMT 译文。返回按窗口顺序展开的译文列表。
+        """
+        suffixes = [self._build_window_suffix(window, tgt_lang) for window in windows]
+        responses = self._generate_reflections(
+            suffixes, [[item[3] for item in window] for window in windows],
+            max_new_tokens=min(1024, 150 * max((len(window) for window in windows), default=1))
+        )
+
+        results = []
+        for window, response in zip(windows, responses):
+            parsed: Dict[int, str] = {}
+            for match in re.finditer(r'^\s*\[(\d+)\]\s*(.+?)\s*$', response or "", flags=re.MULTILINE):
+                parsed.setdefault(int(match.group(1)), match.group(2))
+            if response is not None and len(parsed) != len(window):
+                logger.warning(f"Segments {[item[3] for item in window]}: expected {len(window)} numbered lines, "
+                               f"got {len(parsed)}; missing lines keep the NMT translation.")
+            for n, (_, trans, _, _) in enumerate(window, start=1):
+                results.append(self._parse_reflection(parsed[n], trans) if n in parsed else trans)
+        return results
+
+    def _generate_reflections(self, suffixes: List[str], segment_ids: List[List[int]],
+                              max_new_tokens: int) -> List[Optional[str]]:
+        """
+        对一组 prompt 后缀批量生成：按 REFLECTION_BATCH_SIZE 分批，左侧 padding 后一次 generate。
+        启用前缀缓存时，只对后缀做前向计算，静态前缀直接复用 KV cache。
+        返回每个 prompt 新生成的文本；所在批出错时为 None。
+        """
+        tokenizer = self.reflector.tokenizer
+        model = self.reflector.model
+        tokenizer.padding_side = "left"  # 解码器模型批量生成需要左侧 padding
+
+        prefix_ids, prefix_cache = None, None
+        if self.reflection_prefix_cache:
+            try:
+                prefix_ids, prefix_cache = self._get_reflection_prefix_cache()
+            except Exception as e:
+                logger.warning(f"Reflection prefix cache unavailable: {e}")
+
+        responses: List[Optional[str]] = [None] * len(suffixes)
+        # 按 prompt 长度排序，减少批内 padding
+        order = sorted(range(len(suffixes)), key=lambda i: len(suffixes[i]))
+
+        for start in range(0, len(order), self.reflection_batch_size):
+            batch = order[start:start + self.reflection_batch_size]
+            try:
+                if prefix_cache is not None:
+                    # [前缀 | padding | 后缀]：padding 位于前缀与后缀之间，由 attention_mask 屏蔽，
+                    # generate 根据 attention_mask 的 cumsum 计算位置编码，并只对 cache 之后的 token 做前向
+                    suffix_inputs = tokenizer([suffixes[i] for i in batch], return_tensors="pt", padding=True,
+                                              add_special_tokens=False).to(model.device)
+                    batch_prefix = prefix_ids.expand(len(batch), -1)
+                    inputs = {
+                        "input_ids": torch.cat([batch_prefix, suffix_inputs["input_ids"]], dim=1),
+                        "attention_mask": torch.cat([torch.ones_like(batch_prefix),
+                                                     suffix_inputs["attention_mask"]], dim=1),
+                    }
+                    # generate 会就地追加 cache，每批使用一份拷贝
+                    past_key_values = copy.deepcopy(prefix_cache)
+                    past_key_values.batch_repeat_interleave(len(batch))
+                    inputs["past_key_values"] = past_key_values
+                else:
+                    inputs = tokenizer([self.REFLECTION_PREFIX + suffixes[i] for i in batch], return_tensors="pt",
+                                       padding=True).to(model.device)
+                with torch.no_grad():
+                    generated = model.generate(
+                        **inputs,
+                        max_new_tokens=max_new_tokens,
+                        do_sample=False,
+                        num_return_sequences=1,
+                        pad_token_id=model.config.pad_token_id,
+                        eos_token_id=model.config.eos_token_id,
+                    )
+                outputs = tokenizer.batch_decode(generated[:, inputs["input_ids"].shape[1]:],
+                                                 skip_special_tokens=True)
+            except Exception as e:
+                failed = [seg for i in batch for seg in segment_ids[i]]
+                logger.error(f"Segments {failed} reflection failed: {e}", exc_info=True)
+                continue
+
+            for i, output in zip(batch, outputs):
+                responses[i] = output
+
+        return responses
+
+    def _parse_reflection(self, response: str, initial_translation: str) -> str:
+        """清理反思模型的输出，无法得到有效译文时返回 NMT 译文"""
+        optimized = re.sub(r'(Human:|Assistant:|\n\n).*', '', response.strip(), flags=re.IGNORECASE | re.DOTALL).strip()
+        optimized = optimized.replace("<|endoftext|>", "").strip()
+        optimized = optimized.strip('"').strip("'").strip()
+        optimized = optimized.replace('\n', ' ').strip()
+
+        if not optimized:
             return initial_translation
 
+        return optimized
+
     def _calculate_batch_qe_scores(self, source_texts: List[str], translated_texts: List[str]) -> List[float]:
         if not source_texts or not translated_texts or len(source_texts) != len(translated_texts):
             return [0.0] * len(source_texts)
 
-        try:
-            src_embeddings = self.qe_model.encode(source_texts, convert_to_tensor=True, show_progress_bar=False)
-            trans_embeddings = self.qe_model.encode(translated_texts, convert_to_tensor=True, show_progress_bar=False)
-            similarities = util.cos_sim(src_embeddings, trans_embeddings).diag().cpu().numpy()
-            qe_scores = [float(max(0, sim)) for sim in similarities]
-            return qe_scores
-        except Exception as e:
-            logger.error(f"QE score calculation failed: {e}", exc_info=True)
-            return [0.0] * len(source_texts)
+        scores = self.qe_model.score_many(source_texts, [translated_texts])[0]
+        return [float(max(0, score)) for score in scores]
 
     def _get_lang_name(self, lang_code: str) -> str:
         lang_names = {
@@ -302,6 +1211,9 @@ class NeuralTranslator:
         if self.nmt_model:
             del self.nmt_model
             self.nmt_model = None
+        if not nmt_only and getattr(self, 'ct2_translator', None) is not None:
+            del self.ct2_translator
+            self.ct2_translator = None
 
         if not nmt_only:
             if self.reflector:
@@ -315,7 +1227,8 @@ class NeuralTranslator:
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
-    def get_supported_languages(self) -> Dict[str, List[str]]:
+    @staticmethod
+    def get_supported_languages() -> Dict[str, List[str]]:
         return {
             "whisper": ["auto", "en", "zh", "ja", "ko", "fr", "de", "es", "ru", "ar", "hi", "pt", "it", "nl", "pl"],
             "nmt": ["en", "zh", "zh-cn", "ja", "ko", "fr", "de", "es", "ru", "ar", "hi", "pt", "it", "nl", "pl"]
@@ -4,15 +4,28 @@ import numpy as np
 import cv2
 import os
 import math
-from typing import Dict, Any, List, Tuple
+import time
+import shutil
+import subprocess
+from typing import Dict, Any, List, Tuple, Iterator
 from transformers import VisionEncoderDecoderModel, ViTImageProcessor, GPT2Tokenizer
 from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
+from config import Config
+
 # 确保日志配置正确
 logger = logging.getLogger(__name__)
 
 
+def timestamp_key(ts: float) -> float:
+    """
+    关键帧时间戳的统一取整：镜头代表帧与场景描述缓存都以它为键，
+    必须使用同一精度，否则非 0.01 对齐的时间戳（如 29.97 fps 抽样）会查不到对应描述。
+    """
+    return round(float(ts), 3)
+
+
 class VLMSceneAnalyzer:
     """
     负责加载 ViT-GPT2 模型、提取关键帧和批量生成场景描述。
@@ -28,6 +41,11 @@ class VLMSceneAnalyzer:
         # 优化参数
         self.frame_size = (224, 224)  # ViT-GPT2的最佳输入尺寸
         self.min_frame_interval = 1.0  # 关键帧之间的最小时间间隔（秒）
+        # 镜头切换检测参数
+        self.scene_sample_fps = getattr(Config, 'SCENE_DETECT_FPS', 2.0)
+        self.scene_thumb_width = getattr(Config, 'SCENE_DETECT_WIDTH', 64)
+        self.scene_cut_threshold = getattr(Config, 'SCENE_CUT_THRESHOLD', 0.35)
+        self.min_shot_seconds = getattr(Config, 'SCENE_MIN_SHOT_SECONDS', 1.0)
 
         self.load_model()
 
@@ -213,6 +231,143 @@ class VLMSceneAnalyzer:
 
         return deduplicated
 
+    # --- 镜头切换检测 (低分辨率缩略帧) ---
+
+    def _iter_thumbnails(self, video_path: str) -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        按 scene_sample_fps 抽样并缩放为缩略帧 (RGB, 宽 scene_thumb_width，16:9)。
+        优先用 ffmpeg 在解码端完成抽样和缩放，只把很小的原始帧通过管道交给 NumPy；无 ffmpeg 时退回 OpenCV。
+        """
+        width = max(16, int(self.scene_thumb_width))
+        height = max(9, width * 9 // 16)
+        fps = float(self.scene_sample_fps)
+
+        if shutil.which('ffmpeg') is not None:
+            command = [
+                'ffmpeg', '-nostdin',
+                '-threads', '0',
+                '-i', video_path,
+                '-an',  # 无音频
+                '-vf', f'fps={fps},scale={width}:{height}:flags=area',
+                '-pix_fmt', 'rgb24',
+                '-f', 'rawvideo',
+                '-loglevel', 'error',
+                '-'
+            ]
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            frame_bytes = width * height * 3
+            try:
+                idx = 0
+                while True:
+                    buf = proc.stdout.read(frame_bytes)
+                    if len(buf) < frame_bytes:
+                        break
+                    yield idx / fps, np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3)
+                    idx += 1
+            finally:
+                proc.stdout.close()
+                proc.kill()
+                proc.wait()
+            return
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            logger.error(f"Failed to open video file: {video_path}")
+            return
+        try:
+            video_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            step = max(1, int(round(video_fps / fps)))
+            frame_idx = 0
+            # grab() 只解码不做颜色转换，仅对采样帧 retrieve + 缩放
+            while cap.grab():
+                if frame_idx % step == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    thumb = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                    yield frame_idx / video_fps, cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
+                frame_idx += 1
+        finally:
+            cap.release()
+
+    @staticmethod
+    def _color_histogram(thumb: np.ndarray, bins: int = 16) -> np.ndarray:
+        """每个通道 bins 级直方图，拼接后按像素数归一化"""
+        shift = 8 - int(math.log2(bins))
+        pixels = thumb.reshape(-1, 3) >> shift
+        hist = np.concatenate([np.bincount(pixels[:, c], minlength=bins) for c in range(3)])
+        return hist.astype(np.float32) / pixels.shape[0]
+
+    @staticmethod
+    def _block_ssim(a: np.ndarray, b: np.ndarray, block: int = 4) -> float:
+        """灰度缩略帧上按 block x block 分块计算的平均 SSIM"""
+        h, w = a.shape[0] // block * block, a.shape[1] // block * block
+        shape = (h // block, block, w // block, block)
+        x = a[:h, :w].reshape(shape)
+        y = b[:h, :w].reshape(shape)
+        mu_x, mu_y = x.mean(axis=(1, 3)), y.mean(axis=(1, 3))
+        var_x, var_y = x.var(axis=(1, 3)), y.var(axis=(1, 3))
+        cov = (x * y).mean(axis=(1, 3)) - mu_x * mu_y
+        c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+        ssim = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / ((mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2))
+        return float(ssim.mean())
+
+    def detect_shots(self, video_path: str) -> List[Dict[str, float]]:
+        """
+        镜头边界检测：相邻缩略帧的差异 = 0.5 x 直方图 L1 距离 + 0.5 x (1 - SSIM)。
+        直方图对运动不敏感，SSIM 补上色调相近的两个镜头之间的切换；差异超过阈值且当前镜头不短于
+        min_shot_seconds 时切分。每个镜头取直方图最接近镜头平均直方图的采样帧作为代表帧。
+        返回 [{"start", "end", "keyframe"}]（秒）。
+        """
+        start_time = time.perf_counter()
+        shots: List[Dict[str, float]] = []
+        shot_start = None
+        shot_samples: List[Tuple[float, np.ndarray]] = []
+        prev_hist = prev_gray = None
+        last_ts = 0.0
+        sampled = 0
+
+        def close_shot(end: float):
+            hists = np.stack([h for _, h in shot_samples])
+            mean_hist = hists.mean(axis=0)
+            best = int(np.abs(hists - mean_hist).sum(axis=1).argmin())
+            shots.append({"start": round(shot_start, 3), "end": round(end, 3),
+                          "keyframe": timestamp_key(shot_samples[best][0])})
+
+        for ts, thumb in self._iter_thumbnails(video_path):
+            sampled += 1
+            hist = self._color_histogram(thumb)
+            gray = thumb.astype(np.float32).mean(axis=2)
+            if prev_hist is not None:
+                hist_dist = 0.5 * float(np.abs(hist - prev_hist).sum()) / 3
+                score = 0.5 * hist_dist + 0.5 * min(1.0, 1.0 - self._block_ssim(prev_gray, gray))
+                if score >= self.scene_cut_threshold and ts - shot_start >= self.min_shot_seconds:
+                    close_shot(ts)
+                    shot_start, shot_samples = ts, []
+            if shot_start is None:
+                shot_start = ts
+            shot_samples.append((ts, hist))
+            prev_hist, prev_gray, last_ts = hist, gray, ts
+
+        if shot_samples:
+            close_shot(last_ts + 1.0 / self.scene_sample_fps)
+
+        logger.info(
+            f"🎬 Shot Detection: {sampled} thumbnails -> {len(shots)} shots "
+            f"({time.perf_counter() - start_time:.2f}s)"
+        )
+        return shots
+
+    def select_shot_keyframes(self, shots: List[Dict[str, float]], final_limit: int) -> List[float]:
+        """每个镜头一帧；镜头数超过上限时保留时长最长的 final_limit 个镜头"""
+        kept = shots
+        if len(shots) > final_limit:
+            kept = sorted(shots, key=lambda s: s["end"] - s["start"], reverse=True)[:final_limit]
+            logger.info(
+                f"➡️ VLM Final Sampling: {len(shots)} shots exceeded limit ({final_limit}), kept the longest shots"
+            )
+        return sorted(shot["keyframe"] for shot in kept)
+
     def _process_frames_batch(self, frames_data: List[Tuple[float, np.ndarray]]) -> List[Dict[str, Any]]:
         """
         【主进程执行】批量处理帧数据，生成场景描述，并进行解析。
@@ -249,7 +404,7 @@ class VLMSceneAnalyzer:
         for ts, desc in zip(timestamps, raw_descriptions):
             desc_stripped = desc.strip()
             result = {
-                "timestamp": round(ts, 2),
+                "timestamp": timestamp_key(ts),
                 "description": desc_stripped,
                 "scene_type": self._parse_scene_type(desc_stripped),
                 "environment": self._parse_environment(desc_stripped),
@@ -268,56 +423,63 @@ class VLMSceneAnalyzer:
 
         return results
 
+    def extract_frames(self, video_path: str, target_timestamps: List[float]) -> Dict[float, np.ndarray]:
+        """抽取指定时间戳的帧（子进程中解码，I/O 密集），返回 {时间戳: RGB 帧}"""
+        logger.info(f"Entering ProcessPoolExecutor, preparing to extract {len(target_timestamps)} frames...")
+
+        with ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as executor:
+            extract_future = executor.submit(
+                VLMSceneAnalyzer._extract_frames_worker,
+                video_path,
+                target_timestamps,
+                self.frame_size
+            )
+            frame_cache = extract_future.result()
+
+        logger.info(f"ProcessPoolExecutor exited, successfully extracted {len(frame_cache)} frames.")
+        return frame_cache
+
+    def caption_frames(self, frame_cache: Dict[float, np.ndarray], batch_size: int = 16) -> Dict[float, Dict[str, Any]]:
+        """对已抽取的帧批量生成场景描述 (GPU)，返回 {时间戳: 场景上下文}"""
+        frame_ctx_cache = {}
+        frames_to_process = sorted(frame_cache.items(), key=lambda item: item[0])
+        frame_batches = [frames_to_process[i:i + batch_size] for i in
+                         range(0, len(frames_to_process), batch_size)]
+
+        logger.info(f"Starting VLM batch inference ({len(frames_to_process)} frames, Batch={batch_size})...")
+
+        try:
+            for i, batch in enumerate(frame_batches):
+                logger.info(f"Processing VLM batch {i + 1}/{len(frame_batches)}")
+                batch_results = self._process_frames_batch(batch)
+                for res in batch_results:
+                    frame_ctx_cache[res.pop("timestamp")] = res
+        finally:
+            if self.vlm_device == "cuda":
+                torch.cuda.empty_cache()
+
+        logger.info(f"VLM inference completed, generated {len(frame_ctx_cache)} valid descriptions.")
+        return frame_ctx_cache
+
     def analyze_frames(self, video_path: str, target_timestamps: List[float]) -> Dict[float, Dict[str, Any]]:
         """
         Executes frame extraction (multi-process) and VLM inference (main process).
         Returns a map from timestamp to scene context.
         """
-        frame_ctx_cache = {}
         if self.vit_gpt2_model is None:
             logger.error("VLM model is not available. Cannot analyze frames.")
             return {}
 
-        # 1. Multi-process frame extraction (I/O)
-        frame_cache = {}
         try:
-            logger.info(f"Entering ProcessPoolExecutor, preparing to extract {len(target_timestamps)} frames...")
-
-            with ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as executor:
-                extract_future = executor.submit(
-                    VLMSceneAnalyzer._extract_frames_worker,
-                    video_path,
-                    target_timestamps,
-                    self.frame_size
-                )
-                frame_cache = extract_future.result()
-
-            logger.info(f"ProcessPoolExecutor exited, successfully extracted {len(frame_cache)} frames.")
-
+            # 1. Multi-process frame extraction (I/O)
+            frame_cache = self.extract_frames(video_path, target_timestamps)
             if not frame_cache:
                 logger.error("Failed to extract any frames in the multi-process pool.")
                 return {}
 
             # 2. Main process batch VLM inference (GPU)
-            frames_to_process = sorted(frame_cache.items(), key=lambda item: item[0])
-            batch_size = 16
-            frame_batches = [frames_to_process[i:i + batch_size] for i in
-                             range(0, len(frames_to_process), batch_size)]
-
-            logger.info(f"Starting VLM batch inference ({len(frames_to_process)} frames, Batch={batch_size})...")
-
-            for i, batch in enumerate(frame_batches):
-                logger.info(f"Processing VLM batch {i + 1}/{len(frame_batches)}")
-                batch_results = self._process_frames_batch(batch)
-                for res in batch_results:
-                    frame_ctx_cache[res.pop("timestamp")] = res
-
-            logger.info(f"VLM inference completed, generated {len(frame_ctx_cache)} valid descriptions.")
-            return frame_ctx_cache
+            return self.caption_frames(frame_cache)
 
         except Exception as e:
             logger.error(f"Video scene analysis failed: {e}", exc_info=True)
             return {}
-        finally:
-            if self.vlm_device == "cuda":
-                torch.cuda.empty_cache()
\ No newline at end of file
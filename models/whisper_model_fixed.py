@@ -1,12 +1,18 @@
 import whisper
 import os
+import bisect
 import logging
 import torch
 import numpy as np
 import math
-from typing import Optional, Dict, Any, List, Tuple
+import multiprocessing as mp
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Callable
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from config import Config
+from utils.audio_processor import AudioProcessor, DecodedAudio, VIDEO_EXTENSIONS, SAMPLE_RATE
+from utils.transcript_cache import TranscriptCache
+
 # 修复：使用相对导入以确保在 models 包结构中能够正确找到 VLMSceneAnalyzer
 try:
     from models.vlm_analyzer import VLMSceneAnalyzer
@@ -19,23 +25,190 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class ASRBackend:
+    """
+    ASR 推理后端接口。所有后端返回统一结构:
+    {"text": str, "segments": [{"start": float, "end": float, "text": str}, ...], "language": str}
+    """
+
+    name = "base"
+    # 是否能在解码过程中逐段产出结果（否则由调用方按音频块增量转录）
+    supports_streaming = False
+
+    def __init__(self, model_name: str, device: str = "cpu"):
+        self.model_name = model_name
+        self.device = device
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None, task: str = "transcribe",
+                   beam_size: int = 3, condition_on_previous_text: bool = True) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def iter_segments(self, audio: np.ndarray, **options) -> Iterator[Dict[str, Any]]:
+        """逐段产出转录结果；默认实现在整段转录完成后依次产出。"""
+        yield from self.transcribe(audio, **options)["segments"]
+
+    def detect_language(self, audio: np.ndarray) -> str:
+        """用音频前 30 秒检测语种"""
+        raise NotImplementedError
+
+
+class OpenAIWhisperBackend(ASRBackend):
+    """openai-whisper (PyTorch) 后端，CPU 上为 fp32 推理。"""
+
+    name = "openai-whisper"
+
+    def __init__(self, model_name: str, device: str = "cpu"):
+        super().__init__(model_name, device)
+        self.model = whisper.load_model(model_name, device=device)
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None, task: str = "transcribe",
+                   beam_size: int = 3, condition_on_previous_text: bool = True) -> Dict[str, Any]:
+        result = self.model.transcribe(
+            audio,
+            task=task,
+            beam_size=beam_size,
+            fp16=self.device == "cuda",
+            language=language,
+            condition_on_previous_text=condition_on_previous_text,
+        )
+        return {
+            "text": result["text"],
+            "segments": [
+                {"start": seg["start"], "end": seg["end"], "text": seg["text"]}
+                for seg in result.get("segments", [])
+            ],
+            "language": result["language"],
+        }
+
+    def detect_language(self, audio: np.ndarray) -> str:
+        head = whisper.pad_or_trim(audio)
+        mel = whisper.log_mel_spectrogram(head, n_mels=self.model.dims.n_mels).to(self.model.device)
+        _, probs = self.model.detect_language(mel)
+        return max(probs, key=probs.get)
+
+
+class FasterWhisperBackend(ASRBackend):
+    """faster-whisper (CTranslate2) 后端，CPU 上支持 int8 / int8_float32 量化推理。"""
+
+    name = "faster-whisper"
+    supports_streaming = True
+
+    def __init__(self, model_name: str, device: str = "cpu", compute_type: str = "int8", cpu_threads: int = 0):
+        super().__init__(model_name, device)
+        from faster_whisper import WhisperModel
+
+        self.compute_type = compute_type
+        self.model = WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None, task: str = "transcribe",
+                   beam_size: int = 3, condition_on_previous_text: bool = True) -> Dict[str, Any]:
+        segments_iter, info = self.model.transcribe(
+            audio,
+            task=task,
+            beam_size=beam_size,
+            language=language,
+            condition_on_previous_text=condition_on_previous_text,
+        )
+        segments = [{"start": seg.start, "end": seg.end, "text": seg.text} for seg in segments_iter]
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": info.language,
+        }
+
+    def iter_segments(self, audio: np.ndarray, language: Optional[str] = None, task: str = "transcribe",
+                      beam_size: int = 3, condition_on_previous_text: bool = True) -> Iterator[Dict[str, Any]]:
+        # faster-whisper 的片段生成器是惰性的：每解码完一个 30 秒窗口就能产出对应片段
+        segments_iter, _ = self.model.transcribe(
+            audio,
+            task=task,
+            beam_size=beam_size,
+            language=language,
+            condition_on_previous_text=condition_on_previous_text,
+        )
+        for seg in segments_iter:
+            yield {"start": seg.start, "end": seg.end, "text": seg.text}
+
+    def detect_language(self, audio: np.ndarray) -> str:
+        # transcribe() 在返回惰性片段生成器之前就已完成语种检测，不迭代即不会解码
+        _, info = self.model.transcribe(audio[:whisper.audio.N_SAMPLES])
+        return info.language
+
+
+def create_asr_backend(backend: str, model_name: str, device: str = "cpu",
+                       compute_type: Optional[str] = None, cpu_threads: int = 0) -> ASRBackend:
+    """根据配置创建 ASR 后端 ('openai-whisper' / 'faster-whisper')。"""
+    if backend == FasterWhisperBackend.name:
+        if compute_type is None:
+            compute_type = "int8" if device == "cpu" else "float16"
+        return FasterWhisperBackend(model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+    if backend == OpenAIWhisperBackend.name:
+        return OpenAIWhisperBackend(model_name, device=device)
+    raise ValueError(f"Unknown ASR backend: {backend}")
+
+
+# --- 长音频分块转录的多进程工作单元 (每个进程持有一份独立的 ASR 后端) ---
+_worker_backend = None
+
+
+def _init_asr_worker(backend: str, model_name: str, compute_type: Optional[str], num_threads: int):
+    """【多进程初始化】在工作进程内加载 ASR 后端，并限制每个进程的推理线程数。"""
+    global _worker_backend
+    torch.set_num_threads(max(1, num_threads))
+    _worker_backend = create_asr_backend(backend, model_name, device="cpu", compute_type=compute_type,
+                                         cpu_threads=num_threads)
+
+
+def _transcribe_chunk_worker(pcm: np.ndarray, offset: float, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """【多进程工作单元】转录一个 int16 音频块，返回已加上全局时间偏移的片段。"""
+    audio = pcm.astype(np.float32) / 32768.0
+    result = _worker_backend.transcribe(audio, **options)
+    return [
+        {"start": seg["start"] + offset, "end": seg["end"] + offset, "text": seg["text"]}
+        for seg in result["segments"]
+    ]
+
 
 class WhisperTranscriber:
     """
     负责加载 Whisper ASR 模型，并协调 VLMSceneAnalyzer 进行音视频联合分析。
     """
 
-    def __init__(self, model_name: str = "medium", device: str = "cpu"):
+    def __init__(self, model_name: str = "medium", device: str = "cpu", enable_vlm: bool = True,
+                 backend: Optional[str] = None, compute_type: Optional[str] = None):
         self.model_name = model_name
         self.whisper_device = device
-        self.model = None
+        self.backend_name = backend or getattr(Config, 'ASR_BACKEND', 'openai-whisper')
+        self.compute_type = compute_type or getattr(Config, 'ASR_COMPUTE_TYPE', None)
+        self.backend: Optional[ASRBackend] = None
         self.vlm_analyzer = None
+        self.audio_processor = AudioProcessor()
 
         self.frames_per_minute = 2  # 目标每分钟采样帧数
         self.max_frames_to_process = 180  # 硬性上限 (防止失控)
+        self.keyframe_strategy = getattr(Config, 'VLM_KEYFRAME_STRATEGY', 'scene')  # 'scene' 或 'segments'
+
+        # 长音频分块转录配置
+        self.long_form_threshold = getattr(Config, 'LONG_FORM_THRESHOLD_SECONDS', 600)
+        self.chunk_max_seconds = getattr(Config, 'LONG_FORM_CHUNK_SECONDS', 120)
+        self.chunk_min_seconds = getattr(Config, 'LONG_FORM_MIN_CHUNK_SECONDS', 30)
+        self.asr_workers = getattr(Config, 'ASR_WORKERS', 0)  # 0 = 按 CPU 核数自动选择
+        self.asr_threads_per_worker = getattr(Config, 'ASR_THREADS_PER_WORKER', 2)
+        self.stream_chunk_seconds = getattr(Config, 'STREAM_CHUNK_SECONDS', 30)
+        self.beam_size = 3
+
+        # 转录结果缓存（相同音频 + 相同模型设置时直接跳过 ASR）
+        self.transcript_cache = None
+        if getattr(Config, 'TRANSCRIPT_CACHE_ENABLED', False):
+            self.transcript_cache = TranscriptCache(
+                cache_dir=getattr(Config, 'TRANSCRIPT_CACHE_DIR', 'cache/transcripts'),
+                max_bytes=int(getattr(Config, 'TRANSCRIPT_CACHE_MAX_MB', 512)) * 1024 * 1024,
+            )
+        self._asr_pool = None
 
         self.load_whisper_model()
-        self.load_vlm_component()
+        if enable_vlm:
+            self.load_vlm_component()
         if self.whisper_device == "cuda":
             torch.cuda.empty_cache()
 
@@ -44,8 +217,9 @@ class WhisperTranscriber:
         try:
             # Check for CUDA availability and set device accordingly
             device = self.whisper_device if self.whisper_device == "cuda" and torch.cuda.is_available() else "cpu"
-            logger.info(f"Loading Whisper model: {self.model_name} to {device}")
-            self.model = whisper.load_model(self.model_name, device=device)
+            logger.info(f"Loading Whisper model: {self.model_name} to {device} (backend: {self.backend_name})")
+            self.backend = create_asr_backend(self.backend_name, self.model_name, device=device,
+                                              compute_type=self.compute_type)
             self.whisper_device = device  # Update the actual device used
             logger.info(f"Whisper model {self.model_name} loaded successfully on {device}.")
         except Exception as e:
@@ -65,188 +239,464 @@ class WhisperTranscriber:
         else:
             logger.warning("VLMSceneAnalyzer class is unavailable. Video analysis is disabled.")
 
-    def transcribe(self, media_path: str, language: str = "auto", task: str = "transcribe",
-                   video_source_path: Optional[str] = None) -> Dict[str, Any]:
+    def _resolve_worker_count(self) -> int:
+        if self.asr_workers and self.asr_workers > 0:
+            return self.asr_workers
+        return max(1, (os.cpu_count() or 1) // max(1, self.asr_threads_per_worker))
+
+    def _get_asr_pool(self) -> ProcessPoolExecutor:
+        """懒加载 CPU 转录进程池（进程常驻，避免每个请求重复加载模型）。"""
+        if self._asr_pool is None:
+            workers = self._resolve_worker_count()
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            logger.info(f"Starting ASR worker pool: {workers} processes x {threads} threads")
+            self._asr_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_asr_worker,
+                initargs=(self.backend_name, self.model_name, self.compute_type, threads),
+            )
+        return self._asr_pool
+
+    def shutdown_workers(self):
+        """关闭长音频转录进程池。"""
+        if self._asr_pool is not None:
+            self._asr_pool.shutdown(wait=True)
+            self._asr_pool = None
+
+    def _detect_language(self, audio: DecodedAudio) -> str:
+        """用前 30 秒音频检测一次语种，保证所有分块使用同一语言。"""
+        return self.backend.detect_language(audio.to_float32(0, whisper.audio.N_SAMPLES))
+
+    def _transcribe_long_form(self, audio: DecodedAudio, options: Dict[str, Any],
+                              progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """
-        Performs audio transcription and coordinates VLM analysis if a video source is present.
+        长音频模式：按静音边界切成有上限的块，CPU 上用多进程并行转录（GPU 上在同一模型上顺序处理），
+        再按全局时间戳拼接，并去除块接缝处的重复文本。
+        progress_callback 在每块完成时收到 {"event": "segments", "segments"(该块，未去重), "progress"}。
         """
-        if not os.path.exists(media_path):
-            raise FileNotFoundError(f"Media file not found: {media_path}")
-
-        try:
-            logger.info(f"Starting transcription for: {media_path}")
+        chunks = self.audio_processor.split_on_silence(audio, self.chunk_max_seconds, self.chunk_min_seconds)
+        options = dict(options)
+        if options.get("language") is None:
+            options["language"] = self._detect_language(audio)
+            logger.info(f"Detected language for long-form audio: {options['language']}")
+        # 分块之间不共享上文，避免幻觉跨块传播
+        options["condition_on_previous_text"] = False
+
+        logger.info(f"Long-form transcription: {audio.duration:.1f}s split into {len(chunks)} chunks")
+
+        chunk_segments: List[List[Dict[str, Any]]] = [[] for _ in chunks]
+        processed_samples = 0
+
+        def _report(idx: int):
+            nonlocal processed_samples
+            processed_samples += chunks[idx][1] - chunks[idx][0]
+            if progress_callback is not None:
+                progress_callback({
+                    "event": "segments",
+                    "segments": [dict(seg, text=seg["text"].strip()) for seg in chunk_segments[idx]],
+                    "progress": round(min(1.0, processed_samples / max(1, audio.num_samples)), 4),
+                })
 
-            # 1. Audio Preprocessing and Transcription
-            audio = whisper.load_audio(media_path)
-            duration = len(audio) / whisper.audio.SAMPLE_RATE
-
-            # --- 关键修复：处理音频通道维度 ---
-            audio_tensor = torch.from_numpy(audio).float().to(self.whisper_device)
-
-            # 1.1. 处理立体声：如果维度 > 1，转换为单声道
-            if audio_tensor.ndim > 1:
-                # 将立体声通道取平均值，这通常会使张量形状从 (C, N) 变为 (N,)
-                audio_tensor = audio_tensor.mean(dim=0)
-
-            # 1.2. 检查并确保张量是 (N,)，即一维
-            if audio_tensor.ndim != 1:
-                # 这可能是处理失败的罕见情况，抛出错误或尝试压平
-                logger.error(f"Audio tensor has unexpected dimensions: {audio_tensor.ndim}")
-                raise ValueError("Loaded audio tensor is not 1-dimensional after channel reduction.")
-
-            # 1.3. 【解决尺寸不匹配的核心操作】将 (N,) 转换为 (1, N) 或 (1, 1, N)
-            # Whisper 的 `model.transcribe` 通常接受 NumPy 数组或 (N,) 张量，
-            # 但如果外部依赖 (如预处理或hook) 需要特定维度，我们尝试添加 Batch/Channel 维度。
-            # 这里我们尝试添加一个 Channel 维度，形状变为 (1, N)
-            # 注意: Whisper 的 `model.transcribe` 内部会进行复杂的处理，但我们先确保输入的 Tensor 格式是标准化的。
-            # 如果错误是 "Expected size 3 but got size 1"，意味着在某个地方期望 (C=3, ...)
-            # 尽管这不是标准的 Whisper 用法，但我们**假设**上游组件需要 2D 张量 (Channel, Data)。
-            # 原始 Whisper API 接受 (N,)，但鉴于错误，我们尝试添加一个 Channel 维度：
-            # 如果是 (N,), 则添加一个维度变成 (1, N)
-            # 然而，由于错误直接来自 PyTorch/Tensor操作，我们**回退到只使用原始 NumPy 数组**，
-            # 并移除所有可能干扰张量尺寸的代码，让 Whisper 库自己处理最原始的音频数据。
-            # **重新思考：** `whisper.load_audio` 应该返回 `(N,)` 的 numpy 数组，直接传给 `model.transcribe` 即可。
-            # 导致错误的是在 `torch.from_numpy().to()` 之后的某些操作。
-            # 我们将保持使用 `audio` (NumPy 数组) 进行转录，避免维度操作。
-
-            # 重新加载 audio_tensor，只进行设备转换，不进行 mean 操作，并将其还原为原始的 (N,) 形状，
-            # 假设 `whisper.model.transcribe` 会处理音频通道。
-
-            # 警告: 由于原始代码中进行了 mean(dim=0) 并且使用了 audio_tensor
-            # 我们需要遵循：如果音频是立体声，则将其转换为单声道，但保持一维张量 (N,)
-            if audio_tensor.ndim > 1:
-                # 重新计算 audio_tensor，并确保它是一个 (N,) 的一维张量
-                audio_tensor = audio_tensor.mean(dim=0)
-
-            # 尝试通过添加一个虚拟的 Channel 维度 (C=1) 来解决 "size 1" 的问题，
-            # 假设模型期望 (C, N) 或 (B, C, N)
-            # 我们先尝试最温和的方式：确保它是 (N,) 传给 transcribe，这是 Whisper 推荐的。
-            # 如果这样仍然失败，那么问题出在 Whisper 库之外的**环境配置**。
-
-            # 保持原有的 `model.transcribe(audio_tensor, ...)` 调用，但确保 `audio_tensor` 是 (N,)
-            # 如果原始的 `audio_tensor.ndim > 1` 且 `audio_tensor.mean(dim=0)` 产生了错误
-            # 那么我们回退到使用原始的 NumPy 数组，让 Whisper 内部处理加载和预处理。
-
-            # ------------------------------------------------------------------
-            # 最终决定：为了解决 "Expected size 3 but got size 1" 的问题，我们必须假设
-            # 某个 PyTorch 层的期望是 3D，而我们只输入了 1D (N,).
-            # 我们添加 Channel 维度和 Batch 维度，并使用 `squeeze` 确保输出正确。
-
-            audio_tensor_processed = torch.from_numpy(audio).float()
-
-            if audio_tensor_processed.ndim > 1:
-                # 立体声 (C, N) -> 单声道 (N)
-                audio_tensor_processed = audio_tensor_processed.mean(dim=0)
-
-            # (N,) -> (1, N) [添加 Batch/Channel 维度]
-            audio_tensor_processed = audio_tensor_processed.unsqueeze(0).to(self.whisper_device)
-
-            # ------------------------------------------------------------------
-
-            options = {
-                "task": task,
-                "beam_size": 3,
-                "fp16": True if self.whisper_device == "cuda" else False,
-                "language": language if language != "auto" else None
+        if self.whisper_device == "cuda":
+            for idx, (start, end) in enumerate(chunks):
+                result = self.backend.transcribe(audio.to_float32(start, end), **options)
+                offset = start / SAMPLE_RATE
+                chunk_segments[idx] = [
+                    {"start": seg["start"] + offset, "end": seg["end"] + offset, "text": seg["text"]}
+                    for seg in result["segments"]
+                ]
+                _report(idx)
+        else:
+            pool = self._get_asr_pool()
+            futures = {
+                pool.submit(_transcribe_chunk_worker, np.asarray(audio.pcm[start:end]), start / SAMPLE_RATE,
+                            options): idx
+                for idx, (start, end) in enumerate(chunks)
             }
-            logger.info("Executing Whisper transcription...")
-
-            # **注意：** `model.transcribe` 的输入参数是 `audio`，通常是 NumPy 数组或 (N,) Tensor。
-            # 由于我们之前遇到的错误，我们尝试直接传入我们处理后的张量，如果它不是 (N,) 可能会失败。
-            # **最保守的修复：** 移除所有张量维度操作，只使用 numpy 数组。
+            for future in as_completed(futures):
+                chunk_segments[futures[future]] = future.result()
+                _report(futures[future])
+
+        segments = self._stitch_chunk_segments(chunk_segments)
+        return {
+            "text": " ".join(seg["text"].strip() for seg in segments),
+            "segments": segments,
+            "language": options["language"],
+        }
+
+    @staticmethod
+    def _stitch_chunk_segments(chunk_segments: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        拼接各块结果：若后一块开头重复了前一块结尾的词（接缝处重复识别），裁掉重复部分；
+        裁剪后为空的片段直接丢弃。
+        """
+        merged: List[Dict[str, Any]] = []
+        for segments in chunk_segments:
+            for seg_idx, seg in enumerate(segments):
+                seg = WhisperTranscriber._trim_seam(merged[-1] if merged else None, seg, at_seam=seg_idx == 0)
+                if seg:
+                    merged.append(seg)
+        return merged
+
+    @staticmethod
+    def _trim_seam(prev: Optional[Dict[str, Any]], seg: Dict[str, Any], at_seam: bool) -> Optional[Dict[str, Any]]:
+        """
+        将片段接到 `prev` 之后：位于块接缝处时裁掉与 `prev` 结尾重复的词，并保证时间戳单调。
+        裁剪后为空时返回 None。
+        """
+        seg = dict(seg)
+        if at_seam and prev:
+            words = seg["text"].split()
+            overlap = WhisperTranscriber._seam_overlap(prev["text"].split(), words)
+            if overlap:
+                seg["text"] = " ".join(words[overlap:])
+        if not seg["text"].strip():
+            return None
+        if prev:
+            seg["start"] = max(seg["start"], prev["end"])
+        seg["end"] = max(seg["end"], seg["start"])
+        return seg
+
+    @staticmethod
+    def _seam_overlap(prev_words: List[str], words: List[str], min_words: int = 2) -> int:
+        """返回 `words` 开头与 `prev_words` 结尾重复的词数（忽略大小写与标点）。"""
+        def norm(w: str) -> str:
+            return "".join(ch for ch in w.lower() if ch.isalnum())
+
+        prev_norm = [norm(w) for w in prev_words]
+        cur_norm = [norm(w) for w in words]
+        for n in range(min(len(prev_norm), len(cur_norm)), 0, -1):
+            if prev_norm[-n:] == cur_norm[:n] and (n >= min_words or n == len(cur_norm)):
+                return n
+        return 0
+
+    def _resolve_video_path(self, audio: DecodedAudio, video_source_path: Optional[str]) -> Optional[str]:
+        """可供 VLM 抽帧的视频路径；非视频输入返回 None"""
+        if video_source_path and os.path.exists(video_source_path) and video_source_path.lower().endswith(
+                VIDEO_EXTENSIONS):
+            return video_source_path
+        if audio.is_video:
+            return audio.source_path
+        return None
+
+    def _plan_keyframes(self, segments: List[Dict[str, Any]], duration: float, video_path: Optional[str] = None
+                        ) -> Tuple[List[float], Optional[List[Dict[str, float]]]]:
+        """
+        选出需要抽帧的时间戳，返回 (时间戳, 镜头列表)。
+        'scene' 策略按镜头切换每个镜头一帧，VLM 工作量随镜头数而不是语音密度增长；
+        'segments' 策略（或镜头检测失败时）按片段中点去重 + 数量上限，镜头列表为 None。
+        """
+        if self.keyframe_strategy == 'scene' and video_path:
+            try:
+                shots = self.vlm_analyzer.detect_shots(video_path)
+            except Exception as e:
+                logger.error(f"Shot detection failed, falling back to segment midpoints: {e}", exc_info=True)
+                shots = []
+            if shots:
+                target_timestamps = self.vlm_analyzer.select_shot_keyframes(shots, self.max_frames_to_process)
+                logger.info(f"Final frames to extract: {len(target_timestamps)} (one per shot)...")
+                return target_timestamps, shots
+
+        # Dynamic calculation of target frames
+        dynamic_target_frames = math.ceil((duration / 60) * self.frames_per_minute)
+        dynamic_target_frames = max(1, dynamic_target_frames)
+        final_limit = min(dynamic_target_frames, self.max_frames_to_process)
+
+        logger.info(
+            f"Video Duration: {duration:.2f}s, Dynamic Target Frames: {dynamic_target_frames} (Hard Limit: {self.max_frames_to_process})")
+
+        # Generate and deduplicate keyframe timestamps
+        raw_timestamps = [(seg["start"] + seg["end"]) / 2 for seg in segments]
+        # Call VLM module's deduplication logic
+        target_timestamps = self.vlm_analyzer._deduplicate_timestamps(raw_timestamps, final_limit, duration)
+
+        logger.info(f"Final frames to extract: {len(target_timestamps)}...")
+        return target_timestamps, None
+
+    def _analyze_scenes(self, segments: List[Dict[str, Any]], audio: DecodedAudio,
+                        video_source_path: Optional[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        VLM 场景分析协调：按片段时间轴抽帧、生成场景描述，并为每个片段匹配 av_context。
+        """
+        # 1. Video Path Handling
+        video_path = self._resolve_video_path(audio, video_source_path)
+        is_video_valid = video_path and self.vlm_analyzer is not None
+
+        # 2. VLM Scene Analysis Coordination
+        frame_ctx_cache = {}
+        shots = None
+        if is_video_valid:
+            logger.info("Starting video frame processing...")
+            target_timestamps, shots = self._plan_keyframes(segments, audio.duration, video_path)
+            if target_timestamps:
+                # Call VLM module's core analysis method
+                frame_ctx_cache = self.vlm_analyzer.analyze_frames(video_path, target_timestamps)
+            else:
+                is_video_valid = False
+
+        return self._assemble_segments(segments, frame_ctx_cache, bool(is_video_valid), shots)
+
+    @staticmethod
+    def _assemble_segments(segments: List[Dict[str, Any]], frame_ctx_cache: Dict[float, Dict[str, Any]],
+                           is_video_valid: bool, shots: Optional[List[Dict[str, float]]] = None
+                           ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        为每个片段匹配场景描述，返回 (最终片段, 全局场景上下文)。
+        有镜头列表时使用片段中点所在镜头的代表帧，否则使用时间上最近的帧。
+        """
+        default_context = {
+            "scene_type": "Non-video file" if not is_video_valid else "Frame extraction failed",
+            "environment": "Undetected",
+            "emotion": "Undetected",
+            "activity": "Undetected",
+            "description": "No scene information",
+        }
+
+        shot_starts = [shot["start"] for shot in shots] if shots else []
+        final_segments = []
+        for seg in segments:
+            mid_ts = (seg["start"] + seg["end"]) / 2
+            segment_av_ctx = default_context
+
+            shot_keyframe = None
+            if shots:
+                shot = shots[max(0, bisect.bisect_right(shot_starts, mid_ts) - 1)]
+                shot_keyframe = shot["keyframe"]
+
+            if shot_keyframe in frame_ctx_cache:
+                segment_av_ctx = frame_ctx_cache[shot_keyframe]
+            elif frame_ctx_cache:
+                # Find the closest processed frame
+                closest_ts = min(frame_ctx_cache.keys(), key=lambda x: abs(x - mid_ts))
+                if abs(closest_ts - mid_ts) <= 3.0:  # Ensure time match is reasonable
+                    segment_av_ctx = frame_ctx_cache[closest_ts]
+
+            final_segments.append({
+                "start": seg["start"],
+                "end": seg["end"],
+                "text": seg["text"].strip(),
+                "av_context": segment_av_ctx
+            })
+
+        # Extract global context (use the first valid frame description)
+        global_av_ctx = next(iter(frame_ctx_cache.values())) if frame_ctx_cache else default_context
+        return final_segments, global_av_ctx
+
+    def _transcript_cache_key(self, media_path: Optional[str], audio: Optional[DecodedAudio], language: str,
+                              task: str, video_source_path: Optional[str]) -> str:
+        """缓存键：优先使用原始文件字节指纹（命中时无需解码），否则使用 PCM 指纹。"""
+        source_path = media_path or (audio.source_path if audio else None)
+        if source_path and os.path.exists(source_path):
+            fingerprint = TranscriptCache.fingerprint_file(source_path)
+        else:
+            fingerprint = TranscriptCache.fingerprint_pcm(audio.pcm)
+        return TranscriptCache.make_key(
+            fingerprint,
+            backend=self.backend_name,
+            model=self.model_name,
+            compute_type=self.compute_type,
+            language=language,
+            task=task,
+            beam_size=self.beam_size,
+            vlm=bool(self.vlm_analyzer) and bool(video_source_path or (audio and audio.is_video)
+                                                  or (media_path or "").lower().endswith(VIDEO_EXTENSIONS)),
+            keyframes=self.keyframe_strategy,
+        )
+
+    def _asr_options(self, language: str, task: str) -> Dict[str, Any]:
+        return {
+            "task": task,
+            "beam_size": self.beam_size,
+            "language": language if language != "auto" else None
+        }
+
+    def _run_asr(self, audio: DecodedAudio, options: Dict[str, Any],
+                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """只做 ASR（不含 VLM），超过阈值的长音频走分块并行转录"""
+        if audio.duration >= self.long_form_threshold:
+            return self._transcribe_long_form(audio, options, progress_callback)
+        logger.info("Executing Whisper transcription...")
+        result = self.backend.transcribe(audio.to_float32(), **options)
+        if progress_callback is not None:
+            progress_callback({
+                "event": "segments",
+                "segments": [{"start": seg["start"], "end": seg["end"], "text": seg["text"].strip()}
+                             for seg in result["segments"]],
+                "progress": 1.0,
+            })
+        return result
+
+    def transcribe(self, media_path: Optional[str] = None, language: str = "auto", task: str = "transcribe",
+                   video_source_path: Optional[str] = None, audio: Optional[DecodedAudio] = None,
+                   progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Performs audio transcription and coordinates VLM analysis if a video source is present.
 
-            # 重新加载 audio，并确保它是 numpy array
-            audio_for_transcribe = whisper.load_audio(media_path)
+        `audio` 为上游已解码的 DecodedAudio 时直接复用（整个请求只解码一次）；
+        否则对 `media_path` 解码一次。启用转录缓存时，命中则直接返回（不解码、不跑 ASR）。
+        `progress_callback` 依次收到 {"event": "start"}、若干 {"event": "segments"}（已完成部分的片段与
+        按音频秒数计算的进度）和 {"event": "scene_analysis"}，供后台任务上报进度。
+        """
+        if audio is None and (not media_path or not os.path.exists(media_path)):
+            raise FileNotFoundError(f"Media file not found: {media_path}")
 
-            # 如果是立体声，则将其转换为单声道 numpy 数组
-            if audio_for_transcribe.ndim > 1:
-                audio_for_transcribe = audio_for_transcribe.mean(axis=0)  # mean along channel axis
+        cache_key = None
+        if self.transcript_cache is not None:
+            cache_key = self._transcript_cache_key(media_path, audio, language, task, video_source_path)
+            cached = self.transcript_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Transcript cache hit, skipping ASR. ({self.transcript_cache.stats()})")
+                if progress_callback is not None:
+                    progress_callback({"event": "segments", "segments": cached["segments"], "progress": 1.0,
+                                       "cached": True})
+                return cached
+
+        owns_audio = audio is None
+        if owns_audio:
+            audio = self.audio_processor.decode_audio(media_path)
+        media_path = media_path or audio.source_path or ""
 
-            # 传入 numpy 数组，让 Whisper 内部处理张量转换和维度
-            result = self.model.transcribe(audio_for_transcribe, **options)
+        try:
+            logger.info(f"Starting transcription for: {media_path}")
 
-            # --- 修复结束 ---
+            # 1. Transcription (复用同一份 float32 PCM，不再重复 load_audio / 构造张量)
+            duration = audio.duration
+            if progress_callback is not None:
+                progress_callback({"event": "start", "duration": duration})
+            result = self._run_asr(audio, self._asr_options(language, task), progress_callback)
 
-            segments = result.get("segments", [])
+            segments = result["segments"]
             logger.info(f"Whisper transcription completed. Found {len(segments)} segments.")
+            if progress_callback is not None:
+                progress_callback({"event": "scene_analysis", "language": result["language"]})
 
-            # 2. Video Path Handling
-            video_path = None
-            if video_source_path and os.path.exists(video_source_path) and video_source_path.lower().endswith(
-                    (".mp4", ".avi", ".mov", ".mkv")):
-                video_path = video_source_path
-            elif media_path.lower().endswith((".mp4", ".avi", ".mov", ".mkv")):
-                video_path = media_path
-
-            is_video_valid = video_path and self.vlm_analyzer is not None
-
-            # 3. VLM Scene Analysis Coordination
-            frame_ctx_cache = {}
-            if is_video_valid:
-                logger.info("Starting video frame processing...")
-
-                # Dynamic calculation of target frames
-                dynamic_target_frames = math.ceil((duration / 60) * self.frames_per_minute)
-                dynamic_target_frames = max(1, dynamic_target_frames)
-                final_limit = min(dynamic_target_frames, self.max_frames_to_process)
-
-                logger.info(
-                    f"Video Duration: {duration:.2f}s, Dynamic Target Frames: {dynamic_target_frames} (Hard Limit: {self.max_frames_to_process})")
-
-                # Generate and deduplicate keyframe timestamps
-                raw_timestamps = [(seg["start"] + seg["end"]) / 2 for seg in segments]
-                # Call VLM module's deduplication logic
-                target_timestamps = self.vlm_analyzer._deduplicate_timestamps(raw_timestamps, final_limit, duration)
-
-                logger.info(f"Final frames to extract: {len(target_timestamps)}...")
-
-                if target_timestamps:
-                    # Call VLM module's core analysis method
-                    frame_ctx_cache = self.vlm_analyzer.analyze_frames(video_path, target_timestamps)
-                else:
-                    is_video_valid = False
-
-            # 4. Result Assembly and Context Matching
-            default_context = {
-                "scene_type": "Non-video file" if not is_video_valid else "Frame extraction failed",
-                "environment": "Undetected",
-                "emotion": "Undetected",
-                "activity": "Undetected",
-                "description": "No scene information",
-            }
-
-            final_segments = []
-            for seg in segments:
-                mid_ts = (seg["start"] + seg["end"]) / 2
-                segment_av_ctx = default_context
-
-                if frame_ctx_cache:
-                    # Find the closest processed frame
-                    closest_ts = min(frame_ctx_cache.keys(), key=lambda x: abs(x - mid_ts))
-                    if abs(closest_ts - mid_ts) <= 3.0:  # Ensure time match is reasonable
-                        segment_av_ctx = frame_ctx_cache[closest_ts]
-
-                final_segments.append({
-                    "start": seg["start"],
-                    "end": seg["end"],
-                    "text": seg["text"].strip(),
-                    "av_context": segment_av_ctx
-                })
-
-            # Extract global context (use the first valid frame description)
-            global_av_ctx = next(iter(frame_ctx_cache.values())) if frame_ctx_cache else default_context
+            final_segments, global_av_ctx = self._analyze_scenes(segments, audio, video_source_path)
             if self.whisper_device == "cuda":
                 torch.cuda.empty_cache()
 
-            return {
+            transcript = {
                 "text": result["text"].strip(),
                 "segments": final_segments,
                 "language": result["language"],
                 "duration": duration,
                 "global_av_context": global_av_ctx
             }
+            if cache_key is not None:
+                self.transcript_cache.put(cache_key, transcript)
+            return transcript
         except Exception as e:
             logger.error(f"Transcription failed: {e}", exc_info=True)
             if self.whisper_device == "cuda":
                 torch.cuda.empty_cache()
-            raise Exception(f"Transcription error: {e}")
\ No newline at end of file
+            raise Exception(f"Transcription error: {e}")
+        finally:
+            if owns_audio:
+                audio.close()
+
+    def _iter_transcribed_segments(self, audio: DecodedAudio, options: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        增量转录：后端支持流式解码时直接透传其片段生成器；
+        否则按静音边界切成短块逐块转录，每块完成即产出（块接缝处去重）。
+        """
+        if self.backend.supports_streaming:
+            yield from self.backend.iter_segments(audio.to_float32(), **options)
+            return
+
+        options = dict(options, condition_on_previous_text=False)
+        chunks = self.audio_processor.split_on_silence(audio, self.stream_chunk_seconds,
+                                                       self.stream_chunk_seconds / 3)
+        prev = None
+        for start, end in chunks:
+            offset = start / SAMPLE_RATE
+            result = self.backend.transcribe(audio.to_float32(start, end), **options)
+            for seg_idx, seg in enumerate(result["segments"]):
+                seg = {"start": seg["start"] + offset, "end": seg["end"] + offset, "text": seg["text"]}
+                seg = self._trim_seam(prev, seg, at_seam=seg_idx == 0)
+                if seg:
+                    prev = seg
+                    yield seg
+
+    def transcribe_stream(self, media_path: Optional[str] = None, language: str = "auto",
+                          task: str = "transcribe", video_source_path: Optional[str] = None,
+                          audio: Optional[DecodedAudio] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式转录：以事件形式逐段产出结果，便于翻译和前端在 ASR 未结束时就开始处理。
+
+        事件:
+            {"event": "start", "duration", "language"}
+            {"event": "segment", "index", "segment": {"start", "end", "text"}, "progress"}
+            {"event": "done", "text", "segments"(含 av_context), "language", "duration", "global_av_context"}
+        """
+        if audio is None and (not media_path or not os.path.exists(media_path)):
+            raise FileNotFoundError(f"Media file not found: {media_path}")
+
+        cache_key = None
+        if self.transcript_cache is not None:
+            cache_key = self._transcript_cache_key(media_path, audio, language, task, video_source_path)
+            cached = self.transcript_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Transcript cache hit, replaying cached segments.")
+                yield from self._replay_cached_transcript(cached)
+                return
+
+        owns_audio = audio is None
+        if owns_audio:
+            audio = self.audio_processor.decode_audio(media_path)
+        try:
+            yield from self._stream_events(audio, language, task, video_source_path, cache_key)
+        finally:
+            if owns_audio:
+                audio.close()
+
+    @staticmethod
+    def _replay_cached_transcript(cached: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        duration = cached["duration"]
+        yield {"event": "start", "duration": duration, "language": cached["language"]}
+        for idx, seg in enumerate(cached["segments"]):
+            yield {
+                "event": "segment",
+                "index": idx,
+                "segment": {"start": seg["start"], "end": seg["end"], "text": seg["text"]},
+                "progress": round(min(1.0, seg["end"] / duration), 4) if duration else 1.0,
+            }
+        yield dict(cached, event="done")
+
+    def _stream_events(self, audio: DecodedAudio, language: str, task: str, video_source_path: Optional[str],
+                       cache_key: Optional[str]) -> Iterator[Dict[str, Any]]:
+        duration = audio.duration
+        options = self._asr_options(language, task)
+        if options["language"] is None:
+            options["language"] = self._detect_language(audio)
+
+        logger.info(f"Starting streaming transcription for: {audio.source_path} ({duration:.1f}s)")
+        yield {"event": "start", "duration": duration, "language": options["language"]}
+
+        segments = []
+        for seg in self._iter_transcribed_segments(audio, options):
+            seg = {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip()}
+            segments.append(seg)
+            yield {
+                "event": "segment",
+                "index": len(segments) - 1,
+                "segment": seg,
+                "progress": round(min(1.0, seg["end"] / duration), 4) if duration else 1.0,
+            }
+
+        logger.info(f"Streaming transcription completed. Found {len(segments)} segments.")
+
+        # ASR 全部结束后再做 VLM 场景分析，结果随 done 事件一起返回
+        final_segments, global_av_ctx = self._analyze_scenes(segments, audio, video_source_path)
+        if self.whisper_device == "cuda":
+            torch.cuda.empty_cache()
+
+        transcript = {
+            "text": " ".join(seg["text"] for seg in segments),
+            "segments": final_segments,
+            "language": options["language"],
+            "duration": duration,
+            "global_av_context": global_av_ctx,
+        }
+        if cache_key is not None:
+            self.transcript_cache.put(cache_key, transcript)
+        yield dict(transcript, event="done")
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 Flask应用启动脚本 - 生产模式（不重启）
+WSGI 服务器请使用应用工厂，例如: gunicorn "app:create_app()"
 """
 import os
 import sys
@@ -9,7 +10,7 @@ import sys
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app
+from app import create_app
 import logging
 
 # 配置日志
@@ -22,5 +23,7 @@ logger = logging.getLogger(__name__)
 
 if __name__ == '__main__':
     logger.info("启动AI字幕翻译应用（生产模式）...")
+    # 只在入口初始化模型与任务队列：worker 等 spawn 子进程重新导入本模块时不会执行这里
+    app = create_app()
     # 禁用调试模式，避免文件更改时重启
     app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
@@ -1,6 +1,7 @@
 // AI字幕翻译应用主JavaScript文件
 
 let currentFile = null;
+let uploadedFilePath = null;  // 服务器上的上传路径，下载后用于清理
 let transcriptionResult = null;
 let translationResult = null;
 let currentStep = 1;
@@ -149,25 +150,20 @@ async function startTranscription() {
         }
 
         const uploadData = await uploadResponse.json();
+        uploadedFilePath = uploadData.file_path;
 
-        // 音频转录
+        // 音频转录：流式接口逐段推送已解码的片段，边转录边显示
         const sourceLang = document.getElementById('source-language').value;
-        const transcribeResponse = await fetch('/api/transcribe', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                file_path: uploadData.file_path,
-                language: sourceLang
-            })
+        const params = new URLSearchParams({
+            file_path: uploadData.file_path,
+            language: sourceLang
+        });
+        document.getElementById('subtitle-preview').innerHTML = '';
+        transcriptionResult = await streamEvents(`/api/transcribe/stream?${params}`, event => {
+            if (event.event === 'segment') {
+                renderPreviewItem(event.index, event.segment.start, event.segment.end, event.segment.text);
+            }
         });
-
-        if (!transcribeResponse.ok) {
-            throw new Error('音频转录失败');
-        }
-
-        transcriptionResult = await transcribeResponse.json();
 
         // 进入下一步
         goToStep(3);
@@ -209,23 +205,40 @@ async function startTranslation() {
         const targetLang = document.getElementById('target-language').value;
         const sourceLang = document.getElementById('source-language').value;
 
-        const response = await fetch('/api/translate', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                segments: transcriptionResult.segments,
-                target_language: targetLang,
-                source_language: sourceLang
-            })
-        });
+        const request = {
+            segments: transcriptionResult.segments,
+            target_language: targetLang,
+            source_language: sourceLang
+        };
 
-        if (!response.ok) {
-            throw new Error('字幕翻译失败');
-        }
+        // 提交翻译任务，译文到达时更新预览；未启用后台任务队列时改走同步接口
+        try {
+            translationResult = await runJob(Object.assign({ kind: 'translate' }, request), event => {
+                if (event.event === 'translation') {
+                    event.segments.forEach(item => {
+                        const segment = transcriptionResult.segments[item.index];
+                        renderPreviewItem(item.index, segment.start, segment.end, item.translation);
+                    });
+                }
+            });
+        } catch (error) {
+            if (!error.queueUnavailable) {
+                throw error;
+            }
+            const response = await fetch('/api/translate', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(request)
+            });
 
-        translationResult = await response.json();
+            if (!response.ok) {
+                throw new Error('字幕翻译失败');
+            }
+
+            translationResult = await response.json();
+        }
 
         // 显示预览
         showSubtitlePreview();
@@ -243,6 +256,87 @@ async function startTranslation() {
     }
 }
 
+// 订阅流式接口 (SSE)，onEvent 接收中间事件，done / translated 时返回该事件，error 或连接中断时抛出。
+// 断线不重连：GET 流式接口每次请求都会重新开始处理
+function streamEvents(url, onEvent) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(url);
+        source.onerror = () => {
+            source.close();
+            reject(new Error('进度连接已断开'));
+        };
+        source.onmessage = (e) => {
+            const event = JSON.parse(e.data);
+            if (event.event === 'done' || event.event === 'translated') {
+                source.close();
+                resolve(event);
+            } else if (event.event === 'error') {
+                source.close();
+                reject(new Error(event.error));
+            } else {
+                onEvent(event);
+            }
+        };
+    });
+}
+
+// 提交后台任务并订阅 /api/jobs/<id>/events，返回任务 result；队列不可用 (503) 时错误带 queueUnavailable 标记
+async function runJob(payload, onEvent) {
+    const submitResponse = await fetch('/api/jobs', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+    const submitData = await submitResponse.json();
+    if (submitResponse.status === 503) {
+        const error = new Error(submitData.error || '后台任务队列不可用');
+        error.queueUnavailable = true;
+        throw error;
+    }
+    if (!submitResponse.ok) {
+        throw new Error(submitData.error || '任务提交失败');
+    }
+
+    return new Promise((resolve, reject) => {
+        // 任务事件带 id，断线后 EventSource 自动重连并从 Last-Event-ID 继续
+        const source = new EventSource(`/api/jobs/${submitData.job_id}/events`);
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) {
+                reject(new Error('任务进度连接已断开'));
+            }
+        };
+        source.onmessage = (e) => {
+            const event = JSON.parse(e.data);
+            if (event.event === 'done') {
+                source.close();
+                resolve(event.result);
+            } else if (event.event === 'failed' || event.event === 'cancelled') {
+                source.close();
+                reject(new Error(event.error || '任务已取消'));
+            } else {
+                onEvent(event);
+            }
+        };
+    });
+}
+
+// 按片段序号新增或更新一条预览
+function renderPreviewItem(index, start, end, text) {
+    const preview = document.getElementById('subtitle-preview');
+    let item = preview.querySelector(`[data-index="${index}"]`);
+    if (!item) {
+        item = document.createElement('div');
+        item.className = 'subtitle-item';
+        item.dataset.index = index;
+        item.innerHTML = '<div class="subtitle-time"></div><div class="subtitle-text"></div>';
+        preview.appendChild(item);
+    }
+    item.querySelector('.subtitle-time').textContent = `${index + 1}. ${formatTime(start)} --> ${formatTime(end)}`;
+    item.querySelector('.subtitle-text').textContent = text;
+}
+
 // 显示字幕预览
 function showSubtitlePreview() {
     if (!translationResult || !translationResult.segments) {
@@ -299,14 +393,14 @@ async function downloadSubtitle() {
         window.location.href = data.download_url;
 
         // 清理服务器文件
-        if (currentFile) {
+        if (uploadedFilePath) {
             await fetch('/api/process-complete', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
                 body: JSON.stringify({
-                    file_path: currentFile.path
+                    file_path: uploadedFilePath
                 })
             });
         }
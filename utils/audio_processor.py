@@ -1,17 +1,297 @@
 import os
 import logging
+import numpy as np
 from pydub import AudioSegment
-from typing import Optional
+from typing import Optional, List, Tuple
 import subprocess
 import shutil
+import tempfile
+from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Whisper 要求的输入采样率
+SAMPLE_RATE = 16000
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+# ffmpeg 管道单次读取的字节数 (约 2 秒 16kHz s16le)
+PIPE_CHUNK_BYTES = 1 << 16
+
+
+class DecodedAudio:
+    """
+    一次解码得到的 16kHz 单声道 PCM (int16)。
+    在 提取 → ASR → 时长计算 → VLM 取帧时间轴 的整个流程中共享同一份数据，避免重复解码。
+    超长输入时 `pcm` 为磁盘上的 np.memmap，按需分页读取，不常驻内存。
+    """
+
+    def __init__(self, pcm: np.ndarray, sample_rate: int = SAMPLE_RATE, source_path: Optional[str] = None,
+                 backing_file: Optional[str] = None):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.source_path = source_path
+        self.backing_file = backing_file  # memmap 模式下的原始 PCM 临时文件
+
+    @property
+    def num_samples(self) -> int:
+        return int(self.pcm.shape[0])
+
+    @property
+    def duration(self) -> float:
+        """音频时长（秒）"""
+        return self.num_samples / self.sample_rate
+
+    @property
+    def is_memmap(self) -> bool:
+        return self.backing_file is not None
+
+    @property
+    def is_video(self) -> bool:
+        """原始来源是否为视频文件（决定是否需要 VLM 场景分析）"""
+        return bool(self.source_path) and self.source_path.lower().endswith(VIDEO_EXTENSIONS)
+
+    def to_float32(self, start_sample: int = 0, end_sample: Optional[int] = None) -> np.ndarray:
+        """
+        返回 Whisper 可直接使用的 [-1, 1] float32 波形
+
+        Args:
+            start_sample: 起始采样点
+            end_sample: 结束采样点（不含），None 表示到结尾
+
+        Returns:
+            float32 一维数组（仅对所取区间做一次类型转换）
+        """
+        samples = np.asarray(self.pcm[start_sample:end_sample], dtype=np.float32)
+        samples /= 32768.0
+        return samples
+
+    def close(self):
+        """释放 memmap 并删除其临时文件（内存模式下为空操作）"""
+        if self.backing_file:
+            self.pcm = np.zeros(0, dtype=np.int16)
+            try:
+                os.remove(self.backing_file)
+            except OSError as e:
+                logger.warning(f"删除 PCM 临时文件失败: {e}")
+            self.backing_file = None
+
+
 class AudioProcessor:
-    def __init__(self):
-        """初始化音频处理器"""
+    def __init__(self, ingest_mode: Optional[str] = None, mmap_threshold_seconds: Optional[float] = None,
+                 temp_dir: Optional[str] = None):
+        """
+        初始化音频处理器
+
+        Args:
+            ingest_mode: 'memory' / 'mmap' / 'auto'（按时长自动选择），默认取 Config.AUDIO_INGEST_MODE
+            mmap_threshold_seconds: auto 模式下切换到 memmap 的时长阈值（秒）
+            temp_dir: memmap 临时文件目录
+        """
         self.supported_formats = ['.mp3', '.wav', '.m4a', '.flac', '.aac', '.mp4', '.avi', '.mov', '.mkv', '.webm']
-    
+        # 解码次数统计（每次 ffmpeg / pydub 全量解码计一次），用于性能基准
+        self.decode_passes = 0
+
+        self.ingest_mode = ingest_mode or getattr(Config, 'AUDIO_INGEST_MODE', 'auto')
+        self.mmap_threshold_seconds = mmap_threshold_seconds if mmap_threshold_seconds is not None else \
+            getattr(Config, 'AUDIO_MMAP_THRESHOLD_SECONDS', 1800)
+        self.temp_dir = temp_dir or Config.TEMP_FOLDER
+
+    def decode_audio(self, input_path: str) -> DecodedAudio:
+        """
+        将音频/视频文件一次性解码为 16kHz 单声道 PCM。
+        ffmpeg 的 s16le 输出通过管道直接写入 NumPy 缓冲区（或超长输入的 memmap 临时文件），不产生中间 WAV 文件。
+
+        Args:
+            input_path: 原始上传的音频或视频文件路径
+
+        Returns:
+            DecodedAudio 对象
+        """
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Media file not found: {input_path}")
+
+        try:
+            logger.info(f"正在解码音频: {input_path}")
+            self.decode_passes += 1
+
+            if not self.check_ffmpeg():
+                logger.warning("FFmpeg未安装，尝试使用pydub直接解码")
+                audio = AudioSegment.from_file(input_path)
+                audio = audio.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+                decoded = DecodedAudio(np.frombuffer(audio.raw_data, dtype=np.int16), SAMPLE_RATE, input_path)
+            else:
+                expected_duration = self.probe_duration(input_path)
+                use_mmap = self.ingest_mode == 'mmap' or (
+                    self.ingest_mode == 'auto' and expected_duration is not None
+                    and expected_duration >= self.mmap_threshold_seconds
+                )
+                if use_mmap:
+                    decoded = self._ingest_to_memmap(input_path)
+                else:
+                    decoded = self._ingest_to_memory(input_path, expected_duration)
+
+            logger.info(f"音频解码完成: {decoded.duration:.2f}s (memmap: {decoded.is_memmap})")
+            return decoded
+
+        except Exception as e:
+            logger.error(f"音频解码失败: {e}")
+            raise Exception(f"音频解码失败: {e}")
+
+    def split_on_silence(self, audio: DecodedAudio, max_chunk_seconds: float = 120.0,
+                         min_chunk_seconds: float = 30.0, frame_ms: int = 30) -> List[Tuple[int, int]]:
+        """
+        基于能量的 VAD 分块：在 [min_chunk, max_chunk] 的搜索窗口内选择最安静的位置切分，
+        保证每块长度有上限，且切点尽量落在语音停顿处。
+
+        Args:
+            audio: 已解码音频
+            max_chunk_seconds: 单块最大时长（秒）
+            min_chunk_seconds: 单块最小时长（秒）
+            frame_ms: VAD 帧长（毫秒）
+
+        Returns:
+            [(start_sample, end_sample), ...] 覆盖整段音频、首尾相接的区间列表
+        """
+        total = audio.num_samples
+        if total <= int(max_chunk_seconds * audio.sample_rate):
+            return [(0, total)]
+
+        frame_len = audio.sample_rate * frame_ms // 1000
+        energy_db = self._frame_energy_db(audio.pcm, frame_len)
+
+        # 约 300ms 的滑动平均，避免切在单词内部的短暂低能量处
+        smooth = max(1, 300 // frame_ms)
+        smoothed = np.convolve(energy_db, np.ones(smooth) / smooth, mode='same')
+
+        n_frames = len(smoothed)
+        min_frames = int(min_chunk_seconds * 1000 / frame_ms)
+        max_frames = int(max_chunk_seconds * 1000 / frame_ms)
+
+        boundaries = [0]
+        start = 0
+        while n_frames - start > max_frames:
+            window = smoothed[start + min_frames:start + max_frames]
+            split = start + min_frames + int(np.argmin(window))
+            boundaries.append(split)
+            start = split
+
+        sample_bounds = [b * frame_len for b in boundaries] + [total]
+        return [(sample_bounds[i], sample_bounds[i + 1]) for i in range(len(sample_bounds) - 1)]
+
+    @staticmethod
+    def _frame_energy_db(pcm: np.ndarray, frame_len: int, block_frames: int = 4096) -> np.ndarray:
+        """逐帧 RMS 能量 (dBFS)，按块计算以兼容 memmap 输入"""
+        n_frames = pcm.shape[0] // frame_len
+        energy = np.empty(n_frames, dtype=np.float32)
+        for i in range(0, n_frames, block_frames):
+            j = min(n_frames, i + block_frames)
+            block = np.asarray(pcm[i * frame_len:j * frame_len], dtype=np.float32).reshape(j - i, frame_len)
+            energy[i:j] = np.sqrt(np.mean(np.square(block / 32768.0), axis=1))
+        return 20.0 * np.log10(energy + 1e-10)
+
+    def _open_pcm_pipe(self, input_path: str, stderr_file) -> subprocess.Popen:
+        """
+        启动 ffmpeg，将 16kHz 单声道 s16le 原始 PCM 写到 stdout。
+        stderr 写入临时文件而不是管道：只读取 stdout 时，输出大量警告的 ffmpeg 会写满 stderr 管道而死锁。
+        """
+        command = [
+            'ffmpeg', '-nostdin',
+            '-threads', '0',
+            '-i', input_path,
+            '-vn',  # 无视频
+            '-f', 's16le',
+            '-acodec', 'pcm_s16le',  # PCM编码
+            '-ac', '1',  # 单声道
+            '-ar', str(SAMPLE_RATE),  # 16kHz采样率
+            '-loglevel', 'error',
+            '-'
+        ]
+        return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, bufsize=PIPE_CHUNK_BYTES)
+
+    @staticmethod
+    def _finish_pipe(proc: subprocess.Popen, stderr_file, check: bool = True):
+        """
+        关闭管道并等待 ffmpeg 退出。check=False 用于读取过程已出错的情况：直接结束 ffmpeg，
+        不再抛出 ffmpeg 的错误，避免掩盖原始异常。
+        """
+        proc.stdout.close()
+        if not check:
+            proc.kill()
+        returncode = proc.wait()
+        if check and returncode != 0:
+            stderr_file.seek(0)
+            raise Exception(f"FFmpeg错误: {stderr_file.read().decode(errors='ignore')}")
+
+    def _ingest_to_memory(self, input_path: str, expected_duration: Optional[float]) -> DecodedAudio:
+        """管道读取到预分配的 int16 缓冲区（按探测时长预分配，不足时倍增）"""
+        capacity = int((expected_duration or 60.0) * SAMPLE_RATE) + SAMPLE_RATE
+        buffer = np.empty(capacity, dtype=np.int16)
+        filled = 0  # 已写入字节数
+
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = self._open_pcm_pipe(input_path, stderr_file)
+            try:
+                while True:
+                    view = memoryview(buffer).cast('B')
+                    if filled == len(view):
+                        buffer = np.resize(buffer, buffer.shape[0] * 2)
+                        continue
+                    n = proc.stdout.readinto(view[filled:filled + PIPE_CHUNK_BYTES])
+                    if not n:
+                        break
+                    filled += n
+            except BaseException:
+                self._finish_pipe(proc, stderr_file, check=False)
+                raise
+            self._finish_pipe(proc, stderr_file)
+
+        # s16le 每个采样 2 字节；截掉预分配的剩余部分（切片为视图，不拷贝）
+        return DecodedAudio(buffer[:filled // 2], SAMPLE_RATE, input_path)
+
+    def _ingest_to_memmap(self, input_path: str) -> DecodedAudio:
+        """管道直接写入原始 PCM 临时文件（无 WAV 头），再以只读 memmap 打开"""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        fd, pcm_path = tempfile.mkstemp(suffix='.s16le', dir=self.temp_dir)
+
+        try:
+            with tempfile.TemporaryFile() as stderr_file:
+                proc = self._open_pcm_pipe(input_path, stderr_file)
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        shutil.copyfileobj(proc.stdout, f, PIPE_CHUNK_BYTES)
+                except BaseException:
+                    self._finish_pipe(proc, stderr_file, check=False)
+                    raise
+                self._finish_pipe(proc, stderr_file)
+        except Exception:
+            os.remove(pcm_path)
+            raise
+
+        if os.path.getsize(pcm_path) < 2:
+            os.remove(pcm_path)
+            return DecodedAudio(np.zeros(0, dtype=np.int16), SAMPLE_RATE, input_path)
+
+        pcm = np.memmap(pcm_path, dtype=np.int16, mode='r')
+        return DecodedAudio(pcm, SAMPLE_RATE, input_path, backing_file=pcm_path)
+
+    def probe_duration(self, input_path: str) -> Optional[float]:
+        """
+        使用 ffprobe 读取容器时长（仅读元数据，不解码）
+
+        Returns:
+            时长（秒），无法获取时返回 None
+        """
+        if shutil.which('ffprobe') is None:
+            return None
+        try:
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                 '-of', 'default=noprint_wrappers=1:nokey=1', input_path],
+                capture_output=True, text=True
+            )
+            return float(result.stdout.strip()) if result.returncode == 0 else None
+        except ValueError:
+            return None
+
     def extract_audio_from_video(self, video_path: str, output_path: str) -> str:
         """
         从视频中提取音频
@@ -25,6 +305,7 @@ class AudioProcessor:
         """
         try:
             logger.info(f"正在从视频中提取音频: {video_path}")
+            self.decode_passes += 1
             
             # 首先检查FFmpeg是否可用
             if not self.check_ffmpeg():
@@ -80,6 +361,7 @@ class AudioProcessor:
         """
         try:
             logger.info(f"正在转换音频格式: {input_path} -> {output_path}")
+            self.decode_passes += 1
             
             # 加载音频文件
             audio = AudioSegment.from_file(input_path)
@@ -100,8 +382,9 @@ class AudioProcessor:
     
     def process_audio_for_transcription(self, input_path: str, temp_dir: str) -> str:
         """
-        处理音频文件以供转录使用
-        
+        处理音频文件以供转录使用（仅供需要文件路径的调用方，如 CLI）。
+        Web 流程请直接使用 decode_audio 获取内存中的 PCM。
+
         Args:
             input_path: 输入文件路径
             temp_dir: 临时目录
@@ -110,36 +393,27 @@ class AudioProcessor:
             处理后的音频文件路径
         """
         try:
-            file_ext = os.path.splitext(input_path)[1].lower()
-            
-            # 如果是视频文件，先提取音频
-            if file_ext in ['.mp4', '.avi', '.mov', '.mkv', '.webm']:
-                logger.info(f"检测到视频文件: {input_path}")
-                audio_path = os.path.join(temp_dir, 'extracted_audio.wav')
-                
-                # 尝试提取音频，如果失败则提供有用的错误信息
-                try:
-                    audio_path = self.extract_audio_from_video(input_path, audio_path)
-                except Exception as video_error:
-                    logger.error(f"视频处理失败: {video_error}")
-                    # 如果是FFmpeg相关问题，提供替代方案
-                    if "FFmpeg" in str(video_error):
-                        raise Exception(
-                            "视频处理需要FFmpeg。请：\n"
-                            "1. 安装FFmpeg: https://ffmpeg.org/download.html\n"
-                            "2. 或将视频转换为音频文件后上传\n"
-                            "3. 或直接使用音频文件（.wav, .mp3等）"
-                        )
-                    else:
-                        raise video_error
-            else:
-                audio_path = input_path
-            
-            # 转换为适合转录的格式
             processed_path = os.path.join(temp_dir, 'processed_audio.wav')
-            processed_path = self.convert_audio_format(audio_path, processed_path)
-            
-            return processed_path
+            file_ext = os.path.splitext(input_path)[1].lower()
+            if file_ext not in VIDEO_EXTENSIONS and not self.check_ffmpeg():
+                # 没有 FFmpeg 时音频文件（如 WAV）仍可由 pydub 直接转换
+                logger.warning("FFmpeg未安装，使用pydub转换音频格式")
+                return self.convert_audio_format(input_path, processed_path)
+
+            # ffmpeg 一次完成 提取 + 重采样 + 单声道，不再经过 pydub 二次读写
+            try:
+                return self.extract_audio_from_video(input_path, processed_path)
+            except Exception as video_error:
+                logger.error(f"音频提取失败: {video_error}")
+                # 如果是FFmpeg相关问题，提供替代方案
+                if "FFmpeg" in str(video_error):
+                    raise Exception(
+                        "视频处理需要FFmpeg。请：\n"
+                        "1. 安装FFmpeg: https://ffmpeg.org/download.html\n"
+                        "2. 或将视频转换为音频文件后上传\n"
+                        "3. 或直接使用音频文件（.wav, .mp3等）"
+                    )
+                raise video_error
             
         except Exception as e:
             logger.error(f"音频处理失败: {e}")
@@ -156,6 +430,7 @@ class AudioProcessor:
             时长（秒）
         """
         try:
+            self.decode_passes += 1
             audio = AudioSegment.from_file(audio_path)
             return len(audio) / 1000.0  # 转换为秒
         except Exception as e:
@@ -190,9 +465,4 @@ class AudioProcessor:
     
     def check_ffmpeg(self) -> bool:
         """检查FFmpeg是否可用"""
-        try:
-            result = subprocess.run(['ffmpeg', '-version'], 
-                                  capture_output=True, text=True)
-            return result.returncode == 0
-        except FileNotFoundError:
-            return False
\ No newline at end of file
+        return shutil.which('ffmpeg') is not None
\ No newline at end of file
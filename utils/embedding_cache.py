@@ -0,0 +1,100 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    句向量 LRU 缓存，键为文本的 blake2b 哈希（同一个缓存实例只对应一个编码模型）。
+    用于跨任务、跨目标语言复用源文本的 QE 向量。
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(self.key(text))
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(self.key(text))
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[self.key(text)] = vector
+            self._entries.move_to_end(self.key(text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def encode_normalized(model, texts: List[str], cache: Optional[EmbeddingCache] = None,
+                      batch_size: int = 64) -> np.ndarray:
+    """
+    用 SentenceTransformer 编码并 L2 归一化，返回 (N, dim) float32 矩阵。
+    重复文本只编码一次；提供 cache 时先查缓存，只编码未命中的文本。
+    """
+    return encode_normalized_many(model, [(texts, cache)], batch_size=batch_size)[0]
+
+
+def encode_normalized_many(model, groups: List[Tuple[List[str], Optional[EmbeddingCache]]],
+                           batch_size: int = 64) -> List[np.ndarray]:
+    """
+    多组文本（如源文本 + 各目标语言译文）合并为一次 model.encode 调用，
+    每组可以有自己的缓存；返回与 groups 一一对应的归一化向量矩阵。
+    """
+    vectors = [dict() for _ in groups]
+    pending: Dict[str, List[int]] = {}
+    for group_idx, (texts, cache) in enumerate(groups):
+        for text in dict.fromkeys(texts):
+            vector = cache.get(text) if cache is not None else None
+            if vector is None:
+                pending.setdefault(text, []).append(group_idx)
+            else:
+                vectors[group_idx][text] = vector
+
+    if pending:
+        missing = list(pending)
+        encoded = model.encode(missing, batch_size=batch_size, convert_to_numpy=True,
+                               normalize_embeddings=True, show_progress_bar=False).astype(np.float32, copy=False)
+        for text, vector in zip(missing, encoded):
+            for group_idx in pending[text]:
+                vectors[group_idx][text] = vector
+                cache = groups[group_idx][1]
+                if cache is not None:
+                    cache.put(text, vector)
+
+    return [np.stack([vectors[group_idx][text] for text in texts]) if texts else np.zeros((0, 0), dtype=np.float32)
+            for group_idx, (texts, _) in enumerate(groups)]
+
+
+def rowwise_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """已归一化向量的逐行余弦相似度（逐行点积），O(N·dim)，不构造 N×N 矩阵"""
+    if a.size == 0:
+        return np.zeros(len(a), dtype=np.float32)
+    return np.einsum("ij,ij->i", a, b)
@@ -0,0 +1,134 @@
+import json
+import hashlib
+import logging
+from collections import deque
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class GlossaryMatcher:
+    """
+    术语表匹配器：把 {源术语: 目标译法} 编译成 Aho-Corasick 自动机，
+    一次线性扫描即可找出文本中出现的所有术语，耗时与术语表规模无关。
+    匹配默认不区分大小写，并要求英文术语两端落在词边界上（"Node" 不会命中 "Nodes"）。
+    """
+
+    def __init__(self, entries: Dict[str, str], case_sensitive: bool = False):
+        self.case_sensitive = case_sensitive
+        # 术语表内容指纹（翻译记忆用它区分不同版本术语表下的约束解码结果）
+        self.fingerprint = hashlib.sha1(
+            json.dumps(sorted(entries.items()), ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:12]
+        self.terms: List[str] = []
+        self.targets: List[str] = []
+        self._lengths: List[int] = []
+
+        # 自动机：goto 转移、fail 指针、本节点结束的术语下标、沿 fail 链的下一个输出节点
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [-1]
+        self._output_link: List[int] = [0]
+
+        for term, target in entries.items():
+            key = self._normalize(term.strip())
+            if not key or not target:
+                continue
+            node = 0
+            for ch in key:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(-1)
+                    self._output_link.append(0)
+                node = nxt
+            if self._output[node] == -1:
+                self._output[node] = len(self.terms)
+                self.terms.append(term.strip())
+                self.targets.append(target)
+                self._lengths.append(len(key))
+
+        self._build_failure_links()
+
+    @classmethod
+    def from_json(cls, path: str, **kwargs) -> "GlossaryMatcher":
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        matcher = cls(entries, **kwargs)
+        logger.info(f"Glossary compiled: {len(matcher)} terms, {len(matcher._goto)} automaton states ({path})")
+        return matcher
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _normalize(self, text: str) -> str:
+        return text if self.case_sensitive else text.lower()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                link = self._fail[child]
+                self._output_link[child] = link if self._output[link] != -1 else self._output_link[link]
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        返回文本中的术语命中 [(start, end, 术语下标)]，按位置排序；
+        重叠时取最左、最长的一个。
+        """
+        key = self._normalize(text)
+        candidates = []
+        node = 0
+        for pos, ch in enumerate(key):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+
+            out = node if self._output[node] != -1 else self._output_link[node]
+            while out:
+                term_idx = self._output[out]
+                start = pos + 1 - self._lengths[term_idx]
+                if self._on_boundary(key, start, pos + 1):
+                    candidates.append((start, pos + 1, term_idx))
+                out = self._output_link[out]
+
+        matches = []
+        last_end = 0
+        for start, end, term_idx in sorted(candidates, key=lambda m: (m[0], m[0] - m[1])):
+            if start >= last_end:
+                matches.append((start, end, term_idx))
+                last_end = end
+        return matches
+
+    @staticmethod
+    def _on_boundary(text: str, start: int, end: int) -> bool:
+        if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def misses(self, source_text: str, translation: str) -> List[Tuple[str, str]]:
+        """源文本中命中、但译文没有使用术语表译法的 (术语, 译法)，按出现顺序去重"""
+        result = []
+        seen = set()
+        for _, _, term_idx in self.find(source_text):
+            if term_idx in seen:
+                continue
+            seen.add(term_idx)
+            if self.targets[term_idx] not in translation:
+                result.append((self.terms[term_idx], self.targets[term_idx]))
+        return result
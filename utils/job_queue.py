@@ -0,0 +1,406 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务类型 -> 依次经过的处理阶段（每个阶段由对应类型的 worker 进程认领）
+JOB_KINDS = {
+    "transcribe": ["asr"],
+    "translate": ["nmt"],
+    "process": ["asr", "nmt"],
+    # 单个 worker 进程内的多阶段流水线（ASR / 抽帧 / 场景描述 / 翻译 / QE / 字幕），见 models/media_pipeline.py
+    "pipeline": ["pipeline"],
+    # 单个 worker 进程内边转录边翻译（ASR 片段流式交给翻译微批器），见 models/streaming.py
+    "stream": ["stream"],
+}
+
+ACTIVE_STATUSES = ("queued", "running")
+TERMINAL_EVENTS = ("done", "failed", "cancelled")
+
+
+class QueueFullError(Exception):
+    """待处理任务数达到上限（背压），调用方应稍后重试"""
+
+
+class JobStore:
+    """
+    持久化任务队列 (SQLite)。
+    每个任务按 JOB_KINDS 中的阶段顺序推进：worker 以原子方式认领处于自己阶段、状态为 queued 的最早任务，
+    完成后把结果合并进 result 并进入下一阶段；进程重启后 running 的任务会被重新排队。
+    """
+
+    # submit 时顺带清理过期数据的最小间隔（秒）
+    PURGE_INTERVAL = 300
+
+    def __init__(self, db_path: str = "cache/jobs.sqlite3", max_pending: int = 16,
+                 events_retention_seconds: float = 3600, job_retention_days: float = 7):
+        self.db_path = db_path
+        self.max_pending = max_pending
+        # 已结束任务的事件日志保留时长（供晚到 / 重连的 SSE 客户端读取），以及已结束任务本身的保留天数
+        self.events_retention_seconds = events_retention_seconds
+        self.job_retention_days = job_retention_days
+        self._last_purge = 0.0
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # isolation_level=None：手动 BEGIN IMMEDIATE，保证多进程认领任务时互斥
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stages TEXT NOT NULL,
+                stage_index INTEGER NOT NULL DEFAULT 0,
+                stage TEXT,
+                payload TEXT NOT NULL,
+                result TEXT NOT NULL DEFAULT '{}',
+                error TEXT,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                updated_at REAL NOT NULL,
+                finished_at REAL,
+                progress REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_jobs_claim
+            ON jobs (stage, status, created_at)
+        """)
+        # 任务事件日志：阶段切换、进度和部分结果，按 seq 递增，供 SSE 断点续传
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                event TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )
+        """)
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["stages"] = json.loads(job["stages"])
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"])
+        return job
+
+    def _append_event(self, job_id: str, event: Dict[str, Any], now: float):
+        """在已开启的事务中追加一条事件"""
+        seq = self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        self._conn.execute(
+            "INSERT INTO job_events (job_id, seq, created_at, event) VALUES (?, ?, ?, ?)",
+            (job_id, seq, now, json.dumps(dict(event, ts=round(now, 3)), ensure_ascii=False))
+        )
+
+    def add_event(self, job_id: str, event: Dict[str, Any], progress: Optional[float] = None):
+        """
+        记录任务事件（由 worker 上报）：event 为任意可 JSON 序列化的字典，至少含 "event" 字段；
+        progress 为整个任务的完成比例 (0~1)，同时写入 jobs.progress。
+        任务已结束（失败 / 取消）时忽略，终止事件之后不再出现新事件。
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None or row["status"] not in ACTIVE_STATUSES:
+                    self._conn.execute("COMMIT")
+                    return
+                if progress is not None:
+                    self._conn.execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                                       (min(1.0, max(0.0, progress)), now, job_id))
+                self._append_event(job_id, event, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def events_since(self, job_id: str, after_seq: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """seq 大于 after_seq 的事件（按顺序），每条附带 "seq" 字段"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after_seq, limit)
+            ).fetchall()
+        return [dict(json.loads(row["event"]), seq=row["seq"]) for row in rows]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchone()[0]
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """提交任务；待处理任务已满时抛出 QueueFullError"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind} (expected one of {list(JOB_KINDS)})")
+
+        stages = JOB_KINDS[kind]
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                pending = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+                ).fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueFullError(f"Job queue is full ({pending}/{self.max_pending} pending)")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, status, stages, stage_index, stage, payload, created_at, updated_at) "
+                    "VALUES (?, ?, 'queued', ?, 0, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(stages), stages[0], json.dumps(payload, ensure_ascii=False), now, now)
+                )
+                self._append_event(job_id, {"event": "queued", "stage": stages[0]}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info(f"任务已提交: {job_id} ({kind}, 阶段 {stages})")
+        if now - self._last_purge >= self.PURGE_INTERVAL:
+            self.purge(now)
+        return self.get(job_id)
+
+    def purge(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        清理已结束（done / failed / cancelled）的任务：结束超过 events_retention_seconds 的删除事件日志，
+        超过 job_retention_days 的连同任务记录一起删除。排队 / 运行中的任务不受影响。
+        """
+        now = now or time.time()
+        events_before = now - self.events_retention_seconds
+        jobs_before = now - self.job_retention_days * 86400
+        with self._lock:
+            self._last_purge = now
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                events = self._conn.execute(
+                    "DELETE FROM job_events WHERE job_id IN "
+                    "(SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?)",
+                    (events_before,)
+                ).rowcount
+                jobs = self._conn.execute(
+                    "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (jobs_before,)
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if events or jobs:
+            logger.info(f"已清理 {jobs} 个过期任务、{events} 条任务事件")
+        return {"jobs": jobs, "events": events}
+
+    def claim(self, stage: str, worker_id: str) -> Optional[Dict[str, Any]]:
+        """原子地认领该阶段最早排队的任务，没有可认领任务时返回 None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE stage = ? AND status = 'queued' ORDER BY created_at LIMIT 1",
+                    (stage,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, updated_at = ?, "
+                    "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (worker_id, now, now, row["id"])
+                )
+                self._append_event(row["id"], {"event": "stage", "stage": stage, "status": "running",
+                                               "worker": worker_id}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def complete_stage(self, job_id: str, result_update: Dict[str, Any],
+                       worker_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        合并当前阶段的结果；还有后续阶段则重新排队，否则标记为 done。
+        只对仍由 worker_id 运行中的任务生效：任务已被取消 / 标记失败 / 被其他 worker 重新认领时
+        不做任何修改、不追加事件，返回 None。
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE id = ? AND status = 'running' AND (? IS NULL OR worker = ?)",
+                    (job_id, worker_id, worker_id)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    logger.warning(f"任务 {job_id} 已不在运行中，丢弃本阶段结果")
+                    return None
+                job = self._row_to_job(row)
+                result = dict(job["result"], **result_update)
+                next_index = job["stage_index"] + 1
+                progress = next_index / len(job["stages"])
+                self._append_event(job_id, {"event": "stage_done", "stage": job["stage"]}, now)
+                if next_index < len(job["stages"]):
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', stage_index = ?, stage = ?, result = ?, worker = NULL, "
+                        "progress = ?, updated_at = ? WHERE id = ?",
+                        (next_index, job["stages"][next_index], json.dumps(result, ensure_ascii=False), progress,
+                         now, job_id)
+                    )
+                    self._append_event(job_id, {"event": "queued", "stage": job["stages"][next_index]}, now)
+                else:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'done', stage = NULL, result = ?, progress = 1, updated_at = ?, "
+                        "finished_at = ? WHERE id = ?",
+                        (json.dumps(result, ensure_ascii=False), now, now, job_id)
+                    )
+                    self._append_event(job_id, {"event": "done"}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def fail(self, job_id: str, error: str, worker_id: Optional[str] = None) -> bool:
+        """
+        把运行中的任务标记为失败（指定 worker_id 时只在任务仍由该 worker 运行时生效）；
+        已结束的任务不受影响，返回是否实际修改。
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? "
+                    "WHERE id = ? AND status = 'running' AND (? IS NULL OR worker = ?)",
+                    (error, now, now, job_id, worker_id, worker_id)
+                )
+                if cur.rowcount:
+                    self._append_event(job_id, {"event": "failed", "error": error}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cur.rowcount > 0
+
+    def fail_stage(self, stage: str, error: str) -> int:
+        """该阶段已没有存活的 worker：把停在该阶段（排队或运行中）的任务全部标记为失败"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id FROM jobs WHERE stage = ? AND status IN (?, ?)", (stage,) + ACTIVE_STATUSES
+                ).fetchall()
+                for row in rows:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                        (error, now, now, row["id"])
+                    )
+                    self._append_event(row["id"], {"event": "failed", "error": error}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if rows:
+            logger.warning(f"阶段 {stage} 没有可用的 worker，{len(rows)} 个任务已标记为失败: {error}")
+        return len(rows)
+
+    def cancel(self, job_id: str) -> bool:
+        """取消尚未被认领的任务"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (now, now, job_id)
+                )
+                if cur.rowcount:
+                    self._append_event(job_id, {"event": "cancelled"}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cur.rowcount > 0
+
+    def recover(self) -> int:
+        """进程重启后，把上次中断时仍为 running 的任务重新排队（从当前阶段重做）"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT id, stage FROM jobs WHERE status = 'running'").fetchall()
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? WHERE status = 'running'",
+                    (now,)
+                )
+                for row in rows:
+                    self._append_event(row["id"], {"event": "queued", "stage": row["stage"], "requeued": True}, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if rows:
+            logger.warning(f"重新排队 {len(rows)} 个中断的任务")
+        return len(rows)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """最近的任务（不含 payload / result，避免返回大段字幕）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, status, stage, progress, error, worker, created_at, started_at, updated_at, "
+                "finished_at "
+                "FROM jobs ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_result(self, kind: str) -> Optional[Dict[str, Any]]:
+        """该类任务最近一次成功完成时的 result"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM jobs WHERE kind = ? AND status = 'done' ORDER BY finished_at DESC LIMIT 1",
+                (kind,)
+            ).fetchone()
+        return json.loads(row["result"]) if row is not None and row["result"] else None
+
+    def stats(self) -> Dict[str, Any]:
+        """各阶段排队 / 运行中的任务数，以及按状态的总数"""
+        with self._lock:
+            by_stage = self._conn.execute(
+                "SELECT stage, status, COUNT(*) AS n FROM jobs WHERE status IN (?, ?) GROUP BY stage, status",
+                ACTIVE_STATUSES
+            ).fetchall()
+            by_status = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        stages: Dict[str, Dict[str, int]] = {}
+        for row in by_stage:
+            stages.setdefault(row["stage"], {"queued": 0, "running": 0})[row["status"]] = row["n"]
+        return {
+            "stages": stages,
+            "statuses": {row["status"]: row["n"] for row in by_status},
+            "max_pending": self.max_pending,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
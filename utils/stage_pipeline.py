@@ -0,0 +1,244 @@
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class PipelineItem:
+    """流水线中的一个任务：data 在各阶段之间传递并被逐步补全"""
+
+    def __init__(self, item_id: str, data: Dict[str, Any]):
+        self.id = item_id
+        self.data = data
+        self.error: Optional[BaseException] = None
+        self.failed_stage: Optional[str] = None
+        self.stage_seconds: Dict[str, float] = {}
+        self.submitted_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def latency(self) -> Optional[float]:
+        return self.finished_at - self.submitted_at if self.finished_at is not None else None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def result(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Pipeline item {self.id} did not finish within {timeout}s")
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+
+class Stage:
+    """
+    流水线阶段：fn(data) 处理并返回（或原地修改）data。
+    workers 为该阶段的线程数（一个模型一般为 1），queue_size 为该阶段输入队列的容量。
+    """
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                 workers: int = 1, queue_size: int = 2):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+
+
+class _StageMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # 下游队列已满、等待交付的时间
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    def sample_depth(self, depth: int):
+        with self.lock:
+            self.depth_samples += 1
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+
+
+class StagePipeline:
+    """
+    多阶段流水线执行器：每个阶段一个有界输入队列 + 若干工作线程。
+    不同任务可同时处于不同阶段（任务 N 在翻译时任务 N+1 已在做 ASR），
+    队列满时上游阶段阻塞等待，形成逐级背压，内存中滞留的中间结果有上限。
+    某个阶段抛出异常时，该任务跳过后续阶段并以失败结束。
+    """
+
+    def __init__(self, stages: List[Stage], on_complete: Optional[Callable[[PipelineItem], None]] = None,
+                 on_stage_start: Optional[Callable[[PipelineItem, str], None]] = None):
+        if not stages:
+            raise ValueError("StagePipeline needs at least one stage.")
+        self.stages = stages
+        self.on_complete = on_complete
+        self.on_stage_start = on_stage_start  # 任务进入某阶段时回调（用于上报进度）
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._metrics = [_StageMetrics() for _ in stages]
+        self._threads: List[threading.Thread] = []
+        self._exited = [0] * len(stages)
+        self._exit_lock = threading.Lock()
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._started_at: Optional[float] = None
+
+    def start(self):
+        if self._threads:
+            return
+        self._started_at = time.perf_counter()
+        for idx, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(idx,), name=f"stage-{stage.name}-{n}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Stage pipeline started: {[(s.name, s.workers, s.queue_size) for s in self.stages]}")
+
+    def submit(self, data: Dict[str, Any], item_id: Optional[str] = None, block: bool = True,
+               timeout: Optional[float] = None) -> PipelineItem:
+        """提交任务；第一个阶段的队列已满时阻塞（block=False 时抛出 queue.Full）"""
+        if not self._threads:
+            self.start()
+        with self._counter_lock:
+            self._counter += 1
+            item = PipelineItem(item_id or str(self._counter), data)
+            self._in_flight += 1
+        try:
+            self._queues[0].put(item, block=block, timeout=timeout)
+        except queue.Full:
+            with self._counter_lock:
+                self._in_flight -= 1
+            raise
+        self._metrics[0].sample_depth(self._queues[0].qsize())
+        return item
+
+    def _worker(self, idx: int):
+        stage = self.stages[idx]
+        metrics = self._metrics[idx]
+        inbox = self._queues[idx]
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                self._on_worker_exit(idx)
+                return
+
+            if self.on_stage_start is not None:
+                try:
+                    self.on_stage_start(item, stage.name)
+                except Exception as e:
+                    logger.error(f"Pipeline stage callback failed for item {item.id}: {e}")
+
+            start = time.perf_counter()
+            try:
+                output = stage.fn(item.data)
+                if output is not None:
+                    item.data = output
+            except Exception as e:
+                logger.error(f"Pipeline stage '{stage.name}' failed for item {item.id}: {e}", exc_info=True)
+                item.error = e
+                item.failed_stage = stage.name
+            elapsed = time.perf_counter() - start
+            item.stage_seconds[stage.name] = round(elapsed, 3)
+            with metrics.lock:
+                metrics.busy_seconds += elapsed
+                metrics.items += 1
+                if item.error is not None:
+                    metrics.failed += 1
+
+            if item.error is not None or idx == len(self.stages) - 1:
+                self._finish(item)
+                continue
+
+            start = time.perf_counter()
+            self._queues[idx + 1].put(item)
+            with metrics.lock:
+                metrics.blocked_seconds += time.perf_counter() - start
+            self._metrics[idx + 1].sample_depth(self._queues[idx + 1].qsize())
+
+    def _finish(self, item: PipelineItem):
+        item.finished_at = time.perf_counter()
+        with self._counter_lock:
+            self._in_flight -= 1
+            self._completed += 1
+            if item.error is not None:
+                self._failed += 1
+        item._done.set()
+        if self.on_complete is not None:
+            try:
+                self.on_complete(item)
+            except Exception as e:
+                logger.error(f"Pipeline completion callback failed for item {item.id}: {e}", exc_info=True)
+
+    def _on_worker_exit(self, idx: int):
+        # 本阶段所有线程都退出后再通知下一阶段，保证队列中的任务先处理完
+        with self._exit_lock:
+            self._exited[idx] += 1
+            last = self._exited[idx] == self.stages[idx].workers
+        if last and idx + 1 < len(self.stages):
+            for _ in range(self.stages[idx + 1].workers):
+                self._queues[idx + 1].put(_STOP)
+
+    def stop(self, wait: bool = True):
+        """处理完已提交的任务后停止所有阶段线程"""
+        if not self._threads:
+            return
+        for _ in range(self.stages[0].workers):
+            self._queues[0].put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+        self._exited = [0] * len(self.stages)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        各阶段指标：utilization = 忙碌时间 / (运行时长 x 线程数)，
+        queue_depth 为当前队列深度，avg/max_queue_depth 为每次入队时的采样。
+        利用率最高、上游 blocked_seconds 最大的阶段即瓶颈。
+        """
+        wall = time.perf_counter() - self._started_at if self._started_at else 0.0
+        stages = {}
+        for stage, metrics, inbox in zip(self.stages, self._metrics, self._queues):
+            with metrics.lock:
+                stages[stage.name] = {
+                    "workers": stage.workers,
+                    "items": metrics.items,
+                    "failed": metrics.failed,
+                    "busy_seconds": round(metrics.busy_seconds, 3),
+                    "blocked_seconds": round(metrics.blocked_seconds, 3),
+                    "utilization": round(metrics.busy_seconds / (wall * stage.workers), 4) if wall else 0.0,
+                    "queue_depth": inbox.qsize(),
+                    "queue_capacity": stage.queue_size,
+                    "avg_queue_depth": round(metrics.depth_total / metrics.depth_samples, 3)
+                    if metrics.depth_samples else 0.0,
+                    "max_queue_depth": metrics.max_depth,
+                }
+        return {
+            "wall_seconds": round(wall, 3),
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "failed": self._failed,
+            "stages": stages,
+        }
@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 文件指纹的分块读取大小
+_HASH_BLOCK_BYTES = 1 << 20
+
+
+class TranscriptCache:
+    """
+    基于内容寻址的转录结果磁盘缓存。
+    键 = 音频指纹（原始文件字节或解码后 PCM 的哈希）+ 模型设置（后端、模型、精度、语言、任务、beam size），
+    超出容量上限时按最近访问时间 (LRU) 淘汰。
+    """
+
+    def __init__(self, cache_dir: str = "cache/transcripts", max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (文件大小, 最近访问时间)；多个进程共享同一目录，磁盘才是权威，索引只是本进程的视图
+        self._index: Dict[str, tuple] = {}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+        logger.info(f"转录缓存已加载: {len(self._index)} 条, {self._total_bytes() / 1024 / 1024:.1f} MB")
+
+    def _scan(self):
+        """扫描缓存目录重建索引（以文件 mtime 作为最近访问时间），包含其他进程写入的条目"""
+        index = {}
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # 其他进程刚刚淘汰了该文件
+                continue
+            index[entry.name[:-5]] = (stat.st_size, stat.st_mtime)
+        self._index = index
+
+    def _total_bytes(self) -> int:
+        return sum(size for size, _ in self._index.values())
+
+    @staticmethod
+    def fingerprint_file(file_path: str) -> str:
+        """原始文件字节的哈希（无需解码，可在命中时完全跳过解码与 ASR）"""
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b""):
+                digest.update(block)
+        return "file:" + digest.hexdigest()
+
+    @staticmethod
+    def fingerprint_pcm(pcm: np.ndarray) -> str:
+        """解码后 PCM 的哈希（分块计算，兼容 memmap）"""
+        digest = hashlib.blake2b(digest_size=20)
+        block_samples = _HASH_BLOCK_BYTES // pcm.dtype.itemsize
+        for i in range(0, pcm.shape[0], block_samples):
+            digest.update(np.ascontiguousarray(pcm[i:i + block_samples]).tobytes())
+        return "pcm:" + digest.hexdigest()
+
+    @staticmethod
+    def make_key(fingerprint: str, **settings) -> str:
+        """由音频指纹和模型设置生成缓存键"""
+        parts = [fingerprint] + [f"{k}={settings[k]}" for k in sorted(settings)]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存；命中时刷新其访问时间"""
+        with self._lock:
+            path = self._path(key)
+            if key not in self._index and not os.path.exists(path):
+                self.misses += 1
+                return None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+                os.utime(path)
+                stat = os.stat(path)
+                self._index[key] = (stat.st_size, stat.st_mtime)
+                self.hits += 1
+                return result
+            except FileNotFoundError:
+                # 已被其他进程淘汰
+                self._index.pop(key, None)
+                self.misses += 1
+                return None
+            except (OSError, ValueError) as e:
+                logger.warning(f"转录缓存读取失败，已丢弃该条目: {e}")
+                self._remove(key)
+                self.misses += 1
+                return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """写入缓存，必要时按 LRU 淘汰旧条目"""
+        payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        if len(payload) > self.max_bytes:
+            return
+
+        with self._lock:
+            path = self._path(key)
+            # 临时文件名带 pid，避免多个进程同时写同一个键时互相覆盖
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            self._index[key] = (len(payload), os.path.getmtime(path))
+            self._evict()
+
+    def _evict(self):
+        """按磁盘上的实际占用淘汰，使容量上限对所有共享该目录的进程生效"""
+        self._scan()
+        total = self._total_bytes()
+        for key in sorted(self._index, key=lambda k: self._index[k][1]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index[key][0]
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._scan()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
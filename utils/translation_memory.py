@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_source(text: str) -> str:
+    """
+    归一化源文本：NFKC、合并空白、句首字母小写（用于模糊命中）。
+    其余大小写与标点保持不变："US" 与 "us"、"No?" 与 "No." 含义不同，译文不能互相复用。
+    """
+    text = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+    first_word = text.split(" ", 1)[0]
+    # 全大写的首词（缩写，如 "US"、"NASA"）不折叠
+    if first_word and not (len(first_word) > 1 and first_word.isupper()):
+        text = text[0].lower() + text[1:]
+    return text
+
+
+class TranslationMemory:
+    """
+    持久化翻译记忆 (SQLite)。
+    键 = (源文本, 源语言, 目标语言, 模型+LoRA 标识)，先按原文精确匹配，再按归一化文本匹配。
+    """
+
+    def __init__(self, db_path: str = "cache/translation_memory.sqlite3"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                src_text TEXT NOT NULL,
+                src_norm TEXT NOT NULL,
+                src_lang TEXT NOT NULL,
+                tgt_lang TEXT NOT NULL,
+                model_id TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (src_text, src_lang, tgt_lang, model_id)
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tm_norm
+            ON translation_memory (src_norm, src_lang, tgt_lang, model_id)
+        """)
+        self._conn.commit()
+        logger.info(f"翻译记忆库已加载: {db_path}")
+
+    def lookup(self, texts: List[str], src_lang: str, tgt_lang: str,
+               model_id: str) -> Dict[int, Tuple[str, str]]:
+        """
+        批量查询翻译记忆
+
+        Args:
+            texts: 源文本列表
+            src_lang / tgt_lang: 语言代码
+            model_id: 模型 + LoRA 标识
+
+        Returns:
+            {下标: (译文, 'exact' | 'normalized')}，未命中的下标不出现
+        """
+        found: Dict[int, Tuple[str, str]] = {}
+        with self._lock:
+            cur = self._conn.cursor()
+            for idx, text in enumerate(texts):
+                if not text:
+                    continue
+                row = cur.execute(
+                    "SELECT translation FROM translation_memory "
+                    "WHERE src_text = ? AND src_lang = ? AND tgt_lang = ? AND model_id = ?",
+                    (text, src_lang, tgt_lang, model_id)
+                ).fetchone()
+                match_type = "exact"
+                if row is None:
+                    row = cur.execute(
+                        "SELECT translation FROM translation_memory "
+                        "WHERE src_norm = ? AND src_lang = ? AND tgt_lang = ? AND model_id = ? "
+                        "ORDER BY hits DESC LIMIT 1",
+                        (normalize_source(text), src_lang, tgt_lang, model_id)
+                    ).fetchone()
+                    match_type = "normalized"
+                if row is not None:
+                    found[idx] = (row[0], match_type)
+
+            if found:
+                cur.executemany(
+                    "UPDATE translation_memory SET hits = hits + 1 "
+                    "WHERE src_norm = ? AND src_lang = ? AND tgt_lang = ? AND model_id = ?",
+                    [(normalize_source(texts[i]), src_lang, tgt_lang, model_id) for i in found]
+                )
+                self._conn.commit()
+        return found
+
+    def store(self, pairs: List[Tuple[str, str]], src_lang: str, tgt_lang: str, model_id: str):
+        """写入 (源文本, 译文) 对，已存在时覆盖译文"""
+        rows = [
+            (src, normalize_source(src), src_lang, tgt_lang, model_id, tgt, time.time())
+            for src, tgt in pairs if src and tgt
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO translation_memory "
+                "(src_text, src_norm, src_lang, tgt_lang, model_id, translation, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (src_text, src_lang, tgt_lang, model_id) "
+                "DO UPDATE SET translation = excluded.translation, updated_at = excluded.updated_at",
+                rows
+            )
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()